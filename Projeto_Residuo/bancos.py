@@ -0,0 +1,78 @@
+"""
+Configuração do banco por perfil, lida do ambiente (PERFIL_BANCO):
+
+- dev: SQLite em um arquivo local (SQLITE_ARQUIVO), sem servidor.
+- prod (padrão): MySQL com credenciais em DB_NAME, DB_USER, DB_PASSWORD,
+  DB_HOST e DB_PORT. A conexão é mantida entre requisições por
+  DB_CONN_MAX_AGE segundos e testada antes de ser reaproveitada, em vez de
+  uma conexão nova (TCP + autenticação) a cada requisição.
+
+O pool do próprio Django (OPTIONS['pool']) só existe para PostgreSQL. Com
+DB_POOL > 0 o perfil prod usa o backend MySQL do django-db-connection-pool,
+se instalado; útil com workers em threads, em que cada thread teria sua
+própria conexão persistente. Com o pool, a conexão volta para ele ao fim da
+requisição (CONN_MAX_AGE = 0) e é testada ao sair (PRE_PING).
+"""
+import importlib.util
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PERFIS = ('dev', 'prod')
+
+
+def _inteiro(ambiente, nome, padrao):
+    try:
+        return int(ambiente.get(nome, padrao))
+    except ValueError:
+        raise ImproperlyConfigured(f'{nome} deve ser um número inteiro.')
+
+
+def _mysql(ambiente):
+    banco = {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': ambiente.get('DB_NAME', 'farmacia'),
+        'USER': ambiente.get('DB_USER', 'root'),
+        'PASSWORD': ambiente.get('DB_PASSWORD', 'Terapia2024*'),
+        'HOST': ambiente.get('DB_HOST', 'localhost'),
+        'PORT': ambiente.get('DB_PORT', '3306'),
+        'CONN_MAX_AGE': _inteiro(ambiente, 'DB_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'connect_timeout': _inteiro(ambiente, 'DB_CONNECT_TIMEOUT', 5)},
+    }
+
+    tamanho = _inteiro(ambiente, 'DB_POOL', 0)
+    if tamanho > 0:
+        if importlib.util.find_spec('dj_db_conn_pool') is None:
+            raise ImproperlyConfigured(
+                'DB_POOL exige o pacote django-db-connection-pool '
+                '(pip install "django-db-connection-pool[mysql]").'
+            )
+        banco.update({
+            'ENGINE': 'dj_db_conn_pool.backends.mysql',
+            'CONN_MAX_AGE': 0,
+            'POOL_OPTIONS': {
+                'POOL_SIZE': tamanho,
+                'MAX_OVERFLOW': _inteiro(ambiente, 'DB_POOL_EXCEDENTE', tamanho),
+                'RECYCLE': _inteiro(ambiente, 'DB_POOL_RECICLAR', 3600),
+                'PRE_PING': True,
+            },
+        })
+    return banco
+
+
+def _sqlite(ambiente, base_dir):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ambiente.get('SQLITE_ARQUIVO', str(base_dir / 'db.sqlite3')),
+    }
+
+
+def bancos(base_dir, ambiente=os.environ):
+    """DATABASES do perfil escolhido em PERFIL_BANCO."""
+    perfil = ambiente.get('PERFIL_BANCO', 'prod')
+    if perfil not in PERFIS:
+        raise ImproperlyConfigured(f'PERFIL_BANCO deve ser um de: {", ".join(PERFIS)}.')
+    if perfil == 'dev':
+        return {'default': _sqlite(ambiente, base_dir)}
+    return {'default': _mysql(ambiente)}
@@ -1,5 +1,8 @@
 from pathlib import Path
 import os
+
+from .bancos import bancos
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,10 +37,12 @@ INSTALLED_APPS += [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app_veiculo.diagnostico.DiagnosticoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app_usuario.middleware.PapelUsuarioMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -46,7 +51,8 @@ ROOT_URLCONF = 'Projeto_Residuo.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que também mede o tempo de template para o diagnóstico
+        'BACKEND': 'app_veiculo.diagnostico.TemplatesCronometrados',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -66,21 +72,102 @@ WSGI_APPLICATION = 'Projeto_Residuo.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'farmacia',
-        'USER': 'root',
-        'PASSWORD': 'Terapia2024*',
-        'HOST': 'localhost',
-        'PORT': '3306'
+# Perfil do banco em PERFIL_BANCO: dev (SQLite local) ou prod (MySQL, padrão,
+# com conexões persistentes e pool opcional). Variáveis em Projeto_Residuo/bancos.py.
+DATABASES = bancos(BASE_DIR)
+
+
+# Cache compartilhado (listas de referência dos selects, agenda, grade de
+# rotas e papéis de usuário). CACHE_BACKEND escolhe o backend:
+# - memoria (padrão): LocMemCache, um cache por processo;
+# - redis / memcached: servidor em CACHE_LOCATION, comum a todos os workers;
+# - arquivo: comum aos processos da mesma máquina;
+# - banco: tabela no banco (exige `manage.py createcachetable`).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+        }
+    }
+elif CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', '127.0.0.1:11211'),
+        }
+    }
+elif CACHE_BACKEND == 'arquivo':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        }
     }
-}
+elif CACHE_BACKEND == 'banco':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'cache_sistema'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sistema-residuos',
+        }
+    }
+
+# Tempo (em segundos) das listas de referência, da agenda e da grade de rotas
+# em cache. A invalidação roda nos signals, no processo que fez a gravação:
+# com o cache em memória, cada worker tem o seu e os demais só veem a mudança
+# quando o valor expira. Por isso o tempo é de segundos nesse caso; a hora
+# inteira só vale com um cache comum a todos os processos (redis, memcached
+# ou banco; arquivo apenas com os workers em uma máquina).
+CACHE_POR_PROCESSO = CACHES['default']['BACKEND'].endswith('LocMemCache')
+REFERENCIAS_CACHE_TIMEOUT = int(os.environ.get(
+    'REFERENCIAS_CACHE_TIMEOUT', 30 if CACHE_POR_PROCESSO else 60 * 60
+))
+
+
+# Diagnóstico de desempenho (/veiculos/diagnostico/): ligado só com
+# DIAGNOSTICO_ATIVO=1; fração das requisições medidas, amostras mantidas em
+# memória e arquivo .jsonl opcional, gravado a cada DIAGNOSTICO_LOTE_ARQUIVO amostras
+DIAGNOSTICO_ATIVO = os.environ.get('DIAGNOSTICO_ATIVO', '0') == '1'
+DIAGNOSTICO_AMOSTRAGEM = float(os.environ.get('DIAGNOSTICO_AMOSTRAGEM', '0.1'))
+DIAGNOSTICO_TAMANHO_BUFFER = 1000
+DIAGNOSTICO_ARQUIVO = os.environ.get('DIAGNOSTICO_ARQUIVO') or None
+DIAGNOSTICO_LOTE_ARQUIVO = 50
+
+
+# Denúncias de cidadãos vão para uma fila local (SQLite em modo WAL) e são
+# gravadas no banco pelo comando processar_denuncias. Com
+# DENUNCIAS_ASSINCRONAS=0 a denúncia é gravada direto, dentro da requisição.
+DENUNCIAS_ASSINCRONAS = os.environ.get('DENUNCIAS_ASSINCRONAS', '1') != '0'
+DENUNCIAS_FILA_ARQUIVO = os.environ.get('DENUNCIAS_FILA_ARQUIVO', str(BASE_DIR / 'fila_denuncias.sqlite3'))
+
+
+# Prazo de atendimento (SLA), em dias desde a ocorrência, usado pelo painel
+# de backlog do dashboard
+SLA_DIAS_POR_PRIORIDADE = {'urgente': 1, 'alta': 3, 'media': 7, 'baixa': 30}
 
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Carrega o usuário já com o perfil (select_related) a cada requisição.
+# ModelBackend continua listado para não invalidar sessões já abertas.
+AUTHENTICATION_BACKENDS = [
+    'app_usuario.backends.PerfilModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Segundos que o papel do usuário fica em cache entre requisições
+PAPEL_USUARIO_CACHE_TIMEOUT = 300
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,20 @@
+"""
+Configuração usada pelo benchmark das views: mesma aplicação, mas com um
+banco SQLite separado para não tocar nos dados reais.
+
+    python manage.py migrate --settings=Projeto_Residuo.settings_benchmark
+    python manage.py benchmark_views --settings=Projeto_Residuo.settings_benchmark
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, os
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', str(BASE_DIR / 'benchmark.sqlite3')),
+    }
+}
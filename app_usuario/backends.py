@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class PerfilModelBackend(ModelBackend):
+    """
+    Backend de autenticação que carrega o usuário já com o perfil
+    (select_related), evitando uma consulta extra por requisição ao
+    acessar request.user.perfil.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('perfil').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -1,14 +1,12 @@
+from .middleware import papel_do_usuario
+
+
 def permissoes_usuario(request):
     """
     Injeta informações de papel/permissões do usuário autenticado
     no contexto de templates.
     """
-    role = None
-
-    if request.user.is_authenticated:
-        perfil = getattr(request.user, 'perfil', None)
-        if perfil:
-            role = perfil.status
+    role = papel_do_usuario(request)
 
     return {
         'user_role': role,
@@ -4,6 +4,8 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.shortcuts import redirect
 
+from .middleware import papel_do_usuario
+
 
 def role_required(*roles):
     """
@@ -20,8 +22,7 @@ def role_required(*roles):
             if not request.user.is_authenticated:
                 return redirect('login')
 
-            perfil = getattr(request.user, 'perfil', None)
-            if not perfil or perfil.status not in roles:
+            if papel_do_usuario(request) not in roles:
                 # Diferenciar resposta para requisições AJAX/JSON
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.headers.get('Accept') == 'application/json':
                     return JsonResponse(
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+# Tempo (em segundos) que o papel do usuário fica em cache entre requisições
+PAPEL_CACHE_TIMEOUT = getattr(settings, 'PAPEL_USUARIO_CACHE_TIMEOUT', 300)
+
+_SEM_PAPEL = ''
+
+
+def chave_papel(user_id):
+    return f'papel_usuario:{user_id}'
+
+
+def invalidar_papel(user_id):
+    """Remove o papel em cache; chamado sempre que o perfil do usuário muda."""
+    cache.delete(chave_papel(user_id))
+
+
+def _carregar_papel(user):
+    chave = chave_papel(user.pk)
+    papel = cache.get(chave)
+    if papel is None:
+        perfil = getattr(user, 'perfil', None)
+        papel = perfil.status if perfil else _SEM_PAPEL
+        cache.set(chave, papel, PAPEL_CACHE_TIMEOUT)
+    return papel or None
+
+
+def papel_do_usuario(request):
+    """
+    Papel (status do perfil) do usuário autenticado, ou None. O valor é
+    calculado uma única vez por requisição e reaproveitado entre
+    requisições pelo cache, até ser invalidado.
+    """
+    if not hasattr(request, '_papel_usuario'):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            request._papel_usuario = None
+        else:
+            request._papel_usuario = _carregar_papel(user)
+    return request._papel_usuario
+
+
+class PapelUsuarioMiddleware:
+    """
+    Deve vir depois de AuthenticationMiddleware. Expõe `request.papel_usuario`,
+    resolvido sob demanda e memorizado na requisição, para que role_required,
+    o context processor e as views consultem o papel uma única vez.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.papel_usuario = SimpleLazyObject(lambda: papel_do_usuario(request))
+        return self.get_response(request)
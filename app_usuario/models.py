@@ -1,8 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .middleware import invalidar_papel
+
 # Create your models here.
 
 class PerfilUsuario(models.Model):
@@ -53,3 +55,9 @@ def criar_perfil_usuario(sender, instance, created, **kwargs):
 def salvar_perfil_usuario(sender, instance, **kwargs):
     if hasattr(instance, 'perfil'):
         instance.perfil.save()
+
+# Signal para descartar o papel em cache sempre que o perfil muda
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_papel_usuario(sender, instance, **kwargs):
+    invalidar_papel(instance.user_id)
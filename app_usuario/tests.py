@@ -1,3 +1,67 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .forms import UsuarioCreateForm
+from .middleware import chave_papel
+
+
+def criar_usuario(username, status):
+    user = User.objects.create_user(username=username, password='senha-teste-123', email=f'{username}@teste.com')
+    user.perfil.status = status
+    user.perfil.save()
+    return user
+
+
+class PapelUsuarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = criar_usuario('admin', 'admin')
+        self.client.force_login(self.admin)
+
+    def test_usuario_e_perfil_carregados_em_uma_consulta(self):
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('dashboard'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.context['is_admin'])
+        # Uma única consulta com JOIN traz usuário e perfil
+        com_perfil = [q['sql'] for q in consultas.captured_queries if 'app_usuario_perfilusuario' in q['sql']]
+        self.assertEqual(len(com_perfil), 1)
+        self.assertIn('auth_user', com_perfil[0])
+
+    def test_papel_fica_em_cache_entre_requisicoes(self):
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(cache.get(chave_papel(self.admin.pk)), 'admin')
+
+    def test_alterar_status_invalida_cache(self):
+        outro = criar_usuario('gestor', 'gestor_rotas')
+        cache.set(chave_papel(outro.pk), 'gestor_rotas')
+        self.client.post(reverse('alterar_status_usuario', args=[outro.perfil.pk]))
+        self.assertIsNone(cache.get(chave_papel(outro.pk)))
+
+    def test_mudanca_de_papel_vale_na_proxima_requisicao(self):
+        gestor = criar_usuario('gestor', 'gestor_rotas')
+        self.client.force_login(gestor)
+        self.assertEqual(self.client.get(reverse('gerenciar_usuarios')).status_code, 302)
+
+        gestor.perfil.status = 'admin'
+        gestor.perfil.save()
+        self.assertEqual(self.client.get(reverse('gerenciar_usuarios')).status_code, 200)
+
+    def test_usuario_criado_pelo_formulario_recebe_papel(self):
+        form = UsuarioCreateForm(data={
+            'username': 'novo', 'first_name': 'Novo', 'last_name': 'Usuario',
+            'email': 'novo@teste.com', 'password1': 'Senha-forte-987', 'password2': 'Senha-forte-987',
+            'status': 'gestor_rotas', 'departamento': 'Coleta', 'ativo': True,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        user = form.save()
+        self.assertIsNone(cache.get(chave_papel(user.pk)))
+
+        self.client.force_login(user)
+        resposta = self.client.get(reverse('dashboard'))
+        self.assertTrue(resposta.context['is_gestor'])
@@ -4,8 +4,10 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 
 from app_usuario.decorators import role_required
+from app_usuario.middleware import papel_do_usuario
 from app_usuario.forms import UsuarioCreateForm
 from app_usuario.models import PerfilUsuario
+from app_veiculo.relatorios import painel_backlog
 
 
 def login(request):
@@ -43,7 +45,11 @@ def logout_view(request):
 
 @login_required
 def dashboard(request):
-    return render(request, "app_usuario/dashboard.html")
+    context = {}
+    if papel_do_usuario(request) in ('gestor_rotas', 'admin'):
+        # Painel de backlog/SLA a partir dos contadores incrementais
+        context['painel_backlog'] = painel_backlog()
+    return render(request, "app_usuario/dashboard.html", context)
 
 
 @role_required('admin')
@@ -1,8 +1,72 @@
-from django.contrib import admin
-from .models import Veiculo, Rota, ProblemaColeta
+import io
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .importacao import TAMANHO_LOTE, importar_rotas, importar_veiculos
+from .models import Veiculo, Rota, OcorrenciaRota, ProblemaColeta, EstatisticaDiaria, TransicaoStatus
+from .status_problema import aplicar, mensagem_de_recusa, transicao_permitida
+
+
+class ImportacaoCSVForm(forms.Form):
+    arquivo = forms.FileField(label='Arquivo CSV')
+    lote = forms.IntegerField(label='Linhas por transação', min_value=1, initial=TAMANHO_LOTE)
+
+
+class ImportacaoCSVMixin:
+    """Adiciona à listagem do admin uma página de importação por CSV."""
+
+    change_list_template = 'admin/app_veiculo/change_list_importacao.html'
+    importador = None
+    colunas_importacao = ()
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                'importar-csv/',
+                self.admin_site.admin_view(self.importar_csv),
+                name='%s_%s_importar_csv' % info,
+            ),
+        ] + super().get_urls()
+
+    def importar_csv(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect('admin:index')
+
+        resultado = None
+        form = ImportacaoCSVForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            arquivo = io.TextIOWrapper(form.cleaned_data['arquivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                resultado = self.importador(arquivo, tamanho_lote=form.cleaned_data['lote'])
+            except (ValidationError, UnicodeDecodeError) as erro:
+                mensagem = '; '.join(erro.messages) if isinstance(erro, ValidationError) else 'O arquivo não está em UTF-8.'
+                messages.error(request, mensagem)
+            else:
+                nivel = messages.WARNING if resultado.erros else messages.SUCCESS
+                messages.add_message(request, nivel, f'Importação concluída: {resultado}')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Importar {self.model._meta.verbose_name_plural} (CSV)',
+            'form': form,
+            'resultado': resultado,
+            'colunas': self.colunas_importacao,
+        }
+        return TemplateResponse(request, 'admin/app_veiculo/importar_csv.html', context)
+
 
 @admin.register(Veiculo)
-class VeiculoAdmin(admin.ModelAdmin):
+class VeiculoAdmin(ImportacaoCSVMixin, admin.ModelAdmin):
+    importador = staticmethod(importar_veiculos)
+    colunas_importacao = ('placa', 'tipo', 'numero_caminhao', 'ativo')
+
     list_display = ['placa', 'tipo', 'numero_caminhao', 'ativo', 'data_cadastro']
     list_filter = ['tipo', 'ativo', 'data_cadastro']
     search_fields = ['placa', 'numero_caminhao']
@@ -19,27 +83,50 @@ class VeiculoAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Rota)
-class RotaAdmin(admin.ModelAdmin):
-    list_display = ['veiculo', 'local', 'horario', 'dias_semana', 'concluida', 'data_cadastro']
-    list_filter = ['concluida', 'veiculo__tipo', 'veiculo']
+class RotaAdmin(ImportacaoCSVMixin, admin.ModelAdmin):
+    importador = staticmethod(importar_rotas)
+    colunas_importacao = ('placa', 'local', 'horario', 'dias_semana', 'observacoes', 'duracao')
+    list_display = ['veiculo', 'local', 'horario', 'dias_semana', 'data_cadastro']
+    list_filter = ['veiculo__tipo', 'veiculo']
     search_fields = ['local', 'veiculo__placa', 'dias_semana']
-    list_editable = ['concluida']
     ordering = ['horario']
     
     fieldsets = (
         ('Informações da Rota', {
-            'fields': ('veiculo', 'local', 'horario', 'dias_semana')
+            'fields': ('veiculo', 'local', 'latitude', 'longitude', 'horario', 'duracao', 'dias_semana')
         }),
-        ('Status e Observações', {
-            'fields': ('concluida', 'observacoes')
+        ('Observações', {
+            'fields': ('observacoes',)
         }),
     )
 
+@admin.register(OcorrenciaRota)
+class OcorrenciaRotaAdmin(admin.ModelAdmin):
+    list_display = ['data', 'rota', 'veiculo', 'concluida', 'data_conclusao', 'usuario']
+    list_filter = ['concluida', 'data', 'veiculo__tipo']
+    search_fields = ['rota__local', 'veiculo__placa']
+    ordering = ['-data', 'rota_id']
+    date_hierarchy = 'data'
+    list_select_related = ['rota__veiculo', 'veiculo', 'usuario']
+    raw_id_fields = ['rota', 'veiculo', 'usuario']
+    readonly_fields = ['data_atualizacao']
+
+class ProblemaColetaAdminForm(forms.ModelForm):
+    def clean_status(self):
+        status = self.cleaned_data.get('status')
+        anterior = self.instance.status
+        if self.instance.pk and status != anterior and not transicao_permitida(anterior, status):
+            raise ValidationError(mensagem_de_recusa(anterior, status))
+        return status
+
+
 @admin.register(ProblemaColeta)
 class ProblemaColetaAdmin(admin.ModelAdmin):
+    # Status editado no formulário e na listagem passa pela máquina de estados
+    form = ProblemaColetaAdminForm
     list_display = [
         'tipo_problema', 'veiculo', 'prioridade', 'status', 
-        'data_ocorrencia', 'responsavel_relato'
+        'data_ocorrencia', 'responsavel_relato', 'total_denuncias'
     ]
     list_filter = [
         'tipo_problema', 'prioridade', 'status', 'data_ocorrencia', 
@@ -58,7 +145,7 @@ class ProblemaColetaAdmin(admin.ModelAdmin):
             'fields': ('veiculo', 'rota', 'tipo_problema', 'prioridade', 'status')
         }),
         ('Detalhes da Ocorrência', {
-            'fields': ('descricao', 'local_problema', 'data_ocorrencia', 'responsavel_relato')
+            'fields': ('descricao', 'local_problema', 'latitude', 'longitude', 'data_ocorrencia', 'responsavel_relato')
         }),
         ('Resolução', {
             'fields': ('solucao', 'data_resolucao', 'observacoes')
@@ -66,3 +153,41 @@ class ProblemaColetaAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['data_cadastro', 'data_atualizacao']
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', ProblemaColetaAdminForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        # Data de resolução e autor da mudança de status, registrada no histórico
+        aplicar(obj, obj.status, usuario=request.user)
+        super().save_model(request, obj, form, change)
+
+@admin.register(EstatisticaDiaria)
+class EstatisticaDiariaAdmin(admin.ModelAdmin):
+    list_display = [
+        'data', 'veiculo', 'tipo_veiculo', 'rotas_cadastradas', 'rotas_concluidas',
+        'problemas_registrados', 'problemas_abertos', 'problemas_resolvidos'
+    ]
+    list_filter = ['tipo_veiculo', 'data']
+    ordering = ['-data', 'veiculo_id']
+    date_hierarchy = 'data'
+    readonly_fields = ['data_atualizacao']
+
+@admin.register(TransicaoStatus)
+class TransicaoStatusAdmin(admin.ModelAdmin):
+    list_display = ['data', 'problema', 'veiculo', 'tipo_problema', 'status_anterior', 'status_novo', 'usuario']
+    list_filter = ['status_novo', 'tipo_problema', 'data']
+    ordering = ['-data', '-id']
+    date_hierarchy = 'data'
+    list_select_related = ['problema__veiculo', 'veiculo', 'usuario']
+
+    # Histórico só de inclusão: as linhas são gravadas pela máquina de estados
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
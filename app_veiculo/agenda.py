@@ -0,0 +1,113 @@
+"""
+Agenda de coletas: expande as rotas dos veículos ativos em ocorrências
+concretas (data + horário) por caminhão. Como a escala é semanal, a agenda
+de um dia só depende do dia da semana; cada um dos sete dias fica em cache
+com a própria versão, e a gravação de uma rota invalida apenas os dias da
+semana em que ela operava ou passou a operar.
+
+A situação de cada coleta (concluída ou pendente) é da data, não do dia da
+semana: fica fora do cache e vem das ocorrências concluídas do período, em
+uma consulta.
+"""
+import datetime
+from itertools import groupby
+
+from .dias_semana import DIAS, TODOS_OS_DIAS, dias_da_mascara
+from .models import OcorrenciaRota, Rota
+from .referencias import _obter, invalidar as invalidar_grupos
+
+# Maior período aceito por agenda_do_periodo() (dias)
+JANELA_MAXIMA = 31
+
+
+def _grupo(codigo):
+    return f'agenda:{codigo}'
+
+
+def invalidar(mascara=TODOS_OS_DIAS):
+    """Descarta a agenda dos dias da semana presentes em `mascara` (padrão: todos)."""
+    invalidar_grupos(*(_grupo(codigo) for codigo in dias_da_mascara(mascara)))
+
+
+def _carregar(dia_semana):
+    # Uma consulta, atendida pelo índice (dias_mask, horario)
+    rotas = (
+        Rota.objects.operando_em(dia_semana)
+        .filter(veiculo__ativo=True)
+        .order_by('veiculo__placa', 'horario')
+        .values_list(
+            'id', 'local', 'horario',
+            'veiculo_id', 'veiculo__placa', 'veiculo__numero_caminhao', 'veiculo__tipo',
+        )
+    )
+    return [
+        {
+            'rota_id': rota_id,
+            'local': local,
+            'horario': horario,
+            'veiculo_id': veiculo_id,
+            'placa': placa,
+            'numero_caminhao': numero_caminhao,
+            'tipo': tipo,
+        }
+        for rota_id, local, horario, veiculo_id, placa, numero_caminhao, tipo in rotas
+    ]
+
+
+def concluidas_no_periodo(inicio, fim):
+    """{data: {rota_id}} das coletas concluídas de `inicio` a `fim`, inclusive."""
+    concluidas = {}
+    ocorrencias = OcorrenciaRota.objects.filter(
+        data__gte=inicio, data__lte=fim, concluida=True
+    ).values_list('data', 'rota_id')
+    for data, rota_id in ocorrencias.order_by():
+        concluidas.setdefault(data, set()).add(rota_id)
+    return concluidas
+
+
+def coletas_do_dia(data, concluidas=None):
+    """
+    Coletas previstas para `data`, ordenadas por placa e horário, com a
+    situação do dia em `concluida`. `concluidas` ({rota_id}) evita a consulta
+    quando já foi lida para o período.
+    """
+    codigo = DIAS[data.weekday()]
+    if concluidas is None:
+        concluidas = concluidas_no_periodo(data, data).get(data, set())
+    return [
+        {**coleta, 'concluida': coleta['rota_id'] in concluidas}
+        for coleta in _obter(_grupo(codigo), lambda: _carregar(data.weekday()))
+    ]
+
+
+def agenda_por_veiculo(data, concluidas=None):
+    """Coletas de `data` agrupadas por caminhão: [{'veiculo': {...}, 'coletas': [...]}]."""
+    agenda = []
+    for veiculo_id, coletas in groupby(coletas_do_dia(data, concluidas), key=lambda coleta: coleta['veiculo_id']):
+        coletas = list(coletas)
+        primeira = coletas[0]
+        agenda.append({
+            'veiculo': {
+                'id': veiculo_id,
+                'placa': primeira['placa'],
+                'numero_caminhao': primeira['numero_caminhao'],
+                'tipo': primeira['tipo'],
+            },
+            'coletas': coletas,
+        })
+    return agenda
+
+
+def agenda_do_periodo(inicio, fim):
+    """
+    Agenda de cada dia de `inicio` a `fim`, inclusive: [(data, agenda_por_veiculo)].
+    Períodos longos reaproveitam as sete agendas semanais em cache.
+    """
+    dias = (fim - inicio).days + 1
+    if dias > JANELA_MAXIMA:
+        raise ValueError(f'Período maior que {JANELA_MAXIMA} dias.')
+    concluidas = concluidas_no_periodo(inicio, fim)
+    return [
+        (data, agenda_por_veiculo(data, concluidas.get(data, set())))
+        for data in (inicio + datetime.timedelta(days=n) for n in range(max(dias, 0)))
+    ]
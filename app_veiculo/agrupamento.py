@@ -0,0 +1,124 @@
+"""
+Agrupamento de denúncias repetidas. Denúncias da mesma rota, no mesmo local
+(normalizado) e dentro da janela de tempo viram um único ProblemaColeta
+aberto, cujo contador `total_denuncias` é incrementado. A busca usa o hash
+de rota + local em `chave_agrupamento`, indexado junto com data_ocorrencia.
+
+A fila só passa para agrupar_lote denúncias ainda não aplicadas (ver
+fila_denuncias), então um lote reprocessado não reconta o contador.
+"""
+import datetime
+import hashlib
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .busca import normalizar
+from .models import ProblemaColeta
+
+# Só problemas ainda em tratamento recebem novas denúncias
+STATUS_AGRUPAVEIS = ['aberto', 'em_andamento']
+
+_ABREVIACOES = {
+    'r': 'rua', 'av': 'avenida', 'trav': 'travessa', 'tv': 'travessa',
+    'al': 'alameda', 'pca': 'praca', 'rod': 'rodovia', 'estr': 'estrada',
+}
+# Número da casa e marcadores como "nº" não distinguem a rua
+_IGNORADAS = {'n', 'no', 'nro', 'numero', 's', 'sn'}
+
+
+def janela():
+    return datetime.timedelta(hours=getattr(settings, 'DENUNCIAS_JANELA_AGRUPAMENTO_HORAS', 24))
+
+
+def normalizar_local(local):
+    """'R. São José, nº 120 - Centro' -> 'rua sao jose centro'."""
+    palavras = []
+    for palavra in re.findall(r'\w+', normalizar(local)):
+        if palavra.isdigit() or palavra in _IGNORADAS:
+            continue
+        palavras.append(_ABREVIACOES.get(palavra, palavra))
+    return ' '.join(palavras)
+
+
+def chave_agrupamento(rota_id, local):
+    if not rota_id:
+        return None
+    return hashlib.sha1(f'{rota_id}|{normalizar_local(local)}'.encode()).hexdigest()
+
+
+def _candidatos(chaves, inicio, fim):
+    # Atendida pelo índice (chave_agrupamento, data_ocorrencia)
+    return ProblemaColeta.objects.filter(
+        chave_agrupamento__in=chaves,
+        data_ocorrencia__gte=inicio,
+        data_ocorrencia__lte=fim,
+        status__in=STATUS_AGRUPAVEIS,
+    ).order_by('data_ocorrencia', 'id').only('id', 'chave_agrupamento', 'data_ocorrencia')
+
+
+def principal_de(denuncia):
+    """Problema aberto que já representa esta denúncia, ou None."""
+    chave = denuncia.chave_agrupamento or chave_agrupamento(denuncia.rota_id, denuncia.local_problema)
+    if chave is None:
+        return None
+    return _candidatos(
+        [chave], denuncia.data_ocorrencia - janela(), denuncia.data_ocorrencia + janela()
+    ).first()
+
+
+def incrementar(contagens):
+    """Soma denúncias agrupadas: {problema_id: quantidade}, um UPDATE por problema."""
+    agora = timezone.now()
+    for problema_id, quantidade in contagens.items():
+        # update() não aplica auto_now; a data de atualização vai junto
+        ProblemaColeta.objects.filter(pk=problema_id).update(
+            total_denuncias=F('total_denuncias') + quantidade,
+            data_atualizacao=agora,
+        )
+
+
+def agrupar_lote(denuncias):
+    """
+    Separa um lote de denúncias novas em (a gravar, {problema_id: repetidas}).
+    Uma consulta busca os problemas abertos das chaves do lote; denúncias
+    repetidas dentro do próprio lote se somam à primeira delas.
+    """
+    for denuncia in denuncias:
+        denuncia.chave_agrupamento = chave_agrupamento(denuncia.rota_id, denuncia.local_problema)
+    com_chave = [denuncia for denuncia in denuncias if denuncia.chave_agrupamento]
+    if not com_chave:
+        return list(denuncias), {}
+
+    margem = janela()
+    existentes = defaultdict(list)
+    for problema in _candidatos(
+        {denuncia.chave_agrupamento for denuncia in com_chave},
+        min(denuncia.data_ocorrencia for denuncia in com_chave) - margem,
+        max(denuncia.data_ocorrencia for denuncia in com_chave) + margem,
+    ):
+        existentes[problema.chave_agrupamento].append(problema)
+
+    novas, repetidas = [], Counter()
+    for denuncia in sorted(denuncias, key=lambda denuncia: denuncia.data_ocorrencia):
+        principal = next(
+            (
+                problema for problema in existentes.get(denuncia.chave_agrupamento, [])
+                if abs(problema.data_ocorrencia - denuncia.data_ocorrencia) <= margem
+            ),
+            None,
+        ) if denuncia.chave_agrupamento else None
+
+        if principal is None:
+            novas.append(denuncia)
+            if denuncia.chave_agrupamento:
+                existentes[denuncia.chave_agrupamento].append(denuncia)
+        elif principal.pk is None:
+            # Principal também é deste lote e ainda não foi gravado
+            principal.total_denuncias += 1
+        else:
+            repetidas[principal.pk] += 1
+    return novas, dict(repetidas)
@@ -0,0 +1,374 @@
+"""
+API JSON de veículos, rotas e problemas de coleta, para o painel de despacho
+e outros clientes que hoje leem o HTML.
+
+    GET    /veiculos/api/<recurso>/        lista (filtros das listagens, ?campos=, ?cursor=, ?limite=)
+    POST   /veiculos/api/<recurso>/        cria
+    GET    /veiculos/api/<recurso>/<pk>/   detalhe (?campos=)
+    PUT    /veiculos/api/<recurso>/<pk>/   substitui (todos os campos do formulário)
+    PATCH  /veiculos/api/<recurso>/<pk>/   altera só os campos enviados
+    DELETE /veiculos/api/<recurso>/<pk>/   exclui
+
+As leituras devolvem ETag e Last-Modified calculados a partir do maior
+data_atualizacao das tabelas envolvidas e da última exclusão registrada no
+banco (RegistroExclusao), sem ler as linhas: um cliente que repete If-None-Match recebe 304
+enquanto nada mudou. As gravações passam pelos mesmos formulários das telas,
+usam a sessão do Django e exigem o cabeçalho X-CSRFToken.
+"""
+import datetime
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from app_usuario.middleware import papel_do_usuario
+
+from .filtros import filtrar_problemas, filtrar_rotas, filtrar_veiculos
+from .forms import ProblemaColetaForm, RotaForm, VeiculoForm
+from .models import OcorrenciaRota, ProblemaColeta, RegistroExclusao, Rota, Veiculo
+from .paginacao import CursorPaginator
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+PAPEIS_DE_ESCRITA = ('gestor_rotas', 'admin')
+
+EPOCA = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Recurso:
+    """
+    Descrição de um recurso da API. `campos` liga o nome exposto ao caminho
+    no ORM (campos de outras tabelas saem do mesmo SELECT, via JOIN);
+    `depende_de` são os modelos cujas alterações mudam as respostas e
+    `ordenacao(parametros)` é a mesma ordenação estável da listagem HTML.
+    Com `formulario_com_usuario`, o formulário recebe o usuário (user=).
+    `consulta()` é o queryset de leitura (padrão: todos os registros).
+    """
+
+    def __init__(self, nome, modelo, formulario, campos, filtrar, filtros, ordenacao, depende_de,
+                 formulario_com_usuario=False, consulta=None):
+        self.nome = nome
+        self.modelo = modelo
+        self.formulario = formulario
+        self.campos = campos
+        self.filtrar = filtrar
+        self.filtros = filtros
+        self.ordenacao = ordenacao
+        self.depende_de = depende_de
+        self.formulario_com_usuario = formulario_com_usuario
+        self.consulta = consulta or self.modelo.objects.all
+
+    def filtrado(self, parametros):
+        valores = {filtro: parametros.get(filtro, '') for filtro in self.filtros}
+        return self.filtrar(self.consulta(), **valores)
+
+
+RECURSOS = {
+    recurso.nome: recurso
+    for recurso in [
+        Recurso(
+            'veiculos',
+            Veiculo,
+            VeiculoForm,
+            campos={
+                'id': 'id',
+                'placa': 'placa',
+                'tipo': 'tipo',
+                'numero_caminhao': 'numero_caminhao',
+                'ativo': 'ativo',
+                'data_cadastro': 'data_cadastro',
+                'data_atualizacao': 'data_atualizacao',
+            },
+            filtrar=filtrar_veiculos,
+            filtros=('search', 'tipo', 'ativo'),
+            ordenacao=lambda parametros: ('placa',),
+            depende_de=(Veiculo,),
+        ),
+        Recurso(
+            'rotas',
+            Rota,
+            RotaForm,
+            campos={
+                'id': 'id',
+                'veiculo': 'veiculo',
+                'veiculo_placa': 'veiculo__placa',
+                'local': 'local',
+                'latitude': 'latitude',
+                'longitude': 'longitude',
+                'horario': 'horario',
+                'duracao': 'duracao',
+                'dias_semana': 'dias_semana',
+                'observacoes': 'observacoes',
+                'concluida': 'concluida',
+                'data_cadastro': 'data_cadastro',
+                'data_atualizacao': 'data_atualizacao',
+            },
+            filtrar=filtrar_rotas,
+            filtros=('search', 'veiculo', 'concluida', 'dias'),
+            ordenacao=lambda parametros: ('horario', 'id'),
+            depende_de=(Rota, Veiculo, OcorrenciaRota),
+            # `concluida` é a situação de hoje, da ocorrência do dia
+            consulta=lambda: Rota.objects.com_situacao(),
+        ),
+        Recurso(
+            'problemas',
+            ProblemaColeta,
+            ProblemaColetaForm,
+            campos={
+                'id': 'id',
+                'protocolo': 'protocolo',
+                'veiculo': 'veiculo',
+                'veiculo_placa': 'veiculo__placa',
+                'rota': 'rota',
+                'rota_local': 'rota__local',
+                'tipo_problema': 'tipo_problema',
+                'prioridade': 'prioridade',
+                'status': 'status',
+                'descricao': 'descricao',
+                'local_problema': 'local_problema',
+                'latitude': 'latitude',
+                'longitude': 'longitude',
+                'data_ocorrencia': 'data_ocorrencia',
+                'responsavel_relato': 'responsavel_relato',
+                'solucao': 'solucao',
+                'data_resolucao': 'data_resolucao',
+                'observacoes': 'observacoes',
+                'total_denuncias': 'total_denuncias',
+                'data_cadastro': 'data_cadastro',
+                'data_atualizacao': 'data_atualizacao',
+            },
+            filtrar=filtrar_problemas,
+            filtros=('search', 'veiculo', 'tipo', 'status', 'prioridade'),
+            # Busca textual: ordem de relevância, como em problema_list
+            ordenacao=lambda parametros: (
+                ('relevancia', 'id') if parametros.get('search') else ('-data_ocorrencia', '-id')
+            ),
+            depende_de=(ProblemaColeta, Veiculo, Rota),
+            # Mudanças de status entram no histórico com o autor
+            formulario_com_usuario=True,
+        ),
+    ]
+}
+
+
+class ErroDaApi(Exception):
+    def __init__(self, mensagem, status=400, erros=None):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.status = status
+        self.erros = erros
+
+
+def _obter(queryset, pk):
+    objeto = queryset.filter(pk=pk).first()
+    if objeto is None:
+        raise ErroDaApi('Registro não encontrado.', status=404)
+    return objeto
+
+
+def _resposta(dados, status=200):
+    return JsonResponse(dados, status=status, encoder=DjangoJSONEncoder)
+
+
+def _erro(mensagem, status=400, erros=None):
+    dados = {'success': False, 'error': mensagem}
+    if erros is not None:
+        dados['errors'] = erros
+    return _resposta(dados, status=status)
+
+
+# Leitura
+
+def _campos_pedidos(recurso, parametros):
+    """Campos de ?campos=a,b,c na ordem pedida; sem o parâmetro, todos."""
+    texto = parametros.get('campos', '')
+    if not texto:
+        return list(recurso.campos)
+    pedidos = [campo.strip() for campo in texto.split(',') if campo.strip()]
+    desconhecidos = [campo for campo in pedidos if campo not in recurso.campos]
+    if desconhecidos:
+        raise ErroDaApi(
+            f'Campo(s) desconhecido(s): {", ".join(desconhecidos)}. '
+            f'Disponíveis: {", ".join(recurso.campos)}.'
+        )
+    return list(dict.fromkeys(pedidos))
+
+
+def _selecionar(recurso, queryset, campos, extras=()):
+    """values() só com as colunas pedidas (e as da ordenação, para o cursor)."""
+    caminhos = [recurso.campos[campo] for campo in campos]
+    return queryset.values(*dict.fromkeys([*caminhos, *extras]))
+
+
+def _serializar(recurso, linha, campos):
+    return {campo: linha[recurso.campos[campo]] for campo in campos}
+
+
+def _validador(recurso):
+    """
+    Momento da última alteração visível no recurso: o maior data_atualizacao
+    de cada tabela envolvida (índice, sem ler as linhas) ou a última exclusão.
+    """
+    momentos = [
+        modelo.objects.aggregate(ultima=Max('data_atualizacao'))['ultima']
+        for modelo in recurso.depende_de
+    ]
+    momentos.append(RegistroExclusao.ultima(*(modelo._meta.db_table for modelo in recurso.depende_de)))
+    # Tabelas vazias e sem exclusões: o início da época
+    return max((momento for momento in momentos if momento is not None), default=EPOCA)
+
+
+def _condicional(request, recurso, gerar):
+    """
+    Responde 304 quando o cliente já tem a versão atual; senão chama `gerar`.
+    A ETag inclui o caminho completo, pois filtros e campos mudam o corpo.
+    """
+    ultima = _validador(recurso)
+    # A data entra na ETag: a situação das rotas é a do dia, mesmo sem alterações
+    digital = hashlib.md5(
+        f'{ultima.isoformat()}|{timezone.localdate().isoformat()}|{request.get_full_path()}'.encode()
+    ).hexdigest()
+    etag = f'"{digital}"'
+    ultima_modificacao = int(ultima.timestamp())
+
+    resposta = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if resposta is None:
+        resposta = gerar()
+    if resposta.status_code in (200, 304):
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = http_date(ultima_modificacao)
+    # O navegador guarda a resposta, mas sempre revalida
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+
+def _listar(request, recurso):
+    parametros = request.GET
+    campos = _campos_pedidos(recurso, parametros)
+    try:
+        limite = min(max(int(parametros.get('limite', LIMITE_PADRAO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        raise ErroDaApi('Parâmetro limite inválido.')
+
+    def gerar():
+        ordenacao = recurso.ordenacao(parametros)
+        extras = [campo.lstrip('-') for campo in ordenacao]
+        queryset = _selecionar(recurso, recurso.filtrado(parametros), campos, extras)
+        pagina = CursorPaginator(queryset, limite, ordering=ordenacao).get_page(parametros.get('cursor'))
+        return _resposta({
+            'success': True,
+            'resultados': [_serializar(recurso, linha, campos) for linha in pagina],
+            'proximo': pagina.next_cursor or None,
+            'anterior': pagina.previous_cursor or None,
+        })
+
+    return _condicional(request, recurso, gerar)
+
+
+def _detalhar(request, recurso, pk):
+    campos = _campos_pedidos(recurso, request.GET)
+
+    def gerar():
+        linha = _obter(_selecionar(recurso, recurso.consulta(), campos), pk)
+        return _resposta({'success': True, 'resultado': _serializar(recurso, linha, campos)})
+
+    return _condicional(request, recurso, gerar)
+
+
+# Gravação
+
+def _corpo_json(request):
+    try:
+        dados = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ErroDaApi('Corpo da requisição não é um JSON válido.')
+    if not isinstance(dados, dict):
+        raise ErroDaApi('O corpo da requisição deve ser um objeto JSON.')
+    return dados
+
+
+def _gravar(request, recurso, dados, instancia=None, status=200):
+    extras = {'user': request.user} if recurso.formulario_com_usuario else {}
+    form = recurso.formulario(dados, instance=instancia, **extras)
+    # Validação de conflitos e gravação na mesma transação, com o veículo travado
+    with transaction.atomic():
+        if not form.is_valid():
+            raise ErroDaApi('Dados inválidos.', erros=form.errors.get_json_data())
+        objeto = form.save()
+    linha = _selecionar(recurso, recurso.consulta(), recurso.campos).get(pk=objeto.pk)
+    resposta = _resposta({'success': True, 'resultado': _serializar(recurso, linha, recurso.campos)}, status=status)
+    if status == 201:
+        resposta['Location'] = reverse('veiculo:api_detalhe', args=[recurso.nome, objeto.pk])
+    return resposta
+
+
+def _valores_atuais(recurso, instancia):
+    """Valores do formulário preenchido com o registro, base para o PATCH."""
+    return {campo.name: campo.value() for campo in recurso.formulario(instance=instancia)}
+
+
+def _verificar_acesso(request, escrita):
+    if not request.user.is_authenticated:
+        raise ErroDaApi('Autenticação necessária.', status=401)
+    if escrita and papel_do_usuario(request) not in PAPEIS_DE_ESCRITA:
+        raise ErroDaApi('Você não possui permissão para realizar esta ação.', status=403)
+
+
+def _recurso(nome):
+    try:
+        return RECURSOS[nome]
+    except KeyError:
+        raise ErroDaApi('Recurso não encontrado.', status=404)
+
+
+def _nao_permitido(permitidos):
+    resposta = _erro('Método não permitido.', status=405)
+    resposta['Allow'] = ', '.join(permitidos)
+    return resposta
+
+
+def colecao(request, recurso):
+    """GET lista, POST cria."""
+    try:
+        recurso = _recurso(recurso)
+        if request.method == 'GET':
+            _verificar_acesso(request, escrita=False)
+            return _listar(request, recurso)
+        if request.method == 'POST':
+            _verificar_acesso(request, escrita=True)
+            return _gravar(request, recurso, _corpo_json(request), status=201)
+        return _nao_permitido(['GET', 'POST'])
+    except ErroDaApi as erro:
+        return _erro(erro.mensagem, erro.status, erro.erros)
+
+
+def detalhe(request, recurso, pk):
+    """GET, PUT, PATCH e DELETE de um registro."""
+    try:
+        recurso = _recurso(recurso)
+        if request.method == 'GET':
+            _verificar_acesso(request, escrita=False)
+            return _detalhar(request, recurso, pk)
+        if request.method not in ('PUT', 'PATCH', 'DELETE'):
+            return _nao_permitido(['GET', 'PUT', 'PATCH', 'DELETE'])
+
+        _verificar_acesso(request, escrita=True)
+        instancia = _obter(recurso.modelo.objects.all(), pk)
+        if request.method == 'DELETE':
+            instancia.delete()
+            return HttpResponse(status=204)
+
+        dados = _corpo_json(request)
+        if request.method == 'PATCH':
+            dados = {**_valores_atuais(recurso, instancia), **dados}
+        return _gravar(request, recurso, dados, instancia=instancia)
+    except ErroDaApi as erro:
+        return _erro(erro.mensagem, erro.status, erro.erros)
@@ -0,0 +1,231 @@
+"""
+Balanceamento da carga entre os caminhões. A carga de um veículo é o tempo
+de serviço semanal das suas rotas (duração × dias em que operam), com a
+divisão por dia da semana e a janela de horários como apoio.
+
+propor_redistribuicao() é uma heurística gulosa, por tipo de veículo:
+enquanto a diferença entre o mais e o menos carregado passar da
+tolerância, move do mais carregado a maior rota que cabe em um caminhão
+mais leve (mesmo tipo, horário livre e sem sobreposição na escala) e que
+seja menor que a diferença. Cada movimento reduz a dispersão das cargas,
+então o processo termina. As verificações usam apenas estruturas em
+memória (IndiceDeHorarios e os horários ocupados por veículo). A tela lê a
+situação da frota uma vez (duas consultas) e a passa para cargas() e
+propor_redistribuicao().
+
+aplicar_propostas() trava os veículos de origem e destino, em ordem de pk,
+como a validação do formulário de rota (conflitos.indice_do_veiculo), então
+revalida as propostas aceitas e as grava na mesma transação, com um UPDATE
+por veículo de destino.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .agenda import invalidar as invalidar_agenda
+from .conflitos import IndiceDeHorarios, descrever
+from .dias_semana import DIAS
+from .models import EstatisticaDiaria, Rota, Veiculo, _chave_estatistica
+from .referencias import ROTAS, invalidar as invalidar_referencias
+
+# Diferença de carga semanal (minutos) a partir da qual vale mover rotas
+TOLERANCIA_MINUTOS = getattr(settings, 'BALANCEAMENTO_TOLERANCIA_MINUTOS', 60)
+# Movimentos propostos por vez
+LIMITE_PROPOSTAS = 200
+
+
+def minutos_semanais(duracao, mascara):
+    return duracao * bin(mascara).count('1')
+
+
+def _minutos_do_dia(horario):
+    return horario.hour * 60 + horario.minute
+
+
+def _formatar_minutos(minutos):
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def situacao_da_frota():
+    """Veículos ativos ({id: Veiculo}) e as rotas de cada um ({veiculo_id: [dict]})."""
+    veiculos = Veiculo.objects.filter(ativo=True).in_bulk()
+    rotas = defaultdict(list)
+    linhas = Rota.objects.filter(veiculo_id__in=veiculos).order_by('horario', 'id').values(
+        'id', 'veiculo_id', 'local', 'horario', 'duracao', 'dias_mask'
+    )
+    for linha in linhas:
+        linha['minutos'] = minutos_semanais(linha['duracao'], linha['dias_mask'])
+        rotas[linha['veiculo_id']].append(linha)
+    return veiculos, rotas
+
+
+def _carga(veiculo, rotas):
+    por_dia = [0] * len(DIAS)
+    for rota in rotas:
+        for dia in range(len(DIAS)):
+            if rota['dias_mask'] & (1 << dia):
+                por_dia[dia] += rota['duracao']
+    operando = [rota for rota in rotas if rota['dias_mask']]
+    return {
+        'veiculo': veiculo,
+        'rotas': len(rotas),
+        'minutos': sum(por_dia),
+        'por_dia': por_dia,
+        'inicio': _formatar_minutos(min(_minutos_do_dia(r['horario']) for r in operando)) if operando else None,
+        'fim': _formatar_minutos(min(
+            24 * 60, max(_minutos_do_dia(r['horario']) + r['duracao'] for r in operando)
+        )) if operando else None,
+    }
+
+
+def cargas(situacao=None):
+    """Carga de cada veículo ativo, por tipo e da maior para a menor."""
+    veiculos, rotas = situacao or situacao_da_frota()
+    resultado = [_carga(veiculo, rotas[veiculo.pk]) for veiculo in veiculos.values()]
+    return sorted(resultado, key=lambda carga: (carga['veiculo'].tipo, -carga['minutos'], carga['veiculo'].placa))
+
+
+def _balancear_tipo(veiculo_ids, rotas, indice, carga, tolerancia, limite):
+    """Movimentos [(rota, origem, destino)] entre os veículos de um mesmo tipo."""
+    ocupados = {veiculo_id: {rota['horario'] for rota in rotas[veiculo_id]} for veiculo_id in veiculo_ids}
+    movimentos = []
+    while len(movimentos) < limite:
+        ordenados = sorted(veiculo_ids, key=lambda veiculo_id: (carga[veiculo_id], veiculo_id))
+        movimento = None
+        for origem in reversed(ordenados):
+            candidatas = sorted(rotas[origem], key=lambda rota: -rota['minutos'])
+            for destino in ordenados:
+                diferenca = carga[origem] - carga[destino]
+                if diferenca <= tolerancia:
+                    break
+                for rota in candidatas:
+                    if not 0 < rota['minutos'] < diferenca or rota['horario'] in ocupados[destino]:
+                        continue
+                    if not indice.conflitos(destino, rota['horario'], rota['duracao'], rota['dias_mask']):
+                        movimento = (rota, origem, destino)
+                        break
+                if movimento:
+                    break
+            if movimento:
+                break
+        if movimento is None:
+            return movimentos
+
+        rota, origem, destino = movimento
+        rotas[origem].remove(rota)
+        rotas[destino].append(rota)
+        ocupados[origem].discard(rota['horario'])
+        ocupados[destino].add(rota['horario'])
+        indice.remover(rota['id'])
+        indice.adicionar(rota['id'], destino, rota['horario'], rota['duracao'], rota['dias_mask'])
+        carga[origem] -= rota['minutos']
+        carga[destino] += rota['minutos']
+        movimentos.append(movimento)
+    return movimentos
+
+
+def propor_redistribuicao(tolerancia=TOLERANCIA_MINUTOS, limite=LIMITE_PROPOSTAS, situacao=None):
+    """
+    Rotas a mover para equilibrar a carga semanal entre veículos ativos do
+    mesmo tipo: [{'rota_id', 'local', 'horario', 'minutos', 'origem',
+    'destino'}], com origem e destino como instâncias de Veiculo.
+    """
+    veiculos, rotas = situacao or situacao_da_frota()
+    # A simulação move rotas entre as listas; a situação recebida fica intacta
+    rotas = defaultdict(list, {veiculo_id: list(lista) for veiculo_id, lista in rotas.items()})
+    indice = IndiceDeHorarios()
+    for veiculo_id, lista in rotas.items():
+        for rota in lista:
+            if rota['dias_mask']:
+                indice.adicionar(rota['id'], veiculo_id, rota['horario'], rota['duracao'], rota['dias_mask'])
+    carga = {veiculo_id: sum(rota['minutos'] for rota in rotas[veiculo_id]) for veiculo_id in veiculos}
+
+    por_tipo = defaultdict(list)
+    for veiculo in veiculos.values():
+        por_tipo[veiculo.tipo].append(veiculo.pk)
+
+    # Uma rota movida mais de uma vez fica só com a origem e o destino finais
+    propostas = {}
+    for veiculo_ids in por_tipo.values():
+        movimentos = _balancear_tipo(veiculo_ids, rotas, indice, carga, tolerancia, limite - len(propostas))
+        for rota, origem, destino in movimentos:
+            origem = propostas.pop(rota['id'], {}).get('origem', veiculos[origem])
+            if origem.pk != destino:
+                propostas[rota['id']] = {
+                    'rota_id': rota['id'],
+                    'local': rota['local'],
+                    'horario': rota['horario'],
+                    'minutos': rota['minutos'],
+                    'origem': origem,
+                    'destino': veiculos[destino],
+                }
+    return sorted(propostas.values(), key=lambda proposta: (proposta['origem'].placa, proposta['horario']))
+
+
+def aplicar_propostas(pares):
+    """
+    Move cada rota de `pares` [(rota_id, veiculo_id de destino)] para o
+    destino, se ainda for válido. Retorna (movidas, {rota_id: motivo da recusa}).
+    """
+    pares = list(dict(pares).items())
+    recusadas = {}
+    grupos = defaultdict(list)
+    rota_ids = [rota_id for rota_id, _ in pares]
+    with transaction.atomic():
+        # Veículos antes das rotas e em ordem de pk, como na validação do
+        # formulário: uma rota gravada ao mesmo tempo espera esta transação
+        origens = set(Rota.objects.filter(pk__in=rota_ids).values_list('veiculo_id', flat=True))
+        veiculos = {
+            veiculo.pk: veiculo
+            for veiculo in Veiculo.objects.select_for_update().filter(
+                pk__in=origens | {destino_id for _, destino_id in pares}
+            ).order_by('pk')
+        }
+        rotas = Rota.objects.select_for_update().in_bulk(rota_ids)
+        envolvidos = set(veiculos)
+        indice = IndiceDeHorarios().carregar(envolvidos)
+        ocupados = set(Rota.objects.filter(veiculo_id__in=envolvidos).values_list('veiculo_id', 'horario'))
+
+        chaves, mascara, movidas = set(), 0, []
+        for rota_id, destino_id in pares:
+            rota, destino = rotas.get(rota_id), veiculos.get(destino_id)
+            if rota is None:
+                recusadas[rota_id] = 'Rota não encontrada.'
+            elif rota.veiculo_id not in veiculos:
+                recusadas[rota_id] = 'A rota mudou de veículo enquanto a proposta era aplicada.'
+            elif destino is None or not destino.ativo:
+                recusadas[rota_id] = 'Veículo de destino inexistente ou inativo.'
+            elif destino.pk == rota.veiculo_id:
+                recusadas[rota_id] = 'A rota já está neste veículo.'
+            elif destino.tipo != veiculos[rota.veiculo_id].tipo:
+                recusadas[rota_id] = 'Veículo de destino de outro tipo.'
+            elif (destino.pk, rota.horario) in ocupados:
+                recusadas[rota_id] = 'O veículo de destino já tem uma rota neste horário.'
+            elif conflitos := indice.conflitos(destino.pk, rota.horario, rota.duracao, rota.dias_mask):
+                recusadas[rota_id] = descrever(conflitos)
+            else:
+                chaves.add(_chave_estatistica(rota))
+                ocupados.discard((rota.veiculo_id, rota.horario))
+                ocupados.add((destino.pk, rota.horario))
+                indice.remover(rota.pk)
+                indice.adicionar(rota.pk, destino.pk, rota.horario, rota.duracao, rota.dias_mask)
+                movidas.append((rota.veiculo_id, destino.pk))
+                rota.veiculo_id = destino.pk
+                chaves.add(_chave_estatistica(rota))
+                mascara |= rota.dias_mask
+                grupos[destino.pk].append(rota.pk)
+
+        agora = timezone.now()
+        for destino_id, rota_ids in grupos.items():
+            # update() não aplica auto_now; a data de atualização vai junto
+            Rota.objects.filter(pk__in=rota_ids).update(veiculo_id=destino_id, data_atualizacao=agora)
+
+        # update() não dispara os signals do snapshot diário e dos caches de rotas
+        EstatisticaDiaria.recalcular_chaves(chaves - {None})
+        if movidas:
+            invalidar_referencias(ROTAS)
+            invalidar_agenda(mascara)
+
+    return len(movidas), recusadas
@@ -0,0 +1,364 @@
+"""
+Benchmark das views de app_veiculo e app_usuario: popula o banco em escala
+configurável e mede latência (p50/p95) e número de consultas de cada URL
+pelo cliente de teste do Django. Usado pelo comando `benchmark_views`.
+
+medir_conexoes() conta as conexões abertas com e sem conexão persistente
+(CONN_MAX_AGE) contra um banco SQLite em arquivo. Abrir uma conexão SQLite
+não custa quase nada, então o custo de conectar ao MySQL é simulado com uma
+espera fixa: as requisições por segundo mostram o efeito dessa latência
+simulada, não uma medida do servidor real.
+"""
+import datetime
+import math
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.utils import ConnectionHandler
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from app_usuario import urls as urls_usuario
+from app_usuario.models import PerfilUsuario
+
+from . import agenda, urls as urls_veiculo
+from .busca import reconstruir_indice
+from .dias_semana import interpretar
+from .models import Veiculo, Rota, OcorrenciaRota, ProblemaColeta, EstatisticaDiaria, BacklogDiario
+from .referencias import ROTAS, VEICULOS, invalidar
+
+ESCALA_PADRAO = {'veiculos': 5_000, 'rotas': 50_000, 'problemas': 1_000_000}
+
+USUARIO_BENCHMARK = 'benchmark'
+
+# Views que encerram a sessão ou só aceitam POST não entram na medição
+IGNORADAS = {
+    'logout', 'veiculo_toggle_status', 'rota_toggle_status', 'problema_toggle_status',
+    'problema_status_lote', 'alterar_status_usuario',
+}
+
+# Variações com filtros que exercitam os caminhos mais caros das listagens
+VARIACOES = {
+    'veiculo:veiculo_list': ['?ativo=true', '?search=ABC'],
+    'veiculo:rota_list': ['?concluida=false', '?search=Rua'],
+    'veiculo:relatorio_rotas': ['?dias=qua'],
+    'veiculo:problema_list': ['?status=aberto', '?search=coleta'],
+}
+
+_DIAS = ['Seg, Qua, Sex', 'Ter, Qui', 'Segunda a Sexta', 'Sáb', 'Diariamente']
+_BAIRROS = ['Centro', 'Jardim América', 'Vila Nova', 'São José', 'Boa Vista', 'Industrial']
+_RUAS = ['Rua das Flores', 'Avenida Brasil', 'Rua Sete de Setembro', 'Travessa do Sol', 'Rua Principal']
+_DESCRICOES = [
+    'Coleta não realizada no horário previsto',
+    'Caminhão quebrado no meio da rota',
+    'Rua bloqueada por obras',
+    'Lixo espalhado após a coleta',
+    'Contêiner danificado',
+]
+
+
+def _placa(indice):
+    letras = ''
+    for _ in range(3):
+        indice, resto = divmod(indice, 26)
+        letras += chr(ord('A') + resto)
+    return f'{letras}{indice % 10_000:04d}'
+
+
+def _em_lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def popular_banco(veiculos, rotas, problemas, lote=5_000, semente=42, saida=None):
+    """
+    Apaga veículos, rotas e problemas e gera novos registros com bulk_create.
+    O snapshot de estatísticas, o backlog e o índice textual são reconstruídos no fim.
+    """
+    aleatorio = random.Random(semente)
+    agora = timezone.now()
+
+    def informar(mensagem):
+        if saida:
+            saida(mensagem)
+
+    # Cada veículo comporta até 1440 rotas (uma por minuto, unique_together)
+    if veiculos and rotas > veiculos * 1440:
+        raise ValueError('Rotas demais para a quantidade de veículos.')
+
+    with transaction.atomic():
+        Veiculo.objects.all().delete()
+
+        Veiculo.objects.bulk_create(
+            (
+                Veiculo(
+                    placa=_placa(indice),
+                    tipo='compactador' if indice % 3 else 'caçamba',
+                    numero_caminhao=f'CAM-{indice:06d}',
+                    ativo=indice % 10 != 0,
+                )
+                for indice in range(veiculos)
+            ),
+            batch_size=lote,
+        )
+        veiculo_ids = list(Veiculo.objects.order_by('id').values_list('id', flat=True))
+        informar(f'{len(veiculo_ids)} veículos')
+
+        def gerar_rotas():
+            for indice in range(rotas):
+                veiculo_id = veiculo_ids[indice % len(veiculo_ids)]
+                minuto = (indice // len(veiculo_ids)) * 7 % 1440
+                dias = _DIAS[indice % len(_DIAS)]
+                yield Rota(
+                    veiculo_id=veiculo_id,
+                    local=f'{aleatorio.choice(_RUAS)}, {indice % 900 + 1} - {aleatorio.choice(_BAIRROS)}',
+                    horario=datetime.time(minuto // 60, minuto % 60),
+                    duracao=5,
+                    dias_semana=dias,
+                    dias_mask=interpretar(dias),
+                )
+
+        for parte in _em_lotes(gerar_rotas(), lote):
+            Rota.objects.bulk_create(parte)
+        rotas_por_veiculo = dict(Rota.objects.order_by('veiculo_id', 'id').values_list('veiculo_id', 'id'))
+        informar(f'{rotas} rotas')
+
+        # Ocorrências do dia, com parte das coletas já concluída
+        OcorrenciaRota.abrir_dia(timezone.localdate())
+        ocorrencias = OcorrenciaRota.objects.filter(data=timezone.localdate()).values_list('id', flat=True)
+        concluidas = (pk for pk in ocorrencias.iterator() if aleatorio.random() < 0.4)
+        for parte in _em_lotes(concluidas, lote):
+            OcorrenciaRota.objects.filter(pk__in=parte).update(concluida=True, data_conclusao=agora)
+
+        tipos = [codigo for codigo, _ in ProblemaColeta.TIPO_PROBLEMA_CHOICES]
+        prioridades = [codigo for codigo, _ in ProblemaColeta.PRIORIDADE_CHOICES]
+        status = [codigo for codigo, _ in ProblemaColeta.STATUS_CHOICES]
+
+        def gerar_problemas():
+            for indice in range(problemas):
+                veiculo_id = aleatorio.choice(veiculo_ids)
+                situacao = aleatorio.choice(status)
+                ocorrencia = agora - datetime.timedelta(minutes=aleatorio.randrange(365 * 24 * 60))
+                yield ProblemaColeta(
+                    veiculo_id=veiculo_id,
+                    rota_id=rotas_por_veiculo.get(veiculo_id) if indice % 2 else None,
+                    tipo_problema=aleatorio.choice(tipos),
+                    prioridade=aleatorio.choice(prioridades),
+                    status=situacao,
+                    descricao=aleatorio.choice(_DESCRICOES),
+                    local_problema=f'{aleatorio.choice(_RUAS)} - {aleatorio.choice(_BAIRROS)}',
+                    data_ocorrencia=ocorrencia,
+                    responsavel_relato=f'Morador {indice % 5_000}',
+                    data_resolucao=ocorrencia + datetime.timedelta(hours=6) if situacao == 'resolvido' else None,
+                )
+
+        for numero, parte in enumerate(_em_lotes(gerar_problemas(), lote), start=1):
+            ProblemaColeta.objects.bulk_create(parte)
+            if numero % 20 == 0:
+                informar(f'{numero * lote} problemas')
+        informar(f'{problemas} problemas')
+
+    # bulk_create não dispara os signals do snapshot diário nem do cache
+    EstatisticaDiaria.reconstruir()
+    BacklogDiario.reconstruir()
+    reconstruir_indice()
+    invalidar(VEICULOS, ROTAS)
+    agenda.invalidar()
+
+
+def usuario_benchmark():
+    user, criado = User.objects.get_or_create(
+        username=USUARIO_BENCHMARK,
+        defaults={'email': f'{USUARIO_BENCHMARK}@benchmark.local'},
+    )
+    if criado:
+        user.set_unusable_password()
+        user.save()
+    # Pelo objeto em memória: salvar o usuário também salva user.perfil
+    user.perfil.status = 'admin'
+    user.perfil.ativo = True
+    user.perfil.save()
+    return user
+
+
+def _exemplos():
+    return {
+        'veiculo': Veiculo.objects.order_by('id').values_list('id', flat=True).first(),
+        'rota': Rota.objects.order_by('id').values_list('id', flat=True).first(),
+        'problema': ProblemaColeta.objects.order_by('id').values_list('id', flat=True).first(),
+        'usuario': PerfilUsuario.objects.order_by('id').values_list('id', flat=True).first(),
+    }
+
+
+def _argumentos(nome, padrao, exemplos):
+    kwargs = {}
+    for parametro in padrao.pattern.converters:
+        if parametro == 'pk':
+            prefixo = nome.split('_')[0]
+            valor = exemplos.get(prefixo) or exemplos['usuario']
+        elif parametro == 'data':
+            valor = timezone.localdate().isoformat()
+        else:
+            return None
+        if valor is None:
+            return None
+        kwargs[parametro] = valor
+    return kwargs
+
+
+def urls_medidas():
+    """Lista de (nome, url) cobrindo todas as rotas GET de app_veiculo e app_usuario."""
+    exemplos = _exemplos()
+    resultado = []
+    modulos = [(urls_usuario, None), (urls_veiculo, urls_veiculo.app_name)]
+    for modulo, namespace in modulos:
+        for padrao in modulo.urlpatterns:
+            if not isinstance(padrao, URLPattern) or not padrao.name or padrao.name in IGNORADAS:
+                continue
+            kwargs = _argumentos(padrao.name, padrao, exemplos)
+            if kwargs is None:
+                continue
+            nome = f'{namespace}:{padrao.name}' if namespace else padrao.name
+            url = reverse(nome, kwargs=kwargs)
+            resultado.append((nome, url))
+            for sufixo in VARIACOES.get(nome, []):
+                resultado.append((f'{nome}{sufixo}', url + sufixo))
+    return resultado
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo."""
+    ordenados = sorted(valores)
+    posicao = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[posicao]
+
+
+def medir(urls, repeticoes=20, aquecimento=1, cliente=None):
+    """Executa cada URL `repeticoes` vezes e devolve as métricas por nome."""
+    if cliente is None:
+        cliente = Client(HTTP_HOST='localhost')
+        cliente.force_login(usuario_benchmark())
+
+    resultados = {}
+    for nome, url in urls:
+        for _ in range(aquecimento):
+            cliente.get(url)
+
+        tempos = []
+        consultas = []
+        status = None
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                resposta = cliente.get(url)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(len(capturadas))
+            status = resposta.status_code
+
+        resultados[nome] = {
+            'url': url,
+            'status': status,
+            'p50_ms': round(percentil(tempos, 50), 2),
+            'p95_ms': round(percentil(tempos, 95), 2),
+            'media_ms': round(sum(tempos) / len(tempos), 2),
+            'consultas': max(consultas),
+        }
+    return resultados
+
+
+# Espera simulada por conexão aberta, no lugar do TCP + autenticação do MySQL (segundos)
+LATENCIA_CONEXAO = 0.002
+
+
+def medir_conexoes(requisicoes=200, conn_max_age=0, health_checks=True, latencia_conexao=LATENCIA_CONEXAO):
+    """
+    Repete o ciclo de conexão de uma requisição (close_old_connections no
+    início e no fim, como em request_started/request_finished, com uma
+    consulta no meio) contra um SQLite em arquivo, com uma espera simulada
+    de `latencia_conexao` a cada conexão aberta. Devolve as conexões
+    abertas e as requisições por segundo, que dependem dessa espera.
+    """
+    conexoes = []
+
+    def ao_conectar(sender, connection, **kwargs):
+        if connection is conexao:
+            conexoes.append(connection)
+            time.sleep(latencia_conexao)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Handler próprio: não mexe nas conexões da aplicação
+        bancos = ConnectionHandler({
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(diretorio, 'conexoes.sqlite3'),
+                'CONN_MAX_AGE': conn_max_age,
+                'CONN_HEALTH_CHECKS': health_checks,
+            }
+        })
+        conexao = bancos['default']
+        connection_created.connect(ao_conectar)
+        try:
+            with conexao.cursor() as cursor:
+                cursor.execute('CREATE TABLE rotas (id INTEGER PRIMARY KEY, local TEXT)')
+                cursor.executemany('INSERT INTO rotas (local) VALUES (%s)', [(f'Rua {i}',) for i in range(100)])
+            conexao.close()
+            conexoes.clear()
+
+            inicio = time.perf_counter()
+            for _ in range(requisicoes):
+                conexao.close_if_unusable_or_obsolete()
+                with conexao.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM rotas WHERE local LIKE %s', ['Rua 1%'])
+                    cursor.fetchone()
+                conexao.close_if_unusable_or_obsolete()
+            duracao = time.perf_counter() - inicio
+        finally:
+            connection_created.disconnect(ao_conectar)
+            bancos.close_all()
+
+    return {
+        'requisicoes': requisicoes,
+        'conexoes': len(conexoes),
+        'rps': round(requisicoes / duracao, 1),
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(anterior, atual, tolerancia=0.2):
+    """
+    Compara dois relatórios e devolve (nome, métrica, antes, depois) para as
+    views que ficaram mais lentas que a tolerância ou passaram a fazer mais consultas.
+    """
+    regressoes = []
+    for nome, metricas in atual['resultados'].items():
+        antes = anterior['resultados'].get(nome)
+        if not antes:
+            continue
+        if metricas['p95_ms'] > antes['p95_ms'] * (1 + tolerancia):
+            regressoes.append((nome, 'p95_ms', antes['p95_ms'], metricas['p95_ms']))
+        if metricas['consultas'] > antes['consultas']:
+            regressoes.append((nome, 'consultas', antes['consultas'], metricas['consultas']))
+    return regressoes
@@ -0,0 +1,104 @@
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, IntegerField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import ProblemaColeta, Veiculo
+
+TABELA_FTS = 'problemas_coleta_fts'
+INDICE_FULLTEXT = 'problema_busca_ft'
+
+
+def normalizar(texto):
+    """Remove acentos e caixa para que 'São João' e 'sao joao' sejam equivalentes."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def termos_da_busca(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def _busca_sqlite(problemas, termos):
+    # Cada termo vira um prefixo entre aspas; FTS5 combina os termos com AND.
+    # A tabela FTS entra no FROM e o MATCH roda uma vez: bm25() vem da mesma
+    # linha do índice, sem nova busca por problema. O "+" no rowid impede que
+    # o SQLite use a tabela FTS como laço interno (um MATCH por linha de
+    # problemas_coleta quando outro filtro, como status, tem índice).
+    # bm25() é negativo e menor para os mais relevantes.
+    consulta = ' '.join(f'"{termo}"*' for termo in termos)
+    tabela = ProblemaColeta._meta.db_table
+    return problemas.extra(
+        tables=[TABELA_FTS],
+        where=[f'{tabela}.id = +{TABELA_FTS}.rowid', f'{TABELA_FTS} MATCH %s'],
+        params=[consulta],
+    ).annotate(
+        relevancia=RawSQL(f'bm25({TABELA_FTS}, 1.0, 2.0, 1.0, 3.0)', [], output_field=FloatField())
+    )
+
+
+def _busca_mysql(problemas, termos, texto):
+    # MATCH ... AGAINST é positivo para os relevantes; o sinal invertido
+    # mantém a ordem crescente de `relevancia` da busca no SQLite
+    consulta = ' '.join(f'+{termo}*' for termo in termos)
+    match = 'MATCH(descricao, local_problema, responsavel_relato) AGAINST (%s IN BOOLEAN MODE)'
+    problemas = problemas.annotate(relevancia=RawSQL(f'-{match}', [consulta], output_field=FloatField()))
+
+    # A placa fica em outra tabela e não entra no índice FULLTEXT; os veículos
+    # são resolvidos antes, na tabela pequena
+    veiculos = list(Veiculo.objects.filter(placa__icontains=texto.strip()).values_list('pk', flat=True))
+    if not veiculos:
+        # MATCH sozinho no WHERE: o otimizador usa o índice FULLTEXT
+        return problemas.filter(RawSQL(match, [consulta], output_field=BooleanField()))
+
+    # Um OR entre o MATCH e a placa impediria o índice; a UNION junta as duas
+    # buscas indexadas, e a tabela derivada deixa o IN virar semijoin
+    tabela = ProblemaColeta._meta.db_table
+    marcadores = ', '.join(['%s'] * len(veiculos))
+    return problemas.filter(pk__in=RawSQL(
+        f'SELECT id FROM (SELECT id FROM {tabela} WHERE {match} '
+        f'UNION SELECT id FROM {tabela} WHERE veiculo_id IN ({marcadores})) AS busca',
+        [consulta, *veiculos],
+    ))
+
+
+def buscar_problemas(problemas, texto):
+    """
+    Restringe `problemas` aos resultados da busca textual, anotados com a
+    relevância (`relevancia`, menor = mais relevante). A busca e a ordenação
+    ficam no banco, junto com os demais filtros e a paginação. Em bancos sem
+    índice de busca, usa o filtro __icontains anterior.
+    """
+    termos = termos_da_busca(texto)
+    vendor = connections[problemas.db].vendor
+
+    if vendor not in ('sqlite', 'mysql'):
+        return problemas.filter(
+            Q(descricao__icontains=texto) |
+            Q(local_problema__icontains=texto) |
+            Q(responsavel_relato__icontains=texto) |
+            Q(veiculo__placa__icontains=texto)
+        ).annotate(relevancia=Value(0, output_field=IntegerField()))
+
+    if not termos:
+        return problemas.none().annotate(relevancia=Value(0, output_field=IntegerField()))
+
+    if vendor == 'sqlite':
+        return _busca_sqlite(problemas, termos)
+    return _busca_mysql(problemas, termos, texto)
+
+
+def reconstruir_indice(using='default'):
+    """Recria o conteúdo da tabela FTS5 a partir de problemas_coleta (apenas SQLite)."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA_FTS}')
+        cursor.execute(
+            f'INSERT INTO {TABELA_FTS}(rowid, descricao, local_problema, responsavel_relato, placa) '
+            'SELECT p.id, p.descricao, p.local_problema, p.responsavel_relato, v.placa '
+            'FROM problemas_coleta p JOIN veiculos v ON v.id = p.veiculo_id'
+        )
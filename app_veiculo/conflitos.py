@@ -0,0 +1,132 @@
+"""
+Detecção de conflitos de escala: um caminhão não pode ter duas rotas que se
+sobreponham (horário + duração) no mesmo dia da semana. Os intervalos de
+cada veículo/dia ficam em listas ordenadas pelo início, com o maior fim
+acumulado até cada posição. Uma busca binária nos inícios acha os
+intervalos que começam antes do fim do candidato; outra, nos fins
+acumulados, pula o prefixo em que nenhum termina depois do início dele.
+Só o trecho entre as duas é comparado, então uma rota longa que cobre o
+candidato é achada mesmo com outras começando entre as duas, e a consulta
+sem conflito não percorre a lista. Inserir e remover mantêm a ordem com
+list.insert/del (lineares no tamanho da lista de um veículo e dia) e
+descartam os fins acumulados, refeitos na próxima consulta.
+
+O formulário de rota lê o índice do banco a cada validação, com o veículo
+travado (select_for_update) até o fim da transação da view, para que duas
+gravações simultâneas não ocupem o mesmo horário.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate
+
+from django.db import transaction
+
+from .dias_semana import DIAS, texto_da_mascara
+from .models import Rota, Veiculo
+
+MINUTOS_DIA = 24 * 60
+
+
+def intervalos(horario, duracao, mascara):
+    """
+    (dia, início, fim) em minutos para cada dia da máscara. Uma coleta que
+    atravessa a meia-noite continua no início do dia seguinte.
+    """
+    inicio = horario.hour * 60 + horario.minute
+    fim = inicio + duracao
+    for dia in range(len(DIAS)):
+        if mascara & (1 << dia):
+            yield dia, inicio, min(fim, MINUTOS_DIA)
+            if fim > MINUTOS_DIA:
+                yield (dia + 1) % len(DIAS), 0, fim - MINUTOS_DIA
+
+
+class IndiceDeHorarios:
+    """Intervalos ordenados por veículo e dia da semana."""
+
+    def __init__(self):
+        self._inicios = defaultdict(list)
+        self._intervalos = defaultdict(list)
+        # Maior fim entre os intervalos até cada posição, por veículo/dia
+        self._maiores_fins = {}
+        self._por_rota = {}
+        self._veiculos = set()
+
+    def carregar(self, veiculos):
+        """Lê do banco, em uma consulta, as rotas dos veículos ainda não carregados."""
+        novos = set(veiculos) - self._veiculos
+        if not novos:
+            return self
+        rotas = Rota.objects.filter(veiculo_id__in=novos).exclude(dias_mask=0).values_list(
+            'id', 'veiculo_id', 'horario', 'duracao', 'dias_mask'
+        )
+        for rota_id, veiculo_id, horario, duracao, mascara in rotas:
+            self.adicionar(rota_id, veiculo_id, horario, duracao, mascara)
+        self._veiculos |= novos
+        return self
+
+    def adicionar(self, rota_id, veiculo_id, horario, duracao, mascara):
+        ocupados = []
+        for dia, inicio, fim in intervalos(horario, duracao, mascara):
+            chave = (veiculo_id, dia)
+            posicao = bisect_left(self._inicios[chave], inicio)
+            self._inicios[chave].insert(posicao, inicio)
+            self._intervalos[chave].insert(posicao, (inicio, fim, rota_id))
+            self._maiores_fins.pop(chave, None)
+            ocupados.append((chave, inicio))
+        self._por_rota[rota_id] = ocupados
+
+    def remover(self, rota_id):
+        for chave, inicio in self._por_rota.pop(rota_id, []):
+            inicios, lista = self._inicios[chave], self._intervalos[chave]
+            posicao = bisect_left(inicios, inicio)
+            while lista[posicao][2] != rota_id:
+                posicao += 1
+            del inicios[posicao]
+            del lista[posicao]
+            self._maiores_fins.pop(chave, None)
+
+    def _fins_acumulados(self, chave):
+        maiores = self._maiores_fins.get(chave)
+        if maiores is None:
+            maiores = list(accumulate((fim for _, fim, _ in self._intervalos[chave]), max))
+            self._maiores_fins[chave] = maiores
+        return maiores
+
+    def conflitos(self, veiculo_id, horario, duracao, mascara):
+        """{rota_id: máscara dos dias em conflito} para um intervalo candidato."""
+        encontrados = defaultdict(int)
+        for dia, inicio, fim in intervalos(horario, duracao, mascara):
+            chave = (veiculo_id, dia)
+            # Rotas que começam antes do fim do intervalo novo
+            limite = bisect_left(self._inicios.get(chave, []), fim)
+            if not limite:
+                continue
+            # Antes de `primeiro` nenhuma rota termina depois do início do novo
+            primeiro = bisect_right(self._fins_acumulados(chave), inicio, 0, limite)
+            for _, fim_existente, rota_id in self._intervalos[chave][primeiro:limite]:
+                if fim_existente > inicio:
+                    encontrados[rota_id] |= 1 << dia
+        return dict(encontrados)
+
+
+def indice_do_veiculo(veiculo_id):
+    """
+    Índice com as rotas atuais de um veículo, lido do banco. Dentro de uma
+    transação, o veículo fica travado até o commit.
+    """
+    with transaction.atomic():
+        list(Veiculo.objects.select_for_update().filter(pk=veiculo_id).values_list('pk'))
+        return IndiceDeHorarios().carregar([veiculo_id])
+
+
+def descrever(conflitos):
+    """Mensagem de erro com as rotas e os dias em conflito."""
+    rotas = Rota.objects.in_bulk([rota_id for rota_id in conflitos if isinstance(rota_id, int)])
+    partes = []
+    for rota_id, dias in conflitos.items():
+        rota = rotas.get(rota_id)
+        # Rotas ainda não gravadas (importação) são identificadas pela chave provisória
+        descricao = f'{rota.local} às {rota.horario:%H:%M}' if rota else str(rota_id)
+        partes.append(f'{descricao} ({texto_da_mascara(dias)})')
+    return 'Conflito de horário com: ' + '; '.join(partes) + '.'
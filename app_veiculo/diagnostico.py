@@ -0,0 +1,244 @@
+"""
+Coleta de métricas por view (consultas, tempo de SQL, tempo de template e
+consultas repetidas) para a página /veiculos/diagnostico/. As amostras ficam
+em um buffer circular em memória e, opcionalmente, são anexadas em lotes a
+um arquivo JSON Lines com rotação por tamanho.
+
+Só mede com DIAGNOSTICO_ATIVO ligado: sem ele o middleware se retira da
+pilha. O tempo de template vem do backend TemplatesCronometrados,
+configurado em TEMPLATES no lugar do DjangoTemplates.
+"""
+import atexit
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils import timezone
+
+# Quantidade de amostras mantidas em memória
+TAMANHO_BUFFER = getattr(settings, 'DIAGNOSTICO_TAMANHO_BUFFER', 1000)
+TAMANHO_MAXIMO_ARQUIVO = getattr(settings, 'DIAGNOSTICO_TAMANHO_MAXIMO_ARQUIVO', 10 * 1024 * 1024)
+
+
+def ativo():
+    return getattr(settings, 'DIAGNOSTICO_ATIVO', False)
+
+
+def amostragem():
+    # Fração das requisições medidas (0 desliga, 1 mede todas)
+    return getattr(settings, 'DIAGNOSTICO_AMOSTRAGEM', 0.1)
+
+
+def _arquivo():
+    # Arquivo .jsonl para guardar as amostras (None = só memória)
+    return getattr(settings, 'DIAGNOSTICO_ARQUIVO', None)
+
+
+def _lote_arquivo():
+    # Amostras acumuladas antes de cada gravação no arquivo
+    return getattr(settings, 'DIAGNOSTICO_LOTE_ARQUIVO', 50)
+
+
+# Segundos máximos que uma amostra espera para ir ao arquivo
+INTERVALO_ARQUIVO = 5
+
+_amostras = deque(maxlen=TAMANHO_BUFFER)
+_para_gravar = []
+_inicio_lote = 0.0
+_trava = threading.Lock()
+_trava_arquivo = threading.Lock()
+_local = threading.local()
+
+
+def impressao_digital(sql):
+    """Normaliza o SQL para que a mesma consulta com valores diferentes coincida."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class _Coletor:
+    """execute_wrapper que cronometra e agrupa as consultas de uma requisição."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.digitais = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_sql += time.perf_counter() - inicio
+            self.consultas += 1
+            self.digitais[impressao_digital(sql)] += 1
+
+
+class TemplateCronometrado(Template):
+    def render(self, context=None, request=None):
+        medicao = getattr(_local, 'medicao', None)
+        if medicao is None:
+            return super().render(context, request)
+
+        # Um template renderizado dentro de outro já conta no tempo do externo
+        medicao['profundidade'] += 1
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao['profundidade'] -= 1
+            if medicao['profundidade'] == 0:
+                medicao['tempo_template'] += time.perf_counter() - inicio
+
+
+class TemplatesCronometrados(DjangoTemplates):
+    """DjangoTemplates que cronometra a renderização nas requisições medidas."""
+
+    def from_string(self, template_code):
+        return TemplateCronometrado(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TemplateCronometrado(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def registrar(amostra):
+    global _inicio_lote
+    gravar = False
+    with _trava:
+        _amostras.append(amostra)
+        if _arquivo():
+            agora = time.monotonic()
+            if not _para_gravar:
+                _inicio_lote = agora
+            _para_gravar.append(amostra)
+            gravar = len(_para_gravar) >= _lote_arquivo() or agora - _inicio_lote >= INTERVALO_ARQUIVO
+    if gravar:
+        descarregar()
+
+
+def descarregar():
+    """Anexa ao arquivo as amostras acumuladas desde a última gravação."""
+    with _trava:
+        lote = list(_para_gravar)
+        _para_gravar.clear()
+    caminho = _arquivo()
+    if not caminho or not lote:
+        return
+    linhas = ''.join(json.dumps(amostra, ensure_ascii=False) + '\n' for amostra in lote)
+    # Fora da trava das amostras: a gravação não segura as outras requisições
+    with _trava_arquivo:
+        if os.path.exists(caminho) and os.path.getsize(caminho) >= TAMANHO_MAXIMO_ARQUIVO:
+            os.replace(caminho, f'{caminho}.1')
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linhas)
+
+
+atexit.register(descarregar)
+
+
+def amostras():
+    with _trava:
+        return list(_amostras)
+
+
+def limpar():
+    with _trava:
+        _amostras.clear()
+        _para_gravar.clear()
+
+
+def _p95(valores):
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(0.95 * len(ordenados)) - 1, 0)]
+
+
+def resumo():
+    """Métricas agregadas por view, das que mais consultam para as que menos."""
+    por_view = defaultdict(list)
+    for amostra in amostras():
+        por_view[amostra['view']].append(amostra)
+
+    linhas = []
+    for view, lista in por_view.items():
+        repetidas = Counter()
+        for amostra in lista:
+            for digital, vezes in amostra['repetidas'].items():
+                repetidas[digital] = max(repetidas[digital], vezes)
+        linhas.append({
+            'view': view,
+            'amostras': len(lista),
+            'consultas_media': round(sum(a['consultas'] for a in lista) / len(lista), 1),
+            'consultas_max': max(a['consultas'] for a in lista),
+            'sql_ms_media': round(sum(a['sql_ms'] for a in lista) / len(lista), 2),
+            'template_ms_media': round(sum(a['template_ms'] for a in lista) / len(lista), 2),
+            'total_ms_p95': round(_p95([a['total_ms'] for a in lista]), 2),
+            'repetidas': repetidas.most_common(5),
+        })
+    linhas.sort(key=lambda linha: linha['consultas_media'], reverse=True)
+    return linhas
+
+
+class DiagnosticoMiddleware:
+    """
+    Mede uma fração das requisições (DIAGNOSTICO_AMOSTRAGEM) e guarda o
+    resultado no buffer de diagnóstico. As demais passam sem custo extra;
+    com DIAGNOSTICO_ATIVO desligado o middleware nem entra na pilha.
+    """
+
+    def __init__(self, get_response):
+        if not ativo():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        fracao = amostragem()
+        if fracao <= 0 or random.random() >= fracao:
+            return self.get_response(request)
+
+        coletor = _Coletor()
+        _local.medicao = {'profundidade': 0, 'tempo_template': 0.0}
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for alias in connections:
+                    pilha.enter_context(connections[alias].execute_wrapper(coletor))
+                response = self.get_response(request)
+        finally:
+            medicao = _local.medicao
+            _local.medicao = None
+
+        total = time.perf_counter() - inicio
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.view_name:
+            registrar({
+                'view': match.view_name,
+                'caminho': request.path,
+                'status': response.status_code,
+                'momento': timezone.now().isoformat(),
+                'consultas': coletor.consultas,
+                'sql_ms': round(coletor.tempo_sql * 1000, 2),
+                'template_ms': round(medicao['tempo_template'] * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+                'repetidas': {
+                    digital: vezes for digital, vezes in coletor.digitais.items() if vezes > 1
+                },
+            })
+        return response
+
@@ -0,0 +1,116 @@
+"""
+Conversão entre o texto livre de `Rota.dias_semana` e a máscara de 7 bits
+de `Rota.dias_mask` (bit 0 = segunda ... bit 6 = domingo, como em
+`date.weekday()`).
+"""
+import datetime
+import re
+import unicodedata
+
+DIAS = ['seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom']
+ROTULOS = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+TODOS_OS_DIAS = (1 << len(DIAS)) - 1
+DIAS_UTEIS = sum(1 << indice for indice in range(5))
+FIM_DE_SEMANA = (1 << 5) | (1 << 6)
+
+_NOMES = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']
+# Só palavras inteiras: por prefixo, "terminal" seria terça e "quadra", quarta
+_PALAVRAS_DOS_DIAS = {
+    palavra: indice
+    for indice, (codigo, nome) in enumerate(zip(DIAS, _NOMES))
+    for palavra in (codigo, nome, nome + 's')
+}
+
+_SEPARADORES_DE_INTERVALO = {'a', 'ate', '-'}
+
+
+def bit_do_dia(dia):
+    """Bit de um dia informado como código ('qua'), nome ('Quarta'), data ou weekday()."""
+    if isinstance(dia, (datetime.date, datetime.datetime)):
+        return 1 << dia.weekday()
+    if isinstance(dia, int):
+        return 1 << dia
+    indice = _dia_da_palavra(re.sub(r'[-\s]*feira$', '', _normalizar(dia).strip()))
+    if indice is None:
+        raise ValueError(f'Dia da semana inválido: {dia!r}')
+    return 1 << indice
+
+
+def mascara_de_dias(dias):
+    mascara = 0
+    for dia in dias:
+        mascara |= bit_do_dia(dia)
+    return mascara
+
+
+def dias_da_mascara(mascara):
+    return [codigo for indice, codigo in enumerate(DIAS) if mascara & (1 << indice)]
+
+
+def texto_da_mascara(mascara):
+    """Texto padronizado gravado em dias_semana (ex: 'Seg, Qua, Sex')."""
+    return ', '.join(rotulo for indice, rotulo in enumerate(ROTULOS) if mascara & (1 << indice))
+
+
+def mascaras_com(mascara):
+    """
+    Todas as máscaras que têm ao menos um dos bits de `mascara`. Filtrar por
+    `dias_mask__in=` essa lista é uma busca no índice da coluna, ao contrário
+    de uma expressão bit a bit, que obriga a ler a tabela inteira.
+    """
+    return [valor for valor in range(1, TODOS_OS_DIAS + 1) if valor & mascara]
+
+
+def _normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _dia_da_palavra(palavra):
+    return _PALAVRAS_DOS_DIAS.get(palavra)
+
+
+def interpretar(texto):
+    """
+    Lê o texto livre de dias_semana ("Seg, Ter, Qua", "Segunda a Sexta",
+    "seg-sex", "Diariamente", "Fins de semana"...) e devolve a máscara.
+    Palavras não reconhecidas são ignoradas.
+    """
+    if not texto:
+        return 0
+
+    tokens = re.findall(r'[a-z]+|-', _normalizar(texto))
+    mascara = 0
+    anterior = None
+    intervalo = False
+
+    for posicao, token in enumerate(tokens):
+        if token in ('diario', 'diariamente') or (token == 'todos' and 'dias' in tokens[posicao + 1:posicao + 3]):
+            mascara |= TODOS_OS_DIAS
+            continue
+        if token == 'uteis':
+            mascara |= DIAS_UTEIS
+            continue
+        if token in ('fim', 'fins') and 'semana' in tokens[posicao + 1:posicao + 3]:
+            mascara |= FIM_DE_SEMANA
+            continue
+        if token in _SEPARADORES_DE_INTERVALO and anterior is not None:
+            intervalo = True
+            continue
+
+        dia = _dia_da_palavra(token)
+        if dia is None:
+            # Palavras como "feira" em "Segunda-feira, Quarta" encerram um intervalo aberto
+            intervalo = False
+            continue
+
+        if intervalo:
+            atual = anterior
+            while atual != dia:
+                atual = (atual + 1) % len(DIAS)
+                mascara |= 1 << atual
+            intervalo = False
+        mascara |= 1 << dia
+        anterior = dia
+
+    return mascara
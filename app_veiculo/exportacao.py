@@ -0,0 +1,232 @@
+"""
+Exportação dos relatórios em CSV e XLSX por streaming: as linhas saem do
+banco em lotes (cursor de CursorPaginator ou .iterator(chunk_size=...)) e
+são enviadas assim que escritas, sem montar o arquivo inteiro em memória.
+"""
+import csv
+import datetime
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .paginacao import CursorPaginator
+
+FORMATOS = ('csv', 'xlsx')
+
+# Linhas lidas do banco por vez
+TAMANHO_LOTE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def formato_solicitado(request):
+    """Formato pedido em ?exportar=csv|xlsx, ou None para a página HTML."""
+    formato = request.GET.get('exportar', '').lower()
+    return formato if formato in FORMATOS else None
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, datetime.datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, datetime.date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, datetime.time):
+        return valor.strftime('%H:%M')
+    return str(valor)
+
+
+class _Eco:
+    """Objeto "arquivo" que devolve o que recebe, para usar csv.writer em um gerador."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(cabecalho, linhas):
+    # BOM para o Excel reconhecer UTF-8; ';' é o separador do Excel em pt-BR
+    yield '\ufeff'
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield escritor.writerow(cabecalho)
+    for linha in linhas:
+        yield escritor.writerow([_texto(valor) for valor in linha])
+
+
+class _Saida:
+    """Destino não pesquisável do ZipFile; acumula bytes até o gerador retirá-los."""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook_xml(titulo):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(titulo[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celula(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_texto(valor))}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return '<row>' + ''.join(_celula(valor) for valor in valores) + '</row>'
+
+
+def linhas_xlsx(titulo, cabecalho, linhas, linhas_por_envio=500):
+    """
+    Gera um .xlsx mínimo (uma planilha, textos inline) escrito aos poucos
+    dentro do ZIP; cada bloco de linhas é enviado assim que comprimido.
+    """
+    saida = _Saida()
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as pacote:
+        pacote.writestr('[Content_Types].xml', _CONTENT_TYPES_XML)
+        pacote.writestr('_rels/.rels', _RELS_XML)
+        pacote.writestr('xl/workbook.xml', _workbook_xml(titulo))
+        pacote.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS_XML)
+        yield saida.retirar()
+
+        with pacote.open('xl/worksheets/sheet1.xml', 'w') as planilha:
+            planilha.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _linha_xml(cabecalho)
+            ).encode('utf-8'))
+
+            bloco = []
+            for linha in linhas:
+                bloco.append(_linha_xml(linha))
+                if len(bloco) >= linhas_por_envio:
+                    planilha.write(''.join(bloco).encode('utf-8'))
+                    bloco = []
+                    yield saida.retirar()
+            planilha.write((''.join(bloco) + '</sheetData></worksheet>').encode('utf-8'))
+    yield saida.retirar()
+
+
+def resposta_exportacao(formato, nome_arquivo, cabecalho, linhas, titulo='Relatório'):
+    """StreamingHttpResponse com o relatório no formato pedido."""
+    if formato == 'xlsx':
+        conteudo = linhas_xlsx(titulo, cabecalho, linhas)
+    else:
+        conteudo = linhas_csv(cabecalho, linhas)
+
+    response = StreamingHttpResponse(conteudo, content_type=CONTENT_TYPES[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return response
+
+
+def exportar_problemas(formato, problemas, nome_arquivo):
+    """Problemas de coleta em ordem cronológica, lidos em lotes pelo cursor."""
+    problemas = problemas.select_related('veiculo', 'rota')
+    cabecalho = [
+        'ID', 'Data da Ocorrência', 'Veículo', 'Rota', 'Tipo', 'Prioridade', 'Status',
+        'Local', 'Descrição', 'Responsável pelo Relato', 'Data da Resolução',
+    ]
+    linhas = (
+        [
+            problema.pk, problema.data_ocorrencia, problema.veiculo.placa,
+            problema.rota.local if problema.rota_id else '',
+            problema.get_tipo_problema_display(), problema.get_prioridade_display(),
+            problema.get_status_display(), problema.local_problema, problema.descricao,
+            problema.responsavel_relato, problema.data_resolucao,
+        ]
+        for problema in CursorPaginator(problemas, TAMANHO_LOTE, ('data_ocorrencia', 'id')).percorrer()
+    )
+    return resposta_exportacao(formato, nome_arquivo, cabecalho, linhas, titulo='Problemas')
+
+
+def exportar_rotas(formato, rotas, nome_arquivo):
+    """
+    Rotas anotadas por Rota.objects.com_situacao(), na mesma ordenação da
+    listagem, lidas em lotes pelo cursor.
+    """
+    rotas = rotas.select_related('veiculo')
+    cabecalho = ['ID', 'Veículo', 'Local', 'Horário', 'Dias da Semana', 'Concluída Hoje', 'Observações', 'Cadastro']
+    linhas = (
+        [
+            rota.pk, rota.veiculo.placa, rota.local, rota.horario, rota.dias_semana,
+            rota.concluida, rota.observacoes, rota.data_cadastro,
+        ]
+        for rota in CursorPaginator(rotas, TAMANHO_LOTE, ('horario', 'id')).percorrer()
+    )
+    return resposta_exportacao(formato, nome_arquivo, cabecalho, linhas, titulo='Rotas')
+
+
+def exportar_veiculos(formato, veiculos, nome_arquivo):
+    """Veículos anotados por veiculos_com_estatisticas()."""
+    cabecalho = [
+        'Placa', 'Tipo', 'Número do Caminhão', 'Ativo', 'Total de Rotas', 'Concluídas Hoje',
+        'Pendentes Hoje', 'Problemas', 'Problemas em Aberto', 'Cadastro',
+    ]
+    linhas = (
+        [
+            veiculo.placa, veiculo.get_tipo_display(), veiculo.numero_caminhao, veiculo.ativo,
+            veiculo.total_rotas, veiculo.rotas_concluidas, veiculo.rotas_pendentes,
+            veiculo.total_problemas, veiculo.problemas_abertos, veiculo.data_cadastro,
+        ]
+        for veiculo in veiculos.iterator(chunk_size=TAMANHO_LOTE)
+    )
+    return resposta_exportacao(formato, nome_arquivo, cabecalho, linhas, titulo='Veículos')
@@ -0,0 +1,283 @@
+"""
+Fila local de denúncias de cidadãos. A view grava a denúncia já validada em
+um arquivo SQLite próprio (modo WAL, fora do banco principal) e responde na
+hora com o protocolo; o comando `processar_denuncias` drena a fila para
+ProblemaColeta com bulk_create. O protocolo de cada denúncia aplicada fica
+gravado (no ProblemaColeta criado ou em DenunciaAgrupada), então um lote
+reprocessado depois de uma queda não duplica nem reconta denúncias.
+
+Cada drenagem reserva o seu lote (BEGIN IMMEDIATE + prazo de reserva), então
+dois processos (cron e `--continuo`) não pegam as mesmas linhas. Uma denúncia
+que falha é marcada com o erro e não segura o resto da fila.
+"""
+import datetime
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+
+from .agrupamento import agrupar_lote, incrementar
+from .models import (
+    Rota, ProblemaColeta, DenunciaAgrupada, EstatisticaDiaria, BacklogDiario, _chave_backlog,
+)
+
+TAMANHO_LOTE = 500
+
+# Depois de tantas falhas a denúncia deixa de ser tentada e fica para análise
+MAXIMO_TENTATIVAS = 5
+
+# Prazo da reserva de um lote; se o processo cair, o lote volta para a fila depois dele
+RESERVA_SEGUNDOS = 300
+
+_local = threading.local()
+
+_CRIAR_TABELA = '''
+    CREATE TABLE IF NOT EXISTS denuncias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recebida_em REAL NOT NULL,
+        dados TEXT NOT NULL,
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        erro TEXT,
+        reservada_ate REAL
+    )
+'''
+
+
+def _arquivo():
+    return str(getattr(settings, 'DENUNCIAS_FILA_ARQUIVO', settings.BASE_DIR / 'fila_denuncias.sqlite3'))
+
+
+def ativa():
+    """Se False, as denúncias são gravadas direto no banco, como antes da fila."""
+    return getattr(settings, 'DENUNCIAS_ASSINCRONAS', True)
+
+
+def _conexao():
+    # Uma conexão por thread e por arquivo (os testes trocam o arquivo)
+    caminho = _arquivo()
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conexao = conexoes.get(caminho)
+    if conexao is None:
+        conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL: a gravação sobrevive à queda do processo, e o fsync fica no checkpoint
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        conexao.execute(_CRIAR_TABELA)
+        colunas = {linha[1] for linha in conexao.execute('PRAGMA table_info(denuncias)')}
+        if 'reservada_ate' not in colunas:
+            # Arquivo criado antes da reserva de lotes
+            conexao.execute('ALTER TABLE denuncias ADD COLUMN reservada_ate REAL')
+        conexoes[caminho] = conexao
+    return conexao
+
+
+def novo_protocolo():
+    return uuid.uuid4().hex
+
+
+def enfileirar(dados):
+    """Acrescenta uma denúncia (dicionário serializável em JSON) e devolve o id na fila."""
+    cursor = _conexao().execute(
+        'INSERT INTO denuncias (recebida_em, dados) VALUES (?, ?)',
+        (time.time(), json.dumps(dados, ensure_ascii=False)),
+    )
+    return cursor.lastrowid
+
+
+def pendentes(limite=TAMANHO_LOTE):
+    """As denúncias mais antigas ainda não gravadas: [(id, dados)]."""
+    linhas = _conexao().execute(
+        'SELECT id, dados FROM denuncias WHERE tentativas < ? ORDER BY id LIMIT ?',
+        (MAXIMO_TENTATIVAS, limite),
+    ).fetchall()
+    return [(identificador, json.loads(dados)) for identificador, dados in linhas]
+
+
+def reservar(limite=TAMANHO_LOTE):
+    """
+    Reserva as denúncias pendentes mais antigas para esta drenagem e devolve
+    [(id, dados em JSON)]. BEGIN IMMEDIATE pega o lock de escrita do arquivo
+    antes da leitura, então outra drenagem não reserva as mesmas linhas.
+    """
+    conexao = _conexao()
+    agora = time.time()
+    conexao.execute('BEGIN IMMEDIATE')
+    try:
+        linhas = conexao.execute(
+            'SELECT id, dados FROM denuncias WHERE tentativas < ? '
+            'AND (reservada_ate IS NULL OR reservada_ate < ?) ORDER BY id LIMIT ?',
+            (MAXIMO_TENTATIVAS, agora, limite),
+        ).fetchall()
+        conexao.executemany(
+            'UPDATE denuncias SET reservada_ate = ? WHERE id = ?',
+            [(agora + RESERVA_SEGUNDOS, identificador) for identificador, _ in linhas],
+        )
+    except BaseException:
+        conexao.execute('ROLLBACK')
+        raise
+    conexao.execute('COMMIT')
+    return linhas
+
+
+def liberar(ids):
+    """Devolve à fila, sem contar tentativa, denúncias reservadas que não foram gravadas."""
+    if ids:
+        conexao = _conexao()
+        with conexao:
+            conexao.executemany('UPDATE denuncias SET reservada_ate = NULL WHERE id = ?', [(i,) for i in ids])
+
+
+def confirmar(ids):
+    if ids:
+        conexao = _conexao()
+        with conexao:
+            conexao.executemany('DELETE FROM denuncias WHERE id = ?', [(i,) for i in ids])
+
+
+def registrar_falhas(falhas):
+    if falhas:
+        conexao = _conexao()
+        with conexao:
+            conexao.executemany(
+                'UPDATE denuncias SET tentativas = tentativas + 1, erro = ?, reservada_ate = NULL WHERE id = ?',
+                [(erro, identificador) for identificador, erro in falhas],
+            )
+
+
+def situacao():
+    """Profundidade e atraso da fila, para o painel de diagnóstico."""
+    total, com_erro, mais_antiga = _conexao().execute(
+        'SELECT COUNT(*), COALESCE(SUM(tentativas >= ?), 0), MIN(CASE WHEN tentativas < ? THEN recebida_em END) '
+        'FROM denuncias',
+        (MAXIMO_TENTATIVAS, MAXIMO_TENTATIVAS),
+    ).fetchone()
+    return {
+        'pendentes': total - com_erro,
+        'com_erro': com_erro,
+        'atraso_segundos': round(time.time() - mais_antiga, 1) if mais_antiga else 0,
+    }
+
+
+def com_erro(limite=50):
+    """Denúncias que esgotaram as tentativas: [(id, dados, erro)]."""
+    linhas = _conexao().execute(
+        'SELECT id, dados, erro FROM denuncias WHERE tentativas >= ? ORDER BY id LIMIT ?',
+        (MAXIMO_TENTATIVAS, limite),
+    ).fetchall()
+    return [(identificador, json.loads(dados), erro) for identificador, dados, erro in linhas]
+
+
+def _nao_aplicadas(problemas):
+    """Descarta denúncias cujo protocolo já foi aplicado ou se repete no lote."""
+    protocolos = [problema.protocolo for problema in problemas]
+    aplicados = set(
+        ProblemaColeta.objects.filter(protocolo__in=protocolos).order_by()
+        .values_list('protocolo', flat=True)
+        .union(DenunciaAgrupada.objects.filter(protocolo__in=protocolos).values_list('protocolo', flat=True))
+    )
+    restantes = []
+    for problema in problemas:
+        if problema.protocolo not in aplicados:
+            aplicados.add(problema.protocolo)
+            restantes.append(problema)
+    return restantes
+
+
+def _montar(dados, rotas):
+    rota = rotas.get(dados['rota_id'])
+    if rota is None:
+        raise ValueError('Rota não encontrada (excluída depois do envio).')
+    return ProblemaColeta(
+        protocolo=dados['protocolo'],
+        veiculo_id=rota.veiculo_id,
+        rota_id=rota.pk,
+        tipo_problema='coleta_nao_feita',
+        prioridade='media',
+        status='aberto',
+        descricao=dados['descricao'],
+        local_problema=dados['local_problema'],
+        latitude=dados.get('latitude'),
+        longitude=dados.get('longitude'),
+        data_ocorrencia=datetime.datetime.fromisoformat(dados['data_ocorrencia']),
+        responsavel_relato=dados['responsavel_relato'],
+        observacoes=dados.get('observacoes') or None,
+    )
+
+
+def _aplicar(lista_dados, rotas):
+    # Os objetos são montados a cada tentativa: agrupar_lote altera os contadores
+    problemas = [_montar(dados, rotas) for dados in lista_dados]
+    with transaction.atomic():
+        # Lote repetido após uma queda: o que já foi aplicado não entra de novo
+        problemas = _nao_aplicadas(problemas)
+        # Denúncias repetidas só incrementam o contador do problema já aberto
+        novos, repetidas = agrupar_lote(problemas)
+        ProblemaColeta.objects.bulk_create(novos, ignore_conflicts=True)
+        incrementar(repetidas)
+        criados = {problema.protocolo for problema in novos}
+        DenunciaAgrupada.objects.bulk_create([
+            DenunciaAgrupada(protocolo=problema.protocolo)
+            for problema in problemas if problema.protocolo not in criados
+        ], ignore_conflicts=True)
+        # bulk_create não dispara os signals do snapshot diário nem do backlog;
+        # com ignore_conflicts não se sabe quais entraram, então recontamos os dias
+        EstatisticaDiaria.recalcular_registros(novos)
+        BacklogDiario.recalcular_chaves({_chave_backlog(problema) for problema in novos} - {None})
+
+
+def _descrever(erro):
+    return f'{type(erro).__name__}: {erro}'
+
+
+def drenar(tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava um lote da fila em ProblemaColeta com bulk_create e o remove da
+    fila. Devolve (processadas, falhas); (0, 0) quando a fila está vazia.
+    Denúncias agrupadas a um problema aberto e as já aplicadas por um lote
+    anterior contam como processadas. Se o lote falhar, cada denúncia é
+    tentada na sua própria transação e só as que falham ficam com o erro;
+    uma falha de conexão devolve o lote inteiro à fila.
+    """
+    itens = reservar(tamanho_lote)
+    if not itens:
+        return 0, 0
+
+    validas, falhas, rota_ids = {}, [], set()
+    for identificador, texto in itens:
+        try:
+            dados = json.loads(texto)
+            rota_ids.add(dados['rota_id'])
+        except (ValueError, TypeError, KeyError) as erro:
+            falhas.append((identificador, f'Dados inválidos: {_descrever(erro)}'))
+        else:
+            validas[identificador] = dados
+
+    try:
+        rotas = Rota.objects.in_bulk(rota_ids)
+        try:
+            _aplicar(list(validas.values()), rotas)
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception:
+            for identificador, dados in list(validas.items()):
+                try:
+                    _aplicar([dados], rotas)
+                except (OperationalError, InterfaceError):
+                    raise
+                except Exception as erro:
+                    del validas[identificador]
+                    falhas.append((identificador, _descrever(erro)))
+    except BaseException:
+        # Banco fora do ar ou processo interrompido: nada é contado como tentativa
+        liberar([identificador for identificador, _ in itens])
+        raise
+
+    confirmar(list(validas))
+    registrar_falhas(falhas)
+    return len(validas), len(falhas)
@@ -0,0 +1,72 @@
+from django.db.models import Q
+
+from .busca import buscar_problemas
+from .dias_semana import interpretar, mascaras_com
+
+
+def filtrar_veiculos(veiculos, search='', tipo='', ativo=''):
+    """Aplica os filtros da listagem de veículos."""
+    if search:
+        veiculos = veiculos.filter(
+            Q(placa__icontains=search) |
+            Q(numero_caminhao__icontains=search)
+        )
+
+    if tipo:
+        veiculos = veiculos.filter(tipo=tipo)
+
+    if ativo != '':
+        veiculos = veiculos.filter(ativo=ativo == 'true')
+
+    return veiculos
+
+
+def filtrar_rotas(rotas, search='', veiculo='', concluida='', dias=''):
+    """
+    Aplica os filtros da listagem e do relatório de rotas. O filtro
+    `concluida` usa a situação de hoje anotada por Rota.objects.com_situacao();
+    pendentes são só as rotas que operam hoje.
+    """
+    if search:
+        rotas = rotas.filter(
+            Q(local__icontains=search) |
+            Q(veiculo__placa__icontains=search)
+        )
+
+    if veiculo:
+        rotas = rotas.filter(veiculo_id=veiculo)
+
+    if concluida == 'true':
+        rotas = rotas.filter(concluida=True)
+    elif concluida != '':
+        rotas = rotas.filter(concluida=False).operando_hoje()
+
+    if dias:
+        mascara = interpretar(dias)
+        if mascara:
+            rotas = rotas.filter(dias_mask__in=mascaras_com(mascara))
+        else:
+            rotas = rotas.filter(dias_semana__icontains=dias)
+
+    return rotas
+
+
+def filtrar_problemas(problemas, search='', veiculo='', tipo='', status='', prioridade=''):
+    """Aplica os filtros da listagem de problemas de coleta."""
+    if search:
+        # Busca pelo índice textual; o resultado vem anotado com `relevancia`
+        problemas = buscar_problemas(problemas, search)
+
+    if veiculo:
+        problemas = problemas.filter(veiculo_id=veiculo)
+
+    if tipo:
+        problemas = problemas.filter(tipo_problema=tipo)
+
+    if status:
+        problemas = problemas.filter(status=status)
+
+    if prioridade:
+        problemas = problemas.filter(prioridade=prioridade)
+
+    return problemas
@@ -1,7 +1,35 @@
 from django import forms
 from django.utils import timezone
 
+from . import fila_denuncias
+from .agrupamento import chave_agrupamento, incrementar, principal_de
+from .conflitos import descrever, indice_do_veiculo
+from .dias_semana import dias_da_mascara, interpretar, mascara_de_dias, texto_da_mascara
+from .localizacao import RAIO_SUGESTAO_KM, rota_mais_proxima
 from .models import Veiculo, Rota, ProblemaColeta
+from .referencias import aplicar_escolhas, escolhas_de_rotas, escolhas_de_veiculos
+from .status_problema import aplicar, mensagem_de_recusa, transicao_permitida
+
+def normalizar_placa(placa):
+    """Placa em maiúsculas, sem espaços nem hífen (ex: 'abc-1234' -> 'ABC1234')."""
+    return placa.strip().upper().replace('-', '').replace(' ', '')
+
+
+def widget_de_coordenada(placeholder):
+    return forms.NumberInput(attrs={'class': 'form-control', 'step': 'any', 'placeholder': placeholder})
+
+
+def _texto_ou_nada(valor):
+    # Decimal não é serializável em JSON; a fila guarda o texto
+    return None if valor is None else str(valor)
+
+
+def exigir_par_de_coordenadas(form, cleaned_data):
+    """Latitude e longitude são opcionais, mas andam juntas."""
+    latitude, longitude = cleaned_data.get('latitude'), cleaned_data.get('longitude')
+    if (latitude is None) != (longitude is None) and not form.has_error('latitude') and not form.has_error('longitude'):
+        form.add_error('latitude' if latitude is None else 'longitude', 'Informe latitude e longitude juntas.')
+
 
 class VeiculoForm(forms.ModelForm):
     class Meta:
@@ -34,13 +62,23 @@ class VeiculoForm(forms.ModelForm):
     def clean_placa(self):
         placa = self.cleaned_data.get('placa')
         if placa:
-            placa = placa.upper()
+            placa = normalizar_placa(placa)
         return placa
 
 class RotaForm(forms.ModelForm):
+    dias_semana = forms.MultipleChoiceField(
+        label='Dias da Semana',
+        choices=Rota.DIAS_SEMANA_CHOICES,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+    )
+
     class Meta:
         model = Rota
-        fields = ['veiculo', 'local', 'horario', 'dias_semana', 'observacoes', 'concluida']
+        fields = [
+            'veiculo', 'local', 'latitude', 'longitude', 'horario', 'duracao', 'dias_semana',
+            'observacoes',
+        ]
         widgets = {
             'veiculo': forms.Select(attrs={
                 'class': 'form-control'
@@ -49,43 +87,77 @@ class RotaForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Local da coleta'
             }),
+            'latitude': widget_de_coordenada('Ex: -23.550520'),
+            'longitude': widget_de_coordenada('Ex: -46.633308'),
             'horario': forms.TimeInput(attrs={
                 'class': 'form-control',
                 'type': 'time'
             }),
-            'dias_semana': forms.TextInput(attrs={
+            'duracao': forms.NumberInput(attrs={
                 'class': 'form-control',
-                'placeholder': 'Ex: Seg, Ter, Qua ou Segunda, Terça'
+                'min': '1',
+                'max': '1440'
             }),
             'observacoes': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 3,
                 'placeholder': 'Observações adicionais (opcional)'
             }),
-            'concluida': forms.CheckboxInput(attrs={
-                'class': 'form-check-input'
-            }),
         }
         labels = {
             'veiculo': 'Veículo',
             'local': 'Local da Coleta',
+            'latitude': 'Latitude (Opcional)',
+            'longitude': 'Longitude (Opcional)',
             'horario': 'Horário da Coleta',
+            'duracao': 'Duração (minutos)',
             'dias_semana': 'Dias da Semana',
             'observacoes': 'Observações',
-            'concluida': 'Rota Concluída',
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Filtrar apenas veículos ativos
+        # Filtrar apenas veículos ativos; as opções do select vêm do cache
         self.fields['veiculo'].queryset = Veiculo.objects.filter(ativo=True)
+        aplicar_escolhas(self.fields['veiculo'], escolhas_de_veiculos())
+
+        if self.instance.pk:
+            self.initial['dias_semana'] = dias_da_mascara(interpretar(self.instance.dias_semana))
+
+        # Sem duração informada, mantém a atual (ou o padrão do modelo)
+        self.fields['duracao'].required = False
+
+    def clean_duracao(self):
+        return self.cleaned_data.get('duracao') or self.instance.duracao
+
+    def clean_dias_semana(self):
+        # Grava a máscara de bits e o texto padronizado correspondente
+        mascara = mascara_de_dias(self.cleaned_data.get('dias_semana') or [])
+        self.instance.dias_mask = mascara
+        return texto_da_mascara(mascara) or None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        exigir_par_de_coordenadas(self, cleaned_data)
+        veiculo = cleaned_data.get('veiculo')
+        horario = cleaned_data.get('horario')
+        duracao = cleaned_data.get('duracao')
+        if veiculo and horario and duracao:
+            # Escala atual do veículo, lida com ele travado; a própria rota sai dela ao ser editada
+            indice = indice_do_veiculo(veiculo.pk)
+            if self.instance.pk:
+                indice.remover(self.instance.pk)
+            conflitos = indice.conflitos(veiculo.pk, horario, duracao, self.instance.dias_mask)
+            if conflitos:
+                self.add_error('horario', descrever(conflitos))
+        return cleaned_data
 
 class ProblemaColetaForm(forms.ModelForm):
     class Meta:
         model = ProblemaColeta
         fields = [
             'veiculo', 'rota', 'tipo_problema', 'prioridade', 'status',
-            'descricao', 'local_problema', 'data_ocorrencia', 
+            'descricao', 'local_problema', 'latitude', 'longitude', 'data_ocorrencia', 
             'responsavel_relato', 'solucao', 'observacoes'
         ]
         widgets = {
@@ -113,6 +185,8 @@ class ProblemaColetaForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Ex: Rua Principal, 123 - Centro'
             }),
+            'latitude': widget_de_coordenada('Ex: -23.550520'),
+            'longitude': widget_de_coordenada('Ex: -46.633308'),
             'data_ocorrencia': forms.DateTimeInput(attrs={
                 'class': 'form-control',
                 'type': 'datetime-local'
@@ -140,16 +214,20 @@ class ProblemaColetaForm(forms.ModelForm):
             'status': 'Status',
             'descricao': 'Descrição do Problema',
             'local_problema': 'Local do Problema',
+            'latitude': 'Latitude (Opcional)',
+            'longitude': 'Longitude (Opcional)',
             'data_ocorrencia': 'Data e Hora da Ocorrência',
             'responsavel_relato': 'Responsável pelo Relato',
             'solucao': 'Solução Aplicada',
             'observacoes': 'Observações',
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, user=None, **kwargs):
+        self.user = user
         super().__init__(*args, **kwargs)
-        # Filtrar apenas veículos ativos
+        # Filtrar apenas veículos ativos; as opções do select vêm do cache
         self.fields['veiculo'].queryset = Veiculo.objects.filter(ativo=True)
+        aplicar_escolhas(self.fields['veiculo'], escolhas_de_veiculos())
         
         # Filtrar rotas do veículo selecionado
         if 'veiculo' in self.data:
@@ -163,13 +241,36 @@ class ProblemaColetaForm(forms.ModelForm):
         else:
             self.fields['rota'].queryset = Rota.objects.none()
 
+    def clean_status(self):
+        status = self.cleaned_data.get('status')
+        anterior = self.instance.status
+        if self.instance.pk and status != anterior and not transicao_permitida(anterior, status):
+            raise forms.ValidationError(mensagem_de_recusa(anterior, status))
+        return status
+
+    def clean(self):
+        cleaned_data = super().clean()
+        exigir_par_de_coordenadas(self, cleaned_data)
+        return cleaned_data
+
+    def save(self, commit=True):
+        problema = super().save(commit=False)
+        # Data de resolução e autor da mudança de status, registrada no histórico
+        aplicar(problema, problema.status, usuario=self.user)
+        if commit:
+            problema.save()
+        return problema
+
 
 class DenunciaProblemaForm(forms.ModelForm):
     class Meta:
         model = ProblemaColeta
-        fields = ['rota', 'local_problema', 'data_ocorrencia', 'descricao', 'observacoes']
+        fields = ['rota', 'local_problema', 'latitude', 'longitude', 'data_ocorrencia', 'descricao', 'observacoes']
         widgets = {
             'rota': forms.Select(attrs={'class': 'form-control'}),
+            # Preenchidas pelo navegador com a localização do cidadão
+            'latitude': forms.HiddenInput(),
+            'longitude': forms.HiddenInput(),
             'local_problema': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Ex: Rua das Flores, nº 123 - Bairro Centro'
@@ -199,13 +300,43 @@ class DenunciaProblemaForm(forms.ModelForm):
 
     def __init__(self, *args, user=None, **kwargs):
         self.user = user
+        self.agrupada = False
         super().__init__(*args, **kwargs)
-        self.fields['rota'].queryset = Rota.objects.select_related('veiculo').order_by('local')
+        self.fields['rota'].queryset = Rota.objects.select_related('veiculo')
+        aplicar_escolhas(self.fields['rota'], escolhas_de_rotas())
+        # Com a localização, a rota pode ficar em branco e ser sugerida pela grade espacial
+        self.fields['rota'].required = False
 
         if not self.initial.get('data_ocorrencia') and 'data_ocorrencia' not in self.data:
             now = timezone.localtime().replace(second=0, microsecond=0)
             self.fields['data_ocorrencia'].initial = now.strftime('%Y-%m-%dT%H:%M')
 
+    def clean(self):
+        cleaned_data = super().clean()
+        exigir_par_de_coordenadas(self, cleaned_data)
+        if cleaned_data.get('rota') or self.has_error('rota'):
+            return cleaned_data
+
+        latitude, longitude = cleaned_data.get('latitude'), cleaned_data.get('longitude')
+        if latitude is None or longitude is None:
+            self.add_error('rota', 'Selecione a rota relacionada.')
+            return cleaned_data
+        rota_id = rota_mais_proxima(latitude, longitude)
+        rota = Rota.objects.select_related('veiculo').filter(pk=rota_id).first() if rota_id else None
+        if rota is None:
+            self.add_error(
+                'rota',
+                f'Nenhuma rota encontrada a até {RAIO_SUGESTAO_KM} km da sua localização; selecione a rota.',
+            )
+        else:
+            cleaned_data['rota'] = rota
+        return cleaned_data
+
+    def _responsavel(self):
+        if self.user and hasattr(self.user, 'perfil'):
+            return self.user.perfil.nome
+        return 'Cidadão'
+
     def save(self, commit=True):
         denuncia = super().save(commit=False)
         rota = self.cleaned_data['rota']
@@ -213,10 +344,30 @@ class DenunciaProblemaForm(forms.ModelForm):
         denuncia.tipo_problema = 'coleta_nao_feita'
         denuncia.prioridade = 'media'
         denuncia.status = 'aberto'
-        if self.user and hasattr(self.user, 'perfil'):
-            denuncia.responsavel_relato = self.user.perfil.nome
-        else:
-            denuncia.responsavel_relato = 'Cidadão'
+        denuncia.responsavel_relato = self._responsavel()
+        denuncia.chave_agrupamento = chave_agrupamento(rota.pk, denuncia.local_problema)
         if commit:
+            # Denúncia repetida (mesma rota e local, dentro da janela) reforça a existente
+            principal = principal_de(denuncia)
+            if principal is not None:
+                incrementar({principal.pk: 1})
+                self.agrupada = True
+                return principal
             denuncia.save()
         return denuncia
+
+    def enfileirar(self):
+        """Envia a denúncia validada para a fila de gravação e devolve o protocolo."""
+        protocolo = fila_denuncias.novo_protocolo()
+        fila_denuncias.enfileirar({
+            'protocolo': protocolo,
+            'rota_id': self.cleaned_data['rota'].pk,
+            'local_problema': self.cleaned_data['local_problema'],
+            'data_ocorrencia': self.cleaned_data['data_ocorrencia'].isoformat(),
+            'descricao': self.cleaned_data['descricao'],
+            'observacoes': self.cleaned_data.get('observacoes'),
+            'latitude': _texto_ou_nada(self.cleaned_data.get('latitude')),
+            'longitude': _texto_ou_nada(self.cleaned_data.get('longitude')),
+            'responsavel_relato': self._responsavel(),
+        })
+        return protocolo
@@ -0,0 +1,313 @@
+"""
+Importação em massa de veículos e rotas a partir de CSV. O arquivo é lido
+como stream e processado em lotes: cada lote é validado linha a linha e
+gravado em uma transação (bulk_create para os registros novos). Linhas inválidas entram
+no relatório de erros sem impedir a gravação das demais.
+"""
+import csv
+import datetime
+import unicodedata
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import agenda, conflitos
+from .dias_semana import interpretar, texto_da_mascara
+from .forms import normalizar_placa
+from .models import Veiculo, Rota, EstatisticaDiaria, _chave_estatistica
+from .referencias import ROTAS, VEICULOS, invalidar
+
+TAMANHO_LOTE = 1000
+
+COLUNAS_VEICULOS = ['placa', 'tipo', 'numero_caminhao', 'ativo']
+COLUNAS_ROTAS = ['placa', 'local', 'horario', 'dias_semana', 'observacoes', 'duracao']
+
+_VERDADEIRO = {'1', 'sim', 's', 'true', 'verdadeiro', 'x', 'ativo', 'concluida'}
+_FALSO = {'0', 'nao', 'n', 'false', 'falso', 'inativo', 'pendente'}
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.criados = 0
+        self.atualizados = 0
+        self.erros = []
+
+    def erro(self, linha, mensagem):
+        self.erros.append((linha, mensagem))
+
+    @property
+    def total_gravado(self):
+        return self.criados + self.atualizados
+
+    def __str__(self):
+        return f'{self.criados} criado(s), {self.atualizados} atualizado(s), {len(self.erros)} erro(s)'
+
+
+def _sem_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).strip().lower()
+
+
+def _booleano(valor, padrao):
+    if valor is None:
+        return padrao
+    texto = _sem_acentos(valor)
+    if not texto:
+        return padrao
+    if texto in _VERDADEIRO:
+        return True
+    if texto in _FALSO:
+        return False
+    raise ValidationError(f'Valor booleano inválido: {valor!r}')
+
+
+def _horario(valor):
+    texto = (valor or '').strip()
+    for formato in ('%H:%M', '%H:%M:%S', '%Hh%M', '%Hh'):
+        try:
+            return datetime.datetime.strptime(texto, formato).time()
+        except ValueError:
+            continue
+    raise ValidationError(f'Horário inválido: {valor!r}')
+
+
+def _duracao(valor):
+    texto = (valor or '').strip()
+    if not texto:
+        return None
+    if not texto.isdigit() or not 1 <= int(texto) <= conflitos.MINUTOS_DIA:
+        raise ValidationError(f'Duração inválida: {valor!r} (minutos, de 1 a {conflitos.MINUTOS_DIA})')
+    return int(texto)
+
+
+def _mensagem(erro):
+    if isinstance(erro, ValidationError):
+        return '; '.join(erro.messages)
+    return str(erro)
+
+
+def _ler_lotes(arquivo, colunas_obrigatorias, tamanho_lote):
+    """
+    Lê o CSV (separador ',' ou ';', detectado no cabeçalho) e devolve lotes
+    de (número da linha, dicionário com colunas em minúsculas).
+    """
+    primeira = arquivo.readline().lstrip('\ufeff')
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    cabecalho = [coluna.strip().lower() for coluna in next(csv.reader([primeira], delimiter=delimitador))]
+
+    faltando = [coluna for coluna in colunas_obrigatorias if coluna not in cabecalho]
+    if faltando:
+        raise ValidationError(f'Colunas obrigatórias ausentes: {", ".join(faltando)}')
+
+    leitor = csv.DictReader(arquivo, fieldnames=cabecalho, delimiter=delimitador)
+    lote = []
+    for numero, linha in enumerate(leitor, start=2):
+        if not any((valor or '').strip() for valor in linha.values() if isinstance(valor, str)):
+            continue
+        lote.append((numero, linha))
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _gravar(resultado, modelo, lote, novos, existentes, campos_atualizados):
+    """
+    Grava um lote em uma transação: bulk_create para os novos e um UPDATE por
+    chave primária para os existentes. bulk_update monta um CASE WHEN por
+    registro e campo, e medido aqui saiu cerca de 4x mais lento que isso.
+    """
+    agora = timezone.now()
+    try:
+        with transaction.atomic():
+            modelo.objects.bulk_create(novos)
+            for registro in existentes:
+                # update() não aplica auto_now; a data de atualização vai junto
+                registro.data_atualizacao = agora
+                modelo.objects.filter(pk=registro.pk).update(
+                    data_atualizacao=agora,
+                    **{campo: getattr(registro, campo) for campo in campos_atualizados},
+                )
+    except DatabaseError as erro:
+        primeira, ultima = lote[0][0], lote[-1][0]
+        resultado.erro(f'{primeira}-{ultima}', f'Lote não gravado: {erro}')
+        return False
+    resultado.criados += len(novos)
+    resultado.atualizados += len(existentes)
+    return True
+
+
+# Veículos
+
+_TIPOS = {}
+for _codigo, _rotulo in Veiculo.TIPO_CHOICES:
+    _TIPOS[_sem_acentos(_codigo)] = _codigo
+    _TIPOS[_sem_acentos(_rotulo)] = _codigo
+
+
+def importar_veiculos(arquivo, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria ou atualiza (pela placa) veículos de um CSV com as colunas
+    placa, tipo, numero_caminhao e ativo (opcional).
+    """
+    resultado = ResultadoImportacao()
+    validar_placa = Veiculo._meta.get_field('placa').run_validators
+    placas = dict(Veiculo.objects.values_list('placa', 'id'))
+    numeros = dict(Veiculo.objects.values_list('numero_caminhao', 'placa'))
+    vistas = set()
+
+    for lote in _ler_lotes(arquivo, COLUNAS_VEICULOS[:3], tamanho_lote):
+        novos, existentes = [], []
+        for numero, linha in lote:
+            try:
+                placa = normalizar_placa(linha.get('placa') or '')
+                validar_placa(placa)
+                if placa in vistas:
+                    raise ValidationError(f'Placa {placa} repetida no arquivo.')
+
+                tipo = _TIPOS.get(_sem_acentos(linha.get('tipo') or ''))
+                if tipo is None:
+                    raise ValidationError(f'Tipo inválido: {linha.get("tipo")!r}')
+
+                numero_caminhao = (linha.get('numero_caminhao') or '').strip()
+                if not numero_caminhao:
+                    raise ValidationError('Número do caminhão é obrigatório.')
+                if numeros.get(numero_caminhao, placa) != placa:
+                    raise ValidationError(f'Número do caminhão {numero_caminhao} já usado por outro veículo.')
+
+                veiculo = Veiculo(
+                    id=placas.get(placa),
+                    placa=placa,
+                    tipo=tipo,
+                    numero_caminhao=numero_caminhao,
+                    ativo=_booleano(linha.get('ativo'), True),
+                )
+            except ValidationError as erro:
+                resultado.erro(numero, _mensagem(erro))
+                continue
+
+            vistas.add(placa)
+            numeros[numero_caminhao] = placa
+            (existentes if veiculo.id else novos).append(veiculo)
+
+        if _gravar(resultado, Veiculo, lote, novos, existentes, ['tipo', 'numero_caminhao', 'ativo']):
+            # O MySQL não devolve os ids gerados pelo bulk_create
+            placas.update(Veiculo.objects.filter(
+                placa__in=[veiculo.placa for veiculo in novos]
+            ).values_list('placa', 'id'))
+            # bulk_update não dispara o signal que mantém o tipo no snapshot
+            for tipo, _ in Veiculo.TIPO_CHOICES:
+                EstatisticaDiaria.objects.filter(
+                    veiculo_id__in=[veiculo.id for veiculo in existentes if veiculo.tipo == tipo]
+                ).exclude(tipo_veiculo=tipo).update(tipo_veiculo=tipo)
+
+    invalidar(VEICULOS, ROTAS)
+    agenda.invalidar()
+    return resultado
+
+
+# Rotas
+
+def importar_rotas(arquivo, tamanho_lote=TAMANHO_LOTE):
+    """
+    Cria ou atualiza (pelo par veículo/horário) rotas de um CSV com as colunas
+    placa, local, horario, dias_semana, observacoes e duracao (opcionais as
+    três últimas). O veículo é resolvido pela placa em um
+    mapa em memória. Rotas que se sobreponham a outra do mesmo caminhão no
+    mesmo dia da semana são recusadas, inclusive entre linhas do arquivo.
+    """
+    resultado = ResultadoImportacao()
+    placas = dict(Veiculo.objects.values_list('placa', 'id'))
+    vistas = set()
+    dias_afetados = set()
+    indice = conflitos.IndiceDeHorarios()
+
+    for lote in _ler_lotes(arquivo, COLUNAS_ROTAS[:3], tamanho_lote):
+        candidatas = []
+        for numero, linha in lote:
+            try:
+                placa = normalizar_placa(linha.get('placa') or '')
+                veiculo_id = placas.get(placa)
+                if veiculo_id is None:
+                    raise ValidationError(f'Veículo com placa {placa or "(vazia)"} não encontrado.')
+
+                local = (linha.get('local') or '').strip()
+                if not local:
+                    raise ValidationError('Local é obrigatório.')
+                if len(local) > Rota._meta.get_field('local').max_length:
+                    raise ValidationError('Local muito longo.')
+
+                horario = _horario(linha.get('horario'))
+                if (veiculo_id, horario) in vistas:
+                    raise ValidationError(f'Rota de {placa} às {horario:%H:%M} repetida no arquivo.')
+
+                dias = (linha.get('dias_semana') or '').strip()
+                mascara = interpretar(dias)
+                if dias and not mascara:
+                    raise ValidationError(f'Dias da semana não reconhecidos: {dias!r}')
+
+                duracao = _duracao(linha.get('duracao'))
+
+                rota = Rota(
+                    veiculo_id=veiculo_id,
+                    local=local,
+                    horario=horario,
+                    duracao=duracao or Rota._meta.get_field('duracao').default,
+                    dias_semana=texto_da_mascara(mascara) or None,
+                    dias_mask=mascara,
+                    observacoes=(linha.get('observacoes') or '').strip() or None,
+                )
+            except ValidationError as erro:
+                resultado.erro(numero, _mensagem(erro))
+                continue
+
+            vistas.add((veiculo_id, horario))
+            candidatas.append((numero, rota, duracao is not None))
+
+        # Rotas já cadastradas no mesmo veículo/horário são atualizadas
+        cadastradas = {}
+        if candidatas:
+            veiculos = {rota.veiculo_id for _, rota, _ in candidatas}
+            indice.carregar(veiculos)
+            for rota in Rota.objects.filter(
+                veiculo_id__in=veiculos,
+                horario__in={rota.horario for _, rota, _ in candidatas},
+            ).only('id', 'veiculo_id', 'horario', 'duracao', 'dias_mask', 'data_cadastro'):
+                cadastradas[(rota.veiculo_id, rota.horario)] = rota
+
+        novos, existentes = [], []
+        for numero, rota, informou_duracao in candidatas:
+            atual = cadastradas.get((rota.veiculo_id, rota.horario))
+            if atual is not None:
+                rota.id = atual.id
+                rota.data_cadastro = atual.data_cadastro
+                if not informou_duracao:
+                    rota.duracao = atual.duracao
+                # A rota atualizada não conflita com a versão anterior dela mesma
+                indice.remover(atual.id)
+
+            em_conflito = indice.conflitos(rota.veiculo_id, rota.horario, rota.duracao, rota.dias_mask)
+            if em_conflito:
+                resultado.erro(numero, conflitos.descrever(em_conflito))
+                if atual is not None:
+                    indice.adicionar(atual.id, atual.veiculo_id, atual.horario, atual.duracao, atual.dias_mask)
+                continue
+
+            # Rotas novas entram no índice pela linha do arquivo até terem id
+            indice.adicionar(rota.id or f'linha {numero}', rota.veiculo_id, rota.horario, rota.duracao, rota.dias_mask)
+            (existentes if atual is not None else novos).append(rota)
+
+        campos = ['local', 'duracao', 'dias_semana', 'dias_mask', 'observacoes']
+        if _gravar(resultado, Rota, lote, novos, existentes, campos):
+            dias_afetados.update(_chave_estatistica(rota) for rota in novos + existentes)
+        else:
+            # Lote descartado: o índice é recarregado do banco nos próximos lotes
+            indice = conflitos.IndiceDeHorarios()
+
+    # Gravações em massa não disparam os signals do snapshot diário
+    EstatisticaDiaria.recalcular_chaves(dias_afetados - {None})
+    invalidar(ROTAS)
+    agenda.invalidar()
+    return resultado
@@ -0,0 +1,214 @@
+"""
+Localização de rotas e problemas por coordenadas (opcionais).
+
+As rotas ficam em uma grade de células de TAMANHO_CELULA graus. Cada célula
+fica em cache com a própria versão e a gravação de uma rota invalida só as
+células em que ela estava e passou a estar, então a grade é reconstruída
+célula a célula, conforme é consultada. A rota mais próxima é procurada em
+anéis de células ao redor do ponto, parando assim que nenhuma célula ainda
+não visitada pode conter uma rota mais perto.
+
+Problemas são muitos e mudam o tempo todo: a busca por raio vai ao banco
+com o retângulo envolvente (índice em latitude, longitude) e confere a
+distância exata em Python.
+"""
+import math
+
+from django.conf import settings
+
+from .models import ProblemaColeta, Rota
+from .referencias import _obter_varios, invalidar as invalidar_grupos
+
+# Lado da célula em graus (0,01° ≈ 1,1 km de latitude)
+TAMANHO_CELULA = getattr(settings, 'LOCALIZACAO_TAMANHO_CELULA', 0.01)
+# Distância máxima para sugerir uma rota a partir da localização do cidadão
+RAIO_SUGESTAO_KM = getattr(settings, 'LOCALIZACAO_RAIO_SUGESTAO_KM', 2)
+# Raio dos problemas exibidos como próximos de uma rota
+RAIO_PROXIMIDADE_KM = getattr(settings, 'LOCALIZACAO_RAIO_PROXIMIDADE_KM', 1)
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+
+# Folga nos limites das consultas; a distância exata é conferida em Python
+_FOLGA = 1e-6
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância de grande círculo entre dois pontos (haversine)."""
+    fi1, fi2 = math.radians(float(lat1)), math.radians(float(lat2))
+    delta_fi = fi2 - fi1
+    delta_lambda = math.radians(float(lon2) - float(lon1))
+    a = math.sin(delta_fi / 2) ** 2 + math.cos(fi1) * math.cos(fi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def celula(latitude, longitude):
+    return (
+        math.floor(float(latitude) / TAMANHO_CELULA),
+        math.floor(float(longitude) / TAMANHO_CELULA),
+    )
+
+
+def celula_de(obj):
+    """Célula de uma rota ou problema; None sem coordenadas (ou com elas adiadas)."""
+    latitude, longitude = obj.__dict__.get('latitude'), obj.__dict__.get('longitude')
+    if latitude is None or longitude is None:
+        return None
+    return celula(latitude, longitude)
+
+
+def _grupo(chave):
+    return f'geo:rotas:{chave[0]}:{chave[1]}'
+
+
+def invalidar(*celulas):
+    invalidar_grupos(*{_grupo(chave) for chave in celulas if chave is not None})
+
+
+def _retangulo(latitude, longitude, raio_km):
+    """(sul, norte, oeste, leste) do retângulo que envolve o círculo de `raio_km`."""
+    latitude, longitude = float(latitude), float(longitude)
+    delta_lat = raio_km / KM_POR_GRAU
+    cosseno = math.cos(math.radians(min(89.9, abs(latitude) + delta_lat)))
+    delta_lon = min(180.0, raio_km / (KM_POR_GRAU * cosseno))
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def _anel(centro, n):
+    """Células a `n` células de distância (nas duas direções) da central."""
+    if n == 0:
+        return [centro]
+    i, j = centro
+    borda = [(i + di, j + dj) for di in range(-n, n + 1) for dj in (-n, n)]
+    borda += [(i + di, j + dj) for di in (-n, n) for dj in range(-n + 1, n)]
+    return borda
+
+
+def _alcance_km(latitude, longitude, centro, n):
+    """
+    Distância do ponto até a borda do bloco formado pelos anéis 0..n: uma
+    rota fora do bloco está pelo menos a essa distância.
+    """
+    i, j = centro
+    sul, norte = (i - n) * TAMANHO_CELULA, (i + n + 1) * TAMANHO_CELULA
+    oeste, leste = (j - n) * TAMANHO_CELULA, (j + n + 1) * TAMANHO_CELULA
+    km_por_grau_lon = KM_POR_GRAU * math.cos(math.radians(min(90.0, max(abs(sul), abs(norte)))))
+    return min(
+        (latitude - sul) * KM_POR_GRAU,
+        (norte - latitude) * KM_POR_GRAU,
+        (longitude - oeste) * km_por_grau_lon,
+        (leste - longitude) * km_por_grau_lon,
+    )
+
+
+def _ler_celulas(celulas):
+    """{célula: [(id, latitude, longitude)]} das rotas, em uma consulta pelo retângulo das células."""
+    linhas = [i for i, _ in celulas]
+    colunas = [j for _, j in celulas]
+    rotas = Rota.objects.filter(
+        latitude__gte=min(linhas) * TAMANHO_CELULA - _FOLGA,
+        latitude__lt=(max(linhas) + 1) * TAMANHO_CELULA + _FOLGA,
+        longitude__gte=min(colunas) * TAMANHO_CELULA - _FOLGA,
+        longitude__lt=(max(colunas) + 1) * TAMANHO_CELULA + _FOLGA,
+    ).values_list('id', 'latitude', 'longitude')
+    conteudo = {chave: [] for chave in celulas}
+    for rota_id, latitude, longitude in rotas:
+        chave = celula(latitude, longitude)
+        if chave in conteudo:
+            conteudo[chave].append((rota_id, float(latitude), float(longitude)))
+    return conteudo
+
+
+class GradeDeRotas:
+    """
+    Rotas com coordenadas agrupadas por célula. As células são carregadas
+    sob demanda: do cache ou, as ausentes, juntas em uma consulta ao banco.
+    """
+
+    def __init__(self):
+        self._celulas = {}
+
+    def carregar(self, celulas):
+        """Rotas (id, latitude, longitude) das células informadas."""
+        faltantes = {_grupo(chave): chave for chave in celulas if chave not in self._celulas}
+        if faltantes:
+            def carregar_do_banco(grupos):
+                lidas = _ler_celulas([faltantes[grupo] for grupo in grupos])
+                return {grupo: lidas[faltantes[grupo]] for grupo in grupos}
+
+            for grupo, rotas in _obter_varios(list(faltantes), carregar_do_banco).items():
+                self._celulas[faltantes[grupo]] = rotas
+        return [rota for chave in celulas for rota in self._celulas[chave]]
+
+    def _aneis_ate(self, latitude, longitude, raio_km):
+        """Quantidade de anéis que cobre o círculo de `raio_km`."""
+        sul, norte, oeste, leste = _retangulo(latitude, longitude, raio_km)
+        i, j = celula(latitude, longitude)
+        (i_sul, j_oeste), (i_norte, j_leste) = celula(sul, oeste), celula(norte, leste)
+        return max(i - i_sul, i_norte - i, j - j_oeste, j_leste - j)
+
+    def mais_proxima(self, latitude, longitude, raio_km=RAIO_SUGESTAO_KM):
+        """(distância em km, id) da rota mais próxima dentro de `raio_km`, ou None."""
+        latitude, longitude = float(latitude), float(longitude)
+        centro = celula(latitude, longitude)
+        melhor = None
+        for n in range(self._aneis_ate(latitude, longitude, raio_km) + 1):
+            for rota_id, lat, lon in self.carregar(_anel(centro, n)):
+                distancia = distancia_km(latitude, longitude, lat, lon)
+                if distancia <= raio_km and (melhor is None or distancia < melhor[0]):
+                    melhor = (distancia, rota_id)
+            if melhor is not None and melhor[0] <= _alcance_km(latitude, longitude, centro, n):
+                break
+        return melhor
+
+    def no_raio(self, latitude, longitude, raio_km):
+        """[(distância em km, id)] das rotas dentro de `raio_km`, da mais próxima à mais distante."""
+        latitude, longitude = float(latitude), float(longitude)
+        centro = celula(latitude, longitude)
+        celulas = [
+            chave
+            for n in range(self._aneis_ate(latitude, longitude, raio_km) + 1)
+            for chave in _anel(centro, n)
+        ]
+        encontradas = []
+        for rota_id, lat, lon in self.carregar(celulas):
+            distancia = distancia_km(latitude, longitude, lat, lon)
+            if distancia <= raio_km:
+                encontradas.append((distancia, rota_id))
+        return sorted(encontradas)
+
+
+def rota_mais_proxima(latitude, longitude, raio_km=RAIO_SUGESTAO_KM):
+    """Id da rota mais próxima do ponto, dentro de `raio_km`, ou None."""
+    encontrada = GradeDeRotas().mais_proxima(latitude, longitude, raio_km)
+    return encontrada[1] if encontrada else None
+
+
+def problemas_no_raio(latitude, longitude, raio_km, queryset=None):
+    """
+    Problemas com coordenadas a até `raio_km` do ponto, do mais próximo ao
+    mais distante, cada um com o atributo `distancia_km`.
+    """
+    if queryset is None:
+        queryset = ProblemaColeta.objects.all()
+    sul, norte, oeste, leste = _retangulo(latitude, longitude, raio_km)
+    candidatos = queryset.filter(
+        latitude__gte=sul - _FOLGA, latitude__lte=norte + _FOLGA,
+        longitude__gte=oeste - _FOLGA, longitude__lte=leste + _FOLGA,
+    )
+    encontrados = []
+    for problema in candidatos:
+        problema.distancia_km = distancia_km(latitude, longitude, problema.latitude, problema.longitude)
+        if problema.distancia_km <= raio_km:
+            encontrados.append(problema)
+    return sorted(encontrados, key=lambda problema: (problema.distancia_km, problema.pk))
+
+
+def problemas_perto_da_rota(rota, raio_km=RAIO_PROXIMIDADE_KM):
+    """Problemas pendentes a até `raio_km` do ponto de coleta da rota (vazio sem coordenadas)."""
+    if rota.latitude is None or rota.longitude is None:
+        return []
+    pendentes = ProblemaColeta.objects.filter(
+        status__in=ProblemaColeta.STATUS_PENDENTES
+    ).select_related('veiculo')
+    return problemas_no_raio(rota.latitude, rota.longitude, raio_km, pendentes)
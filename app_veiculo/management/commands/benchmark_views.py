@@ -0,0 +1,102 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from app_veiculo.benchmark import (
+    ESCALA_PADRAO, LATENCIA_CONEXAO, commit_atual, comparar, medir, medir_conexoes, popular_banco,
+    urls_medidas,
+)
+from app_veiculo.models import Veiculo
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula um banco SQLite e mede latência (p50/p95) e consultas de cada view. '
+        'Use com --settings=Projeto_Residuo.settings_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--veiculos', type=int, default=ESCALA_PADRAO['veiculos'])
+        parser.add_argument('--rotas', type=int, default=ESCALA_PADRAO['rotas'])
+        parser.add_argument('--problemas', type=int, default=ESCALA_PADRAO['problemas'])
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições medidas por URL.')
+        parser.add_argument(
+            '--popular',
+            action='store_true',
+            help='Apaga e gera novamente os dados mesmo que o banco já esteja populado.',
+        )
+        parser.add_argument('--saida', default='benchmark.json', help='Arquivo JSON com os resultados.')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para apontar regressões.')
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=0.2,
+            help='Aumento relativo de p95 aceito na comparação (0.2 = 20%%).',
+        )
+        parser.add_argument(
+            '--conexoes',
+            type=int,
+            default=0,
+            help='Requisições do comparativo de conexões por requisição x persistentes, com latência de conexão simulada (0 não mede).',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'O benchmark apaga e recria os dados; rode com '
+                '--settings=Projeto_Residuo.settings_benchmark (SQLite).'
+            )
+
+        escala = {chave: options[chave] for chave in ESCALA_PADRAO}
+
+        if options['popular'] or not Veiculo.objects.exists():
+            self.stdout.write(f'Populando banco: {escala}')
+            popular_banco(**escala, saida=self.stdout.write)
+
+        urls = urls_medidas()
+        self.stdout.write(f'Medindo {len(urls)} URLs, {options["repeticoes"]} repetições cada')
+        resultados = medir(urls, repeticoes=options['repeticoes'])
+
+        for nome, metricas in resultados.items():
+            self.stdout.write(
+                f'{nome:45} {metricas["status"]}  p50 {metricas["p50_ms"]:8.1f} ms  '
+                f'p95 {metricas["p95_ms"]:8.1f} ms  {metricas["consultas"]:3d} consultas'
+            )
+
+        relatorio = {
+            'commit': commit_atual(),
+            'data': timezone.now().isoformat(),
+            'escala': escala,
+            'repeticoes': options['repeticoes'],
+            'resultados': resultados,
+        }
+        if options['conexoes']:
+            relatorio['conexoes'] = {
+                'latencia_simulada_ms': LATENCIA_CONEXAO * 1000,
+                'sem_persistencia': medir_conexoes(options['conexoes'], conn_max_age=0),
+                'persistente': medir_conexoes(options['conexoes'], conn_max_age=60),
+            }
+            self.stdout.write(
+                f'Conexões (SQLite com {LATENCIA_CONEXAO * 1000:.0f} ms simulados por conexão aberta; '
+                'req/s ilustrativo, não medido no MySQL):'
+            )
+            for modo in ('sem_persistencia', 'persistente'):
+                metricas = relatorio['conexoes'][modo]
+                self.stdout.write(
+                    f'  {modo:17} {metricas["conexoes"]:5d} conexões abertas  {metricas["rps"]:10.1f} req/s'
+                )
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Resultados gravados em {options["saida"]}'))
+
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+            regressoes = comparar(anterior, relatorio, tolerancia=options['tolerancia'])
+            for nome, metrica, antes, depois in regressoes:
+                self.stdout.write(self.style.ERROR(f'{nome}: {metrica} {antes} -> {depois}'))
+            if regressoes:
+                raise CommandError(f'{len(regressoes)} regressão(ões) em relação a {options["comparar"]}.')
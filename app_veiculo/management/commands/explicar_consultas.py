@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_veiculo.planos import analisar_listagens
+
+
+class Command(BaseCommand):
+    help = 'Executa EXPLAIN nas consultas das listagens e aponta as que leem a tabela inteira.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plano',
+            action='store_true',
+            help='Exibe o plano de execução completo de cada consulta.',
+        )
+
+    def handle(self, *args, **options):
+        com_varredura = []
+
+        for nome, plano, varreduras in analisar_listagens():
+            if varreduras:
+                com_varredura.append(nome)
+                self.stdout.write(self.style.ERROR(
+                    f'{nome}: varredura completa em {", ".join(varreduras)}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{nome}: usa índice'))
+
+            if options['plano']:
+                self.stdout.write(plano)
+                self.stdout.write('')
+
+        if com_varredura:
+            raise CommandError(f'{len(com_varredura)} consulta(s) sem índice adequado.')
@@ -0,0 +1,47 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from app_veiculo.importacao import TAMANHO_LOTE, importar_rotas, importar_veiculos
+
+IMPORTADORES = {
+    'veiculos': importar_veiculos,
+    'rotas': importar_rotas,
+}
+
+
+class Command(BaseCommand):
+    help = 'Importa veículos ou rotas de um arquivo CSV, gravando em lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelo', choices=sorted(IMPORTADORES), help='O que importar.')
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV (UTF-8, separado por vírgula ou ponto e vírgula).')
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANHO_LOTE,
+            help='Linhas gravadas por transação.',
+        )
+        parser.add_argument(
+            '--max-erros',
+            type=int,
+            default=50,
+            help='Quantidade máxima de erros exibidos.',
+        )
+
+    def handle(self, *args, **options):
+        importar = IMPORTADORES[options['modelo']]
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importar(arquivo, tamanho_lote=options['lote'])
+        except OSError as erro:
+            raise CommandError(f'Não foi possível ler {options["arquivo"]}: {erro}')
+        except ValidationError as erro:
+            raise CommandError('; '.join(erro.messages))
+
+        for linha, mensagem in resultado.erros[:options['max_erros']]:
+            self.stdout.write(self.style.ERROR(f'Linha {linha}: {mensagem}'))
+        if len(resultado.erros) > options['max_erros']:
+            self.stdout.write(f'... e mais {len(resultado.erros) - options["max_erros"]} erro(s).')
+
+        estilo = self.style.WARNING if resultado.erros else self.style.SUCCESS
+        self.stdout.write(estilo(f'Importação de {options["modelo"]}: {resultado}'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app_veiculo.dias_semana import DIAS, ROTULOS, bit_do_dia
+from app_veiculo.models import Veiculo
+from app_veiculo.sequenciamento import TEMPO_LIMITE, otimizar_frota
+
+
+class Command(BaseCommand):
+    help = 'Sugere, para cada veículo ativo, a ordem de visita às rotas de um dia que reduz a distância percorrida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dia',
+            default=None,
+            help='Dia da semana (ex: seg, Quarta). Padrão: hoje.',
+        )
+        parser.add_argument(
+            '--processos',
+            type=int,
+            default=None,
+            help='Processos usados no cálculo (padrão: um por CPU; 1 calcula no próprio processo).',
+        )
+        parser.add_argument(
+            '--tempo-limite',
+            type=float,
+            default=TEMPO_LIMITE,
+            help='Tempo máximo de melhoria por veículo, em segundos.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            indice = bit_do_dia(options['dia'] or timezone.localdate()).bit_length() - 1
+        except ValueError as erro:
+            raise CommandError(str(erro))
+
+        resultados = otimizar_frota(indice, processos=options['processos'], tempo_limite=options['tempo_limite'])
+        placas = dict(Veiculo.objects.filter(pk__in=[r['veiculo_id'] for r in resultados]).values_list('id', 'placa'))
+
+        total_atual = total_sugerido = 0
+        for resultado in sorted(resultados, key=lambda r: placas[r['veiculo_id']]):
+            total_atual += resultado['distancia_atual']
+            total_sugerido += resultado['distancia_sugerida']
+            self.stdout.write(
+                f'{placas[resultado["veiculo_id"]]}: {len(resultado["rota_ids"])} rota(s), '
+                f'{resultado["distancia_atual"]:.1f} km -> {resultado["distancia_sugerida"]:.1f} km '
+                f'(ordem: {", ".join(str(rota_id) for rota_id in resultado["rota_ids"])})'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{ROTULOS[indice]} ({DIAS[indice]}): {len(resultados)} veículo(s), '
+            f'{total_atual:.1f} km -> {total_sugerido:.1f} km.'
+        ))
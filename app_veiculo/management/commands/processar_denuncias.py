@@ -0,0 +1,73 @@
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from app_veiculo import fila_denuncias
+
+
+class Command(BaseCommand):
+    help = 'Grava no banco, em lotes, as denúncias recebidas pela fila local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=fila_denuncias.TAMANHO_LOTE,
+            help='Denúncias gravadas por bulk_create.',
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Continua em execução, consultando a fila a cada --intervalo segundos.',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Espera, em segundos, quando a fila está vazia (com --continuo).',
+        )
+
+    def drenar_tudo(self, lote):
+        gravadas = falhas = 0
+        while True:
+            novas, erros = fila_denuncias.drenar(lote)
+            if not novas and not erros:
+                return gravadas, falhas
+            gravadas += novas
+            falhas += erros
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            gravadas, falhas = self.drenar_tudo(options['lote'])
+            self.informar(gravadas, falhas)
+            return
+
+        self.stdout.write('Processando a fila de denúncias (Ctrl+C para encerrar)...')
+        try:
+            while True:
+                # Conexões derrubadas pelo banco durante a espera são reabertas
+                close_old_connections()
+                try:
+                    gravadas, falhas = self.drenar_tudo(options['lote'])
+                except DatabaseError as erro:
+                    # As denúncias continuam na fila e são tentadas na próxima volta
+                    self.stderr.write(self.style.ERROR(f'Falha ao gravar denúncias: {erro}'))
+                except Exception:
+                    # Um erro inesperado não derruba o processamento contínuo
+                    self.stderr.write(self.style.ERROR(f'Erro ao processar a fila:\n{traceback.format_exc()}'))
+                else:
+                    if gravadas or falhas:
+                        self.informar(gravadas, falhas)
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Encerrado.')
+
+    def informar(self, gravadas, falhas):
+        situacao = fila_denuncias.situacao()
+        estilo = self.style.WARNING if falhas else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{gravadas} denúncia(s) gravada(s), {falhas} falha(s); '
+            f'{situacao["pendentes"]} pendente(s) na fila.'
+        ))
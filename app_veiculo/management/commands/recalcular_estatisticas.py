@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_veiculo.models import BacklogDiario, EstatisticaDiaria
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói do zero a tabela de estatísticas diárias usada pelo relatório de serviço '
+        'e os contadores do painel de backlog.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = EstatisticaDiaria.reconstruir()
+            backlog = BacklogDiario.reconstruir()
+
+        self.stdout.write(self.style.SUCCESS(f'{total} linhas de estatísticas diárias recalculadas.'))
+        self.stdout.write(self.style.SUCCESS(f'{backlog} linhas de backlog recalculadas.'))
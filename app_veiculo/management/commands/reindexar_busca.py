@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_veiculo.busca import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca textual dos problemas de coleta (tabela FTS5 no SQLite).'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reconstruir_indice()
+
+        self.stdout.write(self.style.SUCCESS('Índice de busca dos problemas reconstruído.'))
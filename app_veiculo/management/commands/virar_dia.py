@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from app_veiculo.models import OcorrenciaRota
+
+
+class Command(BaseCommand):
+    help = (
+        'Vira o dia das rotas: abre, em uma operação, as ocorrências pendentes das rotas que operam '
+        'na data e informa as coletas do dia anterior que ficaram sem conclusão. Agende logo após a meia-noite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data',
+            default=None,
+            help='Dia a abrir, no formato AAAA-MM-DD. Padrão: hoje.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            data = parse_date(options['data']) if options['data'] else timezone.localdate()
+        except ValueError:
+            data = None
+        if data is None:
+            raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        abertas = OcorrenciaRota.abrir_dia(data)
+        anterior = data - datetime.timedelta(days=1)
+        nao_realizadas = OcorrenciaRota.objects.filter(data=anterior, concluida=False).count()
+
+        self.stdout.write(f'{nao_realizadas} coleta(s) de {anterior:%d/%m/%Y} ficaram pendentes.')
+        self.stdout.write(self.style.SUCCESS(f'{abertas} ocorrência(s) abertas para {data:%d/%m/%Y}.'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0005_problemacoleta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(help_text='Dia de referência das estatísticas')),
+                ('tipo_veiculo', models.CharField(choices=[('compactador', 'Compactador'), ('caçamba', 'Caçamba')], help_text='Tipo do veículo (copiado para agrupar sem junção)', max_length=20)),
+                ('rotas_cadastradas', models.PositiveIntegerField(default=0)),
+                ('rotas_concluidas', models.PositiveIntegerField(default=0)),
+                ('problemas_registrados', models.PositiveIntegerField(default=0)),
+                ('problemas_abertos', models.PositiveIntegerField(default=0)),
+                ('problemas_resolvidos', models.PositiveIntegerField(default=0)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('veiculo', models.ForeignKey(help_text='Veículo ao qual as estatísticas se referem', on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas', to='app_veiculo.veiculo')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária',
+                'verbose_name_plural': 'Estatísticas Diárias',
+                'db_table': 'estatisticas_diarias',
+                'ordering': ['-data', 'veiculo'],
+                'unique_together': {('data', 'veiculo')},
+            },
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:50
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+PROBLEMA_PENDENTE_IDX = models.Index(
+    fields=['prioridade', 'data_ocorrencia'],
+    condition=Q(status__in=['aberto', 'em_andamento']),
+    name='problema_pendente_idx',
+)
+
+
+def criar_indice_parcial(apps, schema_editor):
+    # O MySQL não suporta índices com condição; nele o índice é simplesmente omitido
+    if schema_editor.connection.features.supports_partial_indexes:
+        ProblemaColeta = apps.get_model('app_veiculo', 'ProblemaColeta')
+        schema_editor.add_index(ProblemaColeta, PROBLEMA_PENDENTE_IDX)
+
+
+def remover_indice_parcial(apps, schema_editor):
+    if schema_editor.connection.features.supports_partial_indexes:
+        ProblemaColeta = apps.get_model('app_veiculo', 'ProblemaColeta')
+        schema_editor.remove_index(ProblemaColeta, PROBLEMA_PENDENTE_IDX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0006_estatisticadiaria'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='estatisticadiaria',
+            options={'ordering': ['-data', 'veiculo_id'], 'verbose_name': 'Estatística Diária', 'verbose_name_plural': 'Estatísticas Diárias'},
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['-data_ocorrencia', '-id'], name='problema_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['status', '-data_ocorrencia', '-id'], name='problema_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['prioridade', '-data_ocorrencia', '-id'], name='problema_prioridade_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['tipo_problema', '-data_ocorrencia', '-id'], name='problema_tipo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['veiculo', '-data_ocorrencia', '-id'], name='problema_veiculo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['horario', 'id'], name='rota_horario_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['concluida', 'horario', 'id'], name='rota_concluida_horario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['veiculo', 'concluida', 'horario', 'id'], name='rota_veiculo_concluida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['data_cadastro'], name='rota_data_cadastro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['ativo', 'placa'], name='veiculo_ativo_placa_idx'),
+        ),
+    ]
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0006_estatisticadiaria'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='estatisticadiaria',
+            options={'ordering': ['-data', 'veiculo_id'], 'verbose_name': 'Estatística Diária', 'verbose_name_plural': 'Estatísticas Diárias'},
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['-data_ocorrencia', '-id'], name='problema_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['status', '-data_ocorrencia', '-id'], name='problema_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['prioridade', '-data_ocorrencia', '-id'], name='problema_prioridade_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['tipo_problema', '-data_ocorrencia', '-id'], name='problema_tipo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['veiculo', '-data_ocorrencia', '-id'], name='problema_veiculo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['horario', 'id'], name='rota_horario_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['concluida', 'horario', 'id'], name='rota_concluida_horario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['veiculo', 'concluida', 'horario', 'id'], name='rota_veiculo_concluida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['data_cadastro'], name='rota_data_cadastro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['ativo', 'placa'], name='veiculo_ativo_placa_idx'),
+        ),
+        migrations.RunPython(criar_indice_parcial, remover_indice_parcial),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+
+SQLITE_CRIAR = [
+    """
+    CREATE VIRTUAL TABLE problemas_coleta_fts USING fts5(
+        descricao, local_problema, responsavel_relato, placa,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO problemas_coleta_fts(rowid, descricao, local_problema, responsavel_relato, placa)
+    SELECT p.id, p.descricao, p.local_problema, p.responsavel_relato, v.placa
+    FROM problemas_coleta p JOIN veiculos v ON v.id = p.veiculo_id
+    """,
+    """
+    CREATE TRIGGER problemas_coleta_fts_ai AFTER INSERT ON problemas_coleta BEGIN
+        INSERT INTO problemas_coleta_fts(rowid, descricao, local_problema, responsavel_relato, placa)
+        VALUES (
+            new.id, new.descricao, new.local_problema, new.responsavel_relato,
+            (SELECT placa FROM veiculos WHERE id = new.veiculo_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER problemas_coleta_fts_au
+    AFTER UPDATE OF descricao, local_problema, responsavel_relato, veiculo_id ON problemas_coleta BEGIN
+        UPDATE problemas_coleta_fts SET
+            descricao = new.descricao,
+            local_problema = new.local_problema,
+            responsavel_relato = new.responsavel_relato,
+            placa = (SELECT placa FROM veiculos WHERE id = new.veiculo_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER problemas_coleta_fts_ad AFTER DELETE ON problemas_coleta BEGIN
+        DELETE FROM problemas_coleta_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER veiculos_placa_fts_au AFTER UPDATE OF placa ON veiculos BEGIN
+        UPDATE problemas_coleta_fts SET placa = new.placa
+        WHERE rowid IN (SELECT id FROM problemas_coleta WHERE veiculo_id = new.id);
+    END
+    """,
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS veiculos_placa_fts_au',
+    'DROP TRIGGER IF EXISTS problemas_coleta_fts_ad',
+    'DROP TRIGGER IF EXISTS problemas_coleta_fts_au',
+    'DROP TRIGGER IF EXISTS problemas_coleta_fts_ai',
+    'DROP TABLE IF EXISTS problemas_coleta_fts',
+]
+
+MYSQL_CRIAR = [
+    'ALTER TABLE problemas_coleta ADD FULLTEXT INDEX problema_busca_ft '
+    '(descricao, local_problema, responsavel_relato)',
+]
+
+MYSQL_REMOVER = [
+    'ALTER TABLE problemas_coleta DROP INDEX problema_busca_ft',
+]
+
+
+def _executar(schema_editor, por_banco):
+    # SQLite: tabela FTS5 sincronizada por triggers; MySQL: índice FULLTEXT nativo
+    for sql in por_banco.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_CRIAR, 'mysql': MYSQL_CRIAR})
+
+
+def remover_indice_busca(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_REMOVER, 'mysql': MYSQL_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0007_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
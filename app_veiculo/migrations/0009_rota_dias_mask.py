@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+from app_veiculo.dias_semana import interpretar
+
+
+def preencher_dias_mask(apps, schema_editor):
+    Rota = apps.get_model('app_veiculo', 'Rota')
+    pendentes = []
+    for rota in Rota.objects.exclude(dias_semana__isnull=True).exclude(dias_semana='').only('id', 'dias_semana').iterator():
+        rota.dias_mask = interpretar(rota.dias_semana)
+        pendentes.append(rota)
+        if len(pendentes) >= 1000:
+            Rota.objects.bulk_update(pendentes, ['dias_mask'])
+            pendentes = []
+    if pendentes:
+        Rota.objects.bulk_update(pendentes, ['dias_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0008_busca_textual_problemas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rota',
+            name='dias_mask',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Dias da semana em bits (bit 0 = segunda ... bit 6 = domingo)'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['dias_mask', 'horario'], name='rota_dias_horario_idx'),
+        ),
+        migrations.RunPython(preencher_dias_mask, migrations.RunPython.noop),
+    ]
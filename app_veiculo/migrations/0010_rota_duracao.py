@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0009_rota_dias_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rota',
+            name='duracao',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Duração prevista da coleta, em minutos', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1440)]),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:22
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+busca = import_module('app_veiculo.migrations.0008_busca_textual_problemas')
+
+# No SQLite, adicionar um campo único recria a tabela problemas_coleta, o que
+# apaga os triggers da busca textual e quebra o que referencia a tabela em
+# veiculos. Os triggers saem antes e voltam depois; a tabela FTS é mantida.
+SQLITE_TRIGGERS = [sql for sql in busca.SQLITE_CRIAR if 'CREATE TRIGGER' in sql]
+SQLITE_REMOVER_TRIGGERS = [sql for sql in busca.SQLITE_REMOVER if 'DROP TRIGGER' in sql]
+
+
+def remover_triggers(apps, schema_editor):
+    busca._executar(schema_editor, {'sqlite': SQLITE_REMOVER_TRIGGERS})
+
+
+def criar_triggers(apps, schema_editor):
+    busca._executar(schema_editor, {'sqlite': SQLITE_TRIGGERS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0010_rota_duracao'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_triggers, criar_triggers),
+        migrations.AddField(
+            model_name='problemacoleta',
+            name='protocolo',
+            field=models.CharField(blank=True, editable=False, help_text='Protocolo entregue ao cidadão na denúncia', max_length=32, null=True, unique=True),
+        ),
+        migrations.RunPython(criar_triggers, remover_triggers),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:24
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+from app_veiculo.agrupamento import STATUS_AGRUPAVEIS, chave_agrupamento
+
+protocolo = import_module('app_veiculo.migrations.0011_problemacoleta_protocolo')
+
+
+def preencher_chaves(apps, schema_editor):
+    # Problemas em aberto passam a receber as denúncias repetidas
+    ProblemaColeta = apps.get_model('app_veiculo', 'ProblemaColeta')
+    pendentes = []
+    abertos = ProblemaColeta.objects.filter(
+        rota__isnull=False, status__in=STATUS_AGRUPAVEIS
+    ).only('id', 'rota_id', 'local_problema')
+    for problema in abertos.iterator():
+        problema.chave_agrupamento = chave_agrupamento(problema.rota_id, problema.local_problema)
+        pendentes.append(problema)
+        if len(pendentes) >= 1000:
+            ProblemaColeta.objects.bulk_update(pendentes, ['chave_agrupamento'])
+            pendentes = []
+    if pendentes:
+        ProblemaColeta.objects.bulk_update(pendentes, ['chave_agrupamento'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0011_problemacoleta_protocolo'),
+    ]
+
+    operations = [
+        # total_denuncias (NOT NULL com default) também recria a tabela no SQLite
+        migrations.RunPython(protocolo.remover_triggers, protocolo.criar_triggers),
+        migrations.AddField(
+            model_name='problemacoleta',
+            name='chave_agrupamento',
+            field=models.CharField(blank=True, editable=False, help_text='Hash da rota e do local normalizado, usado para agrupar denúncias repetidas', max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='problemacoleta',
+            name='total_denuncias',
+            field=models.PositiveIntegerField(default=1, help_text='Quantidade de denúncias agrupadas neste problema'),
+        ),
+        migrations.RunPython(protocolo.criar_triggers, protocolo.remover_triggers),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['chave_agrupamento', 'data_ocorrencia'], name='problema_agrupamento_idx'),
+        ),
+        migrations.RunPython(preencher_chaves, migrations.RunPython.noop),
+    ]
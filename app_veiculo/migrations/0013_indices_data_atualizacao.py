@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0012_agrupamento_denuncias'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['data_atualizacao'], name='problema_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['data_atualizacao'], name='rota_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['data_atualizacao'], name='veiculo_atualizacao_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_resolucoes(apps, schema_editor):
+    # Antes do histórico, só o botão da listagem gravava data_resolucao, sempre
+    # na passagem de em andamento para resolvido
+    ProblemaColeta = apps.get_model('app_veiculo', 'ProblemaColeta')
+    TransicaoStatus = apps.get_model('app_veiculo', 'TransicaoStatus')
+    resolvidos = ProblemaColeta.objects.filter(status='resolvido', data_resolucao__isnull=False).only(
+        'id', 'veiculo_id', 'tipo_problema', 'data_ocorrencia', 'data_resolucao', 'solucao'
+    )
+    TransicaoStatus.objects.bulk_create(
+        (
+            TransicaoStatus(
+                problema_id=problema.pk,
+                veiculo_id=problema.veiculo_id,
+                tipo_problema=problema.tipo_problema,
+                status_anterior='em_andamento',
+                status_novo='resolvido',
+                data=problema.data_resolucao,
+                segundos_desde_ocorrencia=max(
+                    int((problema.data_resolucao - problema.data_ocorrencia).total_seconds()), 0
+                ),
+                solucao=problema.solucao,
+            )
+            for problema in resolvidos.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0013_indices_data_atualizacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicaoStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_problema', models.CharField(choices=[('coleta_nao_feita', 'Coleta sem ser feita'), ('area_dificil_acesso', 'Áreas de difícil acesso'), ('problema_mecanico', 'Problema mecânico'), ('outros', 'Outros')], max_length=30)),
+                ('status_anterior', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('resolvido', 'Resolvido'), ('cancelado', 'Cancelado')], max_length=15)),
+                ('status_novo', models.CharField(choices=[('aberto', 'Aberto'), ('em_andamento', 'Em Andamento'), ('resolvido', 'Resolvido'), ('cancelado', 'Cancelado')], max_length=15)),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('segundos_desde_ocorrencia', models.PositiveIntegerField(help_text='Tempo entre a ocorrência do problema e a transição')),
+                ('solucao', models.TextField(blank=True, help_text='Solução registrada na resolução', null=True)),
+                ('problema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transicoes', to='app_veiculo.problemacoleta')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transicoes_problemas', to=settings.AUTH_USER_MODEL)),
+                ('veiculo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transicoes_problemas', to='app_veiculo.veiculo')),
+            ],
+            options={
+                'verbose_name': 'Transição de Status',
+                'verbose_name_plural': 'Transições de Status',
+                'db_table': 'transicoes_status_problema',
+                'ordering': ['data', 'id'],
+                'indexes': [models.Index(fields=['problema', 'data'], name='transicao_problema_data_idx'), models.Index(fields=['status_novo', 'data'], name='transicao_status_data_idx'), models.Index(fields=['veiculo', 'status_novo', 'data'], name='transicao_veiculo_status_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_resolucoes, migrations.RunPython.noop),
+    ]
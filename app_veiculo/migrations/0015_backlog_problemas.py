@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def contar_pendentes(apps, schema_editor):
+    ProblemaColeta = apps.get_model('app_veiculo', 'ProblemaColeta')
+    BacklogDiario = apps.get_model('app_veiculo', 'BacklogDiario')
+    pendentes = (
+        ProblemaColeta.objects.filter(status__in=['aberto', 'em_andamento'])
+        .annotate(dia=TruncDate('data_ocorrencia'))
+        .values('prioridade', 'dia')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    BacklogDiario.objects.bulk_create(
+        (BacklogDiario(prioridade=linha['prioridade'], data=linha['dia'], pendentes=linha['total']) for linha in pendentes),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0014_historico_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BacklogDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prioridade', models.CharField(choices=[('baixa', 'Baixa'), ('media', 'Média'), ('alta', 'Alta'), ('urgente', 'Urgente')], max_length=10)),
+                ('data', models.DateField()),
+                ('pendentes', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Backlog Diário',
+                'verbose_name_plural': 'Backlog Diário',
+                'db_table': 'backlog_problemas',
+                'ordering': ['data', 'prioridade'],
+                'unique_together': {('prioridade', 'data')},
+            },
+        ),
+        migrations.RunPython(contar_pendentes, migrations.RunPython.noop),
+    ]
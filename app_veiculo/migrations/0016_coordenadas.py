@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:44
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0015_backlog_problemas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problemacoleta',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Latitude do local do problema (opcional)', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='problemacoleta',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Longitude do local do problema (opcional)', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='rota',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Latitude do ponto de coleta (opcional)', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='rota',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Longitude do ponto de coleta (opcional)', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='problemacoleta',
+            index=models.Index(fields=['latitude', 'longitude'], name='problema_coordenadas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['latitude', 'longitude'], name='rota_coordenadas_idx'),
+        ),
+    ]
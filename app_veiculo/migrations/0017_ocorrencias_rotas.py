@@ -0,0 +1,106 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def copiar_conclusoes(apps, schema_editor):
+    # Cada rota marcada como concluída vira a ocorrência concluída do dia da última alteração
+    Rota = apps.get_model('app_veiculo', 'Rota')
+    OcorrenciaRota = apps.get_model('app_veiculo', 'OcorrenciaRota')
+    concluidas = Rota.objects.filter(concluida=True).values_list('id', 'veiculo_id', 'data_atualizacao')
+    OcorrenciaRota.objects.bulk_create(
+        (
+            OcorrenciaRota(
+                rota_id=rota_id,
+                veiculo_id=veiculo_id,
+                data=timezone.localdate(alteracao) if timezone.is_aware(alteracao) else alteracao.date(),
+                concluida=True,
+                data_conclusao=alteracao,
+            )
+            for rota_id, veiculo_id, alteracao in concluidas.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+def restaurar_conclusoes(apps, schema_editor):
+    # Volta ao campo único: concluída se a ocorrência mais recente da rota foi concluída
+    Rota = apps.get_model('app_veiculo', 'Rota')
+    OcorrenciaRota = apps.get_model('app_veiculo', 'OcorrenciaRota')
+    ultima = OcorrenciaRota.objects.filter(rota=OuterRef('pk')).order_by('-data').values('concluida')[:1]
+    Rota.objects.annotate(ultima_concluida=Subquery(ultima)).filter(ultima_concluida=True).update(concluida=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0016_coordenadas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcorrenciaRota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(help_text='Dia da coleta')),
+                ('concluida', models.BooleanField(default=False, help_text='Coleta concluída no dia')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ocorrência de Rota',
+                'verbose_name_plural': 'Ocorrências de Rotas',
+                'db_table': 'ocorrencias_rotas',
+                'ordering': ['-data', 'rota_id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ocorrenciarota',
+            name='rota',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocorrencias', to='app_veiculo.rota'),
+        ),
+        migrations.AddField(
+            model_name='ocorrenciarota',
+            name='usuario',
+            field=models.ForeignKey(blank=True, help_text='Quem marcou a coleta como concluída', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ocorrencias_rotas', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ocorrenciarota',
+            name='veiculo',
+            field=models.ForeignKey(help_text='Veículo que atendeu a rota no dia (copiado da rota)', on_delete=django.db.models.deletion.CASCADE, related_name='ocorrencias_rotas', to='app_veiculo.veiculo'),
+        ),
+        migrations.AddIndex(
+            model_name='ocorrenciarota',
+            index=models.Index(fields=['veiculo', 'data'], name='ocorrencia_veiculo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ocorrenciarota',
+            index=models.Index(fields=['data', 'concluida'], name='ocorrencia_data_concluida_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ocorrenciarota',
+            index=models.Index(fields=['data_atualizacao'], name='ocorrencia_atualizacao_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ocorrenciarota',
+            unique_together={('rota', 'data')},
+        ),
+        migrations.RunPython(copiar_conclusoes, restaurar_conclusoes),
+        migrations.RemoveIndex(
+            model_name='rota',
+            name='rota_concluida_horario_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='rota',
+            name='rota_veiculo_concluida_idx',
+        ),
+        migrations.RemoveField(
+            model_name='rota',
+            name='concluida',
+        ),
+    ]
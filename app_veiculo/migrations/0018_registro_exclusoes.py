@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0017_ocorrencias_rotas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroExclusao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabela', models.CharField(max_length=64, unique=True)),
+                ('data', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Registro de Exclusão',
+                'verbose_name_plural': 'Registros de Exclusão',
+                'db_table': 'registro_exclusoes',
+            },
+        ),
+    ]
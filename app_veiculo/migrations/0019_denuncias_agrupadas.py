@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_veiculo', '0018_registro_exclusoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DenunciaAgrupada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('protocolo', models.CharField(max_length=32, unique=True)),
+                ('recebida_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Denúncia Agrupada',
+                'verbose_name_plural': 'Denúncias Agrupadas',
+                'db_table': 'denuncias_agrupadas',
+            },
+        ),
+    ]
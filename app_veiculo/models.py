@@ -1,5 +1,18 @@
-from django.db import models
-from django.core.validators import RegexValidator
+import datetime
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, Count, F, FilteredRelation, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+from django.utils import timezone
+
+from .dias_semana import bit_do_dia, dias_da_mascara, interpretar, mascara_de_dias, mascaras_com
 
 class Veiculo(models.Model):
     TIPO_CHOICES = [
@@ -37,10 +50,52 @@ class Veiculo(models.Model):
         verbose_name_plural = "Veículos"
         db_table = "veiculos"
         ordering = ['placa']
+        indexes = [
+            # Dropdowns e listagem filtrados por ativo, ordenados por placa
+            models.Index(fields=['ativo', 'placa'], name='veiculo_ativo_placa_idx'),
+            # Validador (ETag/Last-Modified) da API: MAX(data_atualizacao)
+            models.Index(fields=['data_atualizacao'], name='veiculo_atualizacao_idx'),
+        ]
     
     def __str__(self):
         return f"{self.placa} - {self.get_tipo_display()}"
 
+class RotaQuerySet(models.QuerySet):
+    def operando_em(self, *dias):
+        """
+        Rotas que operam em algum dos dias informados ('qua', 'Quarta', date
+        ou weekday()). Usa `dias_mask__in`, que é atendido pelo índice.
+        """
+        return self.filter(dias_mask__in=mascaras_com(mascara_de_dias(dias)))
+
+    def operando_hoje(self):
+        return self.operando_em(timezone.localdate())
+
+    def com_situacao(self, data=None):
+        """
+        Anota `concluida` com a situação da rota em `data` (padrão: hoje) e
+        `opera_no_dia` com se a rota tem coleta nesse dia da semana. A
+        ocorrência do dia vem por LEFT JOIN no índice único (rota, data); só
+        está pendente a rota que opera no dia e não tem conclusão.
+        """
+        data = data or timezone.localdate()
+        return self.annotate(
+            ocorrencia_do_dia=FilteredRelation('ocorrencias', condition=Q(ocorrencias__data=data)),
+            concluida=Coalesce('ocorrencia_do_dia__concluida', Value(False)),
+            opera_no_dia=Case(
+                When(Q(dias_mask__in=mascaras_com(bit_do_dia(data))), then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def pendentes_em(self, data=None):
+        """Rotas que operam em `data` (padrão: hoje) e ainda não foram concluídas no dia."""
+        data = data or timezone.localdate()
+        concluidas = OcorrenciaRota.objects.filter(data=data, concluida=True).values('rota_id')
+        return self.operando_em(data).exclude(pk__in=concluidas)
+
+
 class Rota(models.Model):
     DIAS_SEMANA_CHOICES = [
         ('seg', 'Segunda-feira'),
@@ -62,35 +117,181 @@ class Rota(models.Model):
         max_length=200,
         help_text='Local da coleta'
     )
+    latitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+        help_text='Latitude do ponto de coleta (opcional)'
+    )
+    longitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+        help_text='Longitude do ponto de coleta (opcional)'
+    )
     horario = models.TimeField(help_text='Horário da coleta')
+    duracao = models.PositiveSmallIntegerField(
+        default=30,
+        validators=[MinValueValidator(1), MaxValueValidator(24 * 60)],
+        help_text='Duração prevista da coleta, em minutos'
+    )
     dias_semana = models.CharField(
         max_length=50,
         blank=True,
         null=True,
         help_text='Dias da semana (ex: Seg, Ter, Qua)'
     )
+    dias_mask = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Dias da semana em bits (bit 0 = segunda ... bit 6 = domingo)'
+    )
     observacoes = models.TextField(
         blank=True,
         null=True,
         help_text='Observações adicionais'
     )
-    concluida = models.BooleanField(
-        default=False,
-        help_text='Rota concluída'
-    )
     data_cadastro = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
 
+    objects = RotaQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Rota"
         verbose_name_plural = "Rotas"
         db_table = "rotas"
         ordering = ['horario']
         unique_together = ['veiculo', 'horario']
+        indexes = [
+            # rota_list/relatorio_rotas: ordenadas por horario (a situação do dia vem de OcorrenciaRota)
+            models.Index(fields=['horario', 'id'], name='rota_horario_id_idx'),
+            # relatorio_servico: intervalo de data_cadastro
+            models.Index(fields=['data_cadastro'], name='rota_data_cadastro_idx'),
+            # Rotas do dia: dias_mask__in=(...) ordenado por horario
+            models.Index(fields=['dias_mask', 'horario'], name='rota_dias_horario_idx'),
+            # Validador (ETag/Last-Modified) da API: MAX(data_atualizacao)
+            models.Index(fields=['data_atualizacao'], name='rota_atualizacao_idx'),
+            # Células da grade espacial: faixa de latitude, depois de longitude
+            models.Index(fields=['latitude', 'longitude'], name='rota_coordenadas_idx'),
+        ]
     
     def __str__(self):
         return f"{self.veiculo.placa} - {self.local} ({self.horario})"
 
+    def save(self, *args, **kwargs):
+        # dias_mask é derivada do texto, qualquer que seja a origem da gravação
+        self.dias_mask = interpretar(self.dias_semana)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'dias_semana' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'dias_mask'}
+        super().save(*args, **kwargs)
+
+    @property
+    def dias(self):
+        return dias_da_mascara(self.dias_mask)
+
+
+class OcorrenciaRota(models.Model):
+    """
+    Ocorrência de uma rota em uma data, com a situação da coleta naquele dia.
+    A conclusão vale só para a data: na semana seguinte a mesma rota volta a
+    aparecer como pendente, sem gravar nada na tabela de rotas. O comando
+    `virar_dia` abre as ocorrências do dia de uma vez; as que ficam pendentes
+    registram as coletas não realizadas.
+    """
+
+    rota = models.ForeignKey(
+        Rota,
+        on_delete=models.CASCADE,
+        related_name='ocorrencias',
+    )
+    veiculo = models.ForeignKey(
+        Veiculo,
+        on_delete=models.CASCADE,
+        related_name='ocorrencias_rotas',
+        help_text='Veículo que atendeu a rota no dia (copiado da rota)'
+    )
+    data = models.DateField(help_text='Dia da coleta')
+    concluida = models.BooleanField(default=False, help_text='Coleta concluída no dia')
+    data_conclusao = models.DateTimeField(blank=True, null=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ocorrencias_rotas',
+        help_text='Quem marcou a coleta como concluída'
+    )
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Ocorrência de Rota"
+        verbose_name_plural = "Ocorrências de Rotas"
+        db_table = "ocorrencias_rotas"
+        ordering = ['-data', 'rota_id']
+        # O índice único (rota, data) atende o JOIN da situação do dia
+        unique_together = ['rota', 'data']
+        indexes = [
+            # Snapshot diário: coletas concluídas por veículo e dia
+            models.Index(fields=['veiculo', 'data'], name='ocorrencia_veiculo_data_idx'),
+            # Agenda e virada do dia: ocorrências de uma data, concluídas ou não
+            models.Index(fields=['data', 'concluida'], name='ocorrencia_data_concluida_idx'),
+            # Validador (ETag/Last-Modified) da API: MAX(data_atualizacao)
+            models.Index(fields=['data_atualizacao'], name='ocorrencia_atualizacao_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rota_id} em {self.data}: {'concluída' if self.concluida else 'pendente'}"
+
+    @classmethod
+    def alternar(cls, rota, usuario=None, data=None):
+        """Conclui a coleta de `rota` em `data` (padrão: hoje) ou a reabre, se já concluída."""
+        data = data or timezone.localdate()
+        with transaction.atomic():
+            ocorrencia, _ = cls.objects.select_for_update().get_or_create(
+                rota=rota, data=data, defaults={'veiculo_id': rota.veiculo_id}
+            )
+            ocorrencia.concluida = not ocorrencia.concluida
+            if ocorrencia.concluida:
+                ocorrencia.veiculo_id = rota.veiculo_id
+                ocorrencia.data_conclusao = timezone.now()
+                ocorrencia.usuario = usuario if usuario is not None and usuario.is_authenticated else None
+            else:
+                ocorrencia.data_conclusao = None
+                ocorrencia.usuario = None
+            ocorrencia.save()
+        return ocorrencia
+
+    @classmethod
+    def abrir_dia(cls, data):
+        """
+        Cria as ocorrências pendentes de `data` para as rotas de veículos
+        ativos que operam no dia, com um único INSERT ... SELECT; as que já
+        existem ficam como estão. Retorna quantas foram criadas.
+        """
+        selecao = (
+            Rota.objects.operando_em(data)
+            .filter(veiculo__ativo=True)
+            .exclude(ocorrencias__data=data)
+            .annotate(
+                dia=Value(data, output_field=models.DateField()),
+                pendente=Value(False, output_field=models.BooleanField()),
+                agora=Value(timezone.now(), output_field=models.DateTimeField()),
+            )
+            .order_by()
+            .values_list('id', 'veiculo_id', 'dia', 'pendente', 'agora')
+        )
+        sql, parametros = selecao.query.sql_with_params()
+        with connections[selecao.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {cls._meta.db_table} (rota_id, veiculo_id, data, concluida, data_atualizacao) {sql}',
+                parametros,
+            )
+            return cursor.rowcount
+
 class ProblemaColeta(models.Model):
     TIPO_PROBLEMA_CHOICES = [
         ('coleta_nao_feita', 'Coleta sem ser feita'),
@@ -112,6 +313,9 @@ class ProblemaColeta(models.Model):
         ('resolvido', 'Resolvido'),
         ('cancelado', 'Cancelado'),
     ]
+
+    # Status que ainda exigem atendimento (backlog)
+    STATUS_PENDENTES = ['aberto', 'em_andamento']
     
     veiculo = models.ForeignKey(
         Veiculo,
@@ -151,6 +355,22 @@ class ProblemaColeta(models.Model):
         max_length=200,
         help_text='Local onde ocorreu o problema'
     )
+    latitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+        help_text='Latitude do local do problema (opcional)'
+    )
+    longitude = models.DecimalField(
+        max_digits=9,
+        decimal_places=6,
+        blank=True,
+        null=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+        help_text='Longitude do local do problema (opcional)'
+    )
     data_ocorrencia = models.DateTimeField(
         help_text='Data e hora da ocorrência do problema'
     )
@@ -173,6 +393,25 @@ class ProblemaColeta(models.Model):
         null=True,
         help_text='Observações adicionais'
     )
+    protocolo = models.CharField(
+        max_length=32,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text='Protocolo entregue ao cidadão na denúncia'
+    )
+    chave_agrupamento = models.CharField(
+        max_length=40,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text='Hash da rota e do local normalizado, usado para agrupar denúncias repetidas'
+    )
+    total_denuncias = models.PositiveIntegerField(
+        default=1,
+        help_text='Quantidade de denúncias agrupadas neste problema'
+    )
     data_cadastro = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
     
@@ -181,6 +420,705 @@ class ProblemaColeta(models.Model):
         verbose_name_plural = "Problemas de Coleta"
         db_table = "problemas_coleta"
         ordering = ['-data_ocorrencia', '-prioridade']
+        indexes = [
+            # problema_list: cada filtro seguido da ordenação por data de ocorrência
+            models.Index(fields=['-data_ocorrencia', '-id'], name='problema_data_id_idx'),
+            models.Index(fields=['status', '-data_ocorrencia', '-id'], name='problema_status_data_idx'),
+            models.Index(fields=['prioridade', '-data_ocorrencia', '-id'], name='problema_prioridade_data_idx'),
+            models.Index(fields=['tipo_problema', '-data_ocorrencia', '-id'], name='problema_tipo_data_idx'),
+            models.Index(fields=['veiculo', '-data_ocorrencia', '-id'], name='problema_veiculo_data_idx'),
+            # Agrupamento de denúncias: mesma chave dentro da janela de tempo
+            models.Index(fields=['chave_agrupamento', 'data_ocorrencia'], name='problema_agrupamento_idx'),
+            # Validador (ETag/Last-Modified) da API: MAX(data_atualizacao)
+            models.Index(fields=['data_atualizacao'], name='problema_atualizacao_idx'),
+            # Busca por raio: retângulo envolvente em latitude e longitude
+            models.Index(fields=['latitude', 'longitude'], name='problema_coordenadas_idx'),
+        ]
+        # O índice parcial de problemas pendentes (problema_pendente_idx) é criado
+        # pela migração 0007 apenas nos bancos que suportam índices com condição.
     
     def __str__(self):
-        return f"{self.get_tipo_problema_display()} - {self.veiculo.placa} ({self.data_ocorrencia.date()})"
\ No newline at end of file
+        return f"{self.get_tipo_problema_display()} - {self.veiculo.placa} ({self.data_ocorrencia.date()})"
+
+
+class TransicaoStatus(models.Model):
+    """
+    Histórico, só de inclusão, das mudanças de status dos problemas de coleta.
+    Veículo e tipo do problema são copiados para que o tempo de resolução por
+    veículo ou por tipo saia de uma varredura de intervalo em `data`, sem JOIN.
+    """
+
+    problema = models.ForeignKey(
+        ProblemaColeta,
+        on_delete=models.CASCADE,
+        related_name='transicoes',
+    )
+    veiculo = models.ForeignKey(
+        Veiculo,
+        on_delete=models.CASCADE,
+        related_name='transicoes_problemas',
+    )
+    tipo_problema = models.CharField(max_length=30, choices=ProblemaColeta.TIPO_PROBLEMA_CHOICES)
+    status_anterior = models.CharField(max_length=15, choices=ProblemaColeta.STATUS_CHOICES)
+    status_novo = models.CharField(max_length=15, choices=ProblemaColeta.STATUS_CHOICES)
+    data = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transicoes_problemas',
+    )
+    segundos_desde_ocorrencia = models.PositiveIntegerField(
+        help_text='Tempo entre a ocorrência do problema e a transição'
+    )
+    solucao = models.TextField(
+        blank=True,
+        null=True,
+        help_text='Solução registrada na resolução'
+    )
+
+    class Meta:
+        verbose_name = "Transição de Status"
+        verbose_name_plural = "Transições de Status"
+        db_table = "transicoes_status_problema"
+        ordering = ['data', 'id']
+        indexes = [
+            # Histórico de um problema
+            models.Index(fields=['problema', 'data'], name='transicao_problema_data_idx'),
+            # Tempo médio de resolução no período, geral, por tipo e por veículo
+            models.Index(fields=['status_novo', 'data'], name='transicao_status_data_idx'),
+            models.Index(fields=['veiculo', 'status_novo', 'data'], name='transicao_veiculo_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.problema_id}: {self.status_anterior} -> {self.status_novo} ({self.data})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('O histórico de status não pode ser alterado.')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def de(cls, problema, status_anterior, usuario=None, data=None):
+        """Transição (ainda não gravada) do status anterior para o status atual do problema."""
+        data = data or timezone.now()
+        return cls(
+            problema_id=problema.pk,
+            veiculo_id=problema.veiculo_id,
+            tipo_problema=problema.tipo_problema,
+            status_anterior=status_anterior,
+            status_novo=problema.status,
+            data=data,
+            usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+            segundos_desde_ocorrencia=max(int((data - problema.data_ocorrencia).total_seconds()), 0),
+            solucao=problema.solucao if problema.status == 'resolvido' else None,
+        )
+
+
+class EstatisticaDiaria(models.Model):
+    """
+    Snapshot materializado das estatísticas de serviço por dia e por veículo.
+
+    As rotas são contabilizadas pela data de cadastro, as coletas concluídas
+    pela data da ocorrência da rota e os problemas pela data de ocorrência.
+    Cada linha é recalculada pelos signals abaixo sempre
+    que um registro do seu dia/veículo muda, e a tabela inteira pode ser
+    reconstruída com o comando `recalcular_estatisticas`.
+    """
+
+    data = models.DateField(help_text='Dia de referência das estatísticas')
+    veiculo = models.ForeignKey(
+        Veiculo,
+        on_delete=models.CASCADE,
+        related_name='estatisticas',
+        help_text='Veículo ao qual as estatísticas se referem'
+    )
+    tipo_veiculo = models.CharField(
+        max_length=20,
+        choices=Veiculo.TIPO_CHOICES,
+        help_text='Tipo do veículo (copiado para agrupar sem junção)'
+    )
+    rotas_cadastradas = models.PositiveIntegerField(default=0)
+    rotas_concluidas = models.PositiveIntegerField(default=0)
+    problemas_registrados = models.PositiveIntegerField(default=0)
+    problemas_abertos = models.PositiveIntegerField(default=0)
+    problemas_resolvidos = models.PositiveIntegerField(default=0)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    CONTADORES = [
+        'rotas_cadastradas', 'rotas_concluidas',
+        'problemas_registrados', 'problemas_abertos', 'problemas_resolvidos',
+    ]
+
+    class Meta:
+        verbose_name = "Estatística Diária"
+        verbose_name_plural = "Estatísticas Diárias"
+        db_table = "estatisticas_diarias"
+        ordering = ['-data', 'veiculo_id']
+        unique_together = ['data', 'veiculo']
+
+    def __str__(self):
+        return f"{self.data} - {self.veiculo_id}"
+
+    @staticmethod
+    def _contadores_rotas(rotas, ocorrencias):
+        return {
+            'rotas_cadastradas': rotas.count(),
+            'rotas_concluidas': ocorrencias.filter(concluida=True).count(),
+        }
+
+    @staticmethod
+    def _contadores_problemas(problemas):
+        return problemas.aggregate(
+            problemas_registrados=Count('id'),
+            problemas_abertos=Count('id', filter=Q(status__in=['aberto', 'em_andamento'])),
+            problemas_resolvidos=Count('id', filter=Q(status='resolvido')),
+        )
+
+    @classmethod
+    def recalcular(cls, veiculo_id, data):
+        """Recalcula a linha de um único dia/veículo a partir das tabelas de origem."""
+        contadores = cls._contadores_rotas(
+            Rota.objects.filter(veiculo_id=veiculo_id, data_cadastro__date=data),
+            OcorrenciaRota.objects.filter(veiculo_id=veiculo_id, data=data),
+        )
+        contadores.update(cls._contadores_problemas(
+            ProblemaColeta.objects.filter(veiculo_id=veiculo_id, data_ocorrencia__date=data)
+        ))
+
+        if not any(contadores[campo] for campo in ('rotas_cadastradas', 'rotas_concluidas', 'problemas_registrados')):
+            cls.objects.filter(veiculo_id=veiculo_id, data=data).delete()
+            return None
+
+        tipo = Veiculo.objects.filter(pk=veiculo_id).values_list('tipo', flat=True).first()
+        if tipo is None:
+            return None
+
+        contadores['tipo_veiculo'] = tipo
+        estatistica, _ = cls.objects.update_or_create(
+            veiculo_id=veiculo_id, data=data, defaults=contadores
+        )
+        return estatistica
+
+    @classmethod
+    def recalcular_registros(cls, registros):
+        """
+        Recalcula os dias/veículos de rotas ou problemas gravados em massa
+        (bulk_create, bulk_update, update), que não disparam os signals. Usa
+        as mesmas consultas agrupadas de reconstruir(), restritas aos
+        veículos e ao intervalo de dias afetados.
+        """
+        return cls.recalcular_chaves({_chave_estatistica(registro) for registro in registros} - {None})
+
+    @classmethod
+    def recalcular_chaves(cls, chaves):
+        """Recalcula um conjunto de pares (veiculo_id, dia)."""
+        if not chaves:
+            return 0
+
+        veiculos = {veiculo_id for veiculo_id, _ in chaves}
+        dias = [dia for _, dia in chaves]
+        inicio = timezone.make_aware(datetime.datetime.combine(min(dias), datetime.time.min))
+        fim = timezone.make_aware(datetime.datetime.combine(max(dias) + datetime.timedelta(days=1), datetime.time.min))
+
+        linhas = cls._linhas_agrupadas(
+            Rota.objects.filter(veiculo_id__in=veiculos, data_cadastro__gte=inicio, data_cadastro__lt=fim),
+            OcorrenciaRota.objects.filter(veiculo_id__in=veiculos, data__gte=min(dias), data__lte=max(dias)),
+            ProblemaColeta.objects.filter(veiculo_id__in=veiculos, data_ocorrencia__gte=inicio, data_ocorrencia__lt=fim),
+            Veiculo.objects.filter(pk__in=veiculos),
+        )
+        linhas = {chave: linha for chave, linha in linhas.items() if chave in chaves}
+
+        # Linhas antigas dos mesmos dias/veículos são substituídas pelas novas
+        substituidas = [
+            pk for pk, veiculo_id, data in cls.objects.filter(
+                veiculo_id__in=veiculos, data__in=set(dias)
+            ).values_list('pk', 'veiculo_id', 'data')
+            if (veiculo_id, data) in chaves
+        ]
+        with transaction.atomic():
+            cls.objects.filter(pk__in=substituidas).delete()
+            cls.objects.bulk_create(linhas.values(), batch_size=1000)
+        return len(chaves)
+
+    @classmethod
+    def _linhas_agrupadas(cls, rotas, ocorrencias, problemas, veiculos):
+        """Linhas (ainda não gravadas) por (veiculo_id, dia) a partir das tabelas de origem."""
+        linhas = {}
+
+        def linha(veiculo_id, data):
+            return linhas.setdefault((veiculo_id, data), cls(veiculo_id=veiculo_id, data=data))
+
+        rotas = (
+            rotas.order_by()
+            .annotate(dia=TruncDate('data_cadastro'))
+            .values('veiculo_id', 'dia')
+            .annotate(cadastradas=Count('id'))
+        )
+        for item in rotas:
+            linha(item['veiculo_id'], item['dia']).rotas_cadastradas = item['cadastradas']
+
+        ocorrencias = (
+            ocorrencias.filter(concluida=True)
+            .order_by()
+            .values('veiculo_id', 'data')
+            .annotate(concluidas=Count('id'))
+        )
+        for item in ocorrencias:
+            linha(item['veiculo_id'], item['data']).rotas_concluidas = item['concluidas']
+
+        problemas = (
+            problemas.order_by()
+            .annotate(dia=TruncDate('data_ocorrencia'))
+            .values('veiculo_id', 'dia')
+            .annotate(
+                registrados=Count('id'),
+                abertos=Count('id', filter=Q(status__in=['aberto', 'em_andamento'])),
+                resolvidos=Count('id', filter=Q(status='resolvido')),
+            )
+        )
+        for item in problemas:
+            estatistica = linha(item['veiculo_id'], item['dia'])
+            estatistica.problemas_registrados = item['registrados']
+            estatistica.problemas_abertos = item['abertos']
+            estatistica.problemas_resolvidos = item['resolvidos']
+
+        tipos = dict(veiculos.values_list('id', 'tipo'))
+        for estatistica in linhas.values():
+            estatistica.tipo_veiculo = tipos[estatistica.veiculo_id]
+        return linhas
+
+    @classmethod
+    def reconstruir(cls):
+        """Apaga e recalcula todo o snapshot com consultas agrupadas por dia/veículo."""
+        linhas = cls._linhas_agrupadas(
+            Rota.objects.all(), OcorrenciaRota.objects.all(), ProblemaColeta.objects.all(), Veiculo.objects.all()
+        )
+
+        cls.objects.all().delete()
+        cls.objects.bulk_create(linhas.values(), batch_size=1000)
+        return len(linhas)
+
+    @classmethod
+    def totais(cls, **filtros):
+        """Soma os contadores das linhas que atendem aos filtros informados."""
+        totais = cls.objects.filter(**filtros).aggregate(
+            rotas_cadastradas=Sum('rotas_cadastradas'),
+            rotas_concluidas=Sum('rotas_concluidas'),
+            problemas_registrados=Sum('problemas_registrados'),
+            problemas_abertos=Sum('problemas_abertos'),
+            problemas_resolvidos=Sum('problemas_resolvidos'),
+        )
+        return {campo: valor or 0 for campo, valor in totais.items()}
+
+
+class BacklogDiario(models.Model):
+    """
+    Problemas pendentes (aberto ou em andamento) por prioridade e dia da
+    ocorrência. Cada gravação de ProblemaColeta soma ou subtrai 1 na linha
+    do seu dia, de modo que o painel de backlog lê algumas centenas de
+    linhas em vez de varrer o histórico de problemas.
+    """
+
+    prioridade = models.CharField(max_length=10, choices=ProblemaColeta.PRIORIDADE_CHOICES)
+    data = models.DateField()
+    pendentes = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Backlog Diário"
+        verbose_name_plural = "Backlog Diário"
+        db_table = "backlog_problemas"
+        ordering = ['data', 'prioridade']
+        unique_together = ['prioridade', 'data']
+
+    def __str__(self):
+        return f"{self.data} - {self.get_prioridade_display()}: {self.pendentes}"
+
+    @classmethod
+    def aplicar_variacoes(cls, variacoes):
+        """Soma {(prioridade, dia): variação} aos contadores, com UPDATE ... SET pendentes = pendentes + n."""
+        for (prioridade, data), variacao in variacoes.items():
+            if not variacao:
+                continue
+            linhas = cls.objects.filter(prioridade=prioridade, data=data)
+            if linhas.update(pendentes=F('pendentes') + variacao):
+                if variacao < 0:
+                    linhas.filter(pendentes__lte=0).delete()
+                continue
+            if variacao < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(prioridade=prioridade, data=data, pendentes=variacao)
+            except IntegrityError:
+                # Criada por outra gravação entre o UPDATE e o INSERT
+                linhas.update(pendentes=F('pendentes') + variacao)
+
+    @classmethod
+    def _contagens(cls, problemas):
+        pendentes = (
+            problemas.filter(status__in=ProblemaColeta.STATUS_PENDENTES)
+            .annotate(dia=TruncDate('data_ocorrencia'))
+            .values('prioridade', 'dia')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        return {(linha['prioridade'], linha['dia']): linha['total'] for linha in pendentes}
+
+    @classmethod
+    def recalcular_chaves(cls, chaves):
+        """
+        Recontagem exata de um conjunto de pares (prioridade, dia), para
+        gravações em massa cujo efeito não se conhece linha a linha.
+        """
+        if not chaves:
+            return 0
+        dias = [dia for _, dia in chaves]
+        inicio = timezone.make_aware(datetime.datetime.combine(min(dias), datetime.time.min))
+        fim = timezone.make_aware(datetime.datetime.combine(max(dias) + datetime.timedelta(days=1), datetime.time.min))
+        contagens = cls._contagens(ProblemaColeta.objects.filter(
+            prioridade__in={prioridade for prioridade, _ in chaves},
+            data_ocorrencia__gte=inicio,
+            data_ocorrencia__lt=fim,
+        ))
+
+        # Linhas antigas das mesmas chaves são substituídas pelas recontadas
+        substituidas = Q()
+        for prioridade, dia in chaves:
+            substituidas |= Q(prioridade=prioridade, data=dia)
+        with transaction.atomic():
+            cls.objects.filter(substituidas).delete()
+            cls.objects.bulk_create([
+                cls(prioridade=prioridade, data=dia, pendentes=contagens[(prioridade, dia)])
+                for prioridade, dia in chaves if contagens.get((prioridade, dia))
+            ])
+        return len(chaves)
+
+    @classmethod
+    def reconstruir(cls):
+        """Recria todos os contadores a partir dos problemas pendentes."""
+        linhas = [
+            cls(prioridade=prioridade, data=dia, pendentes=total)
+            for (prioridade, dia), total in cls._contagens(ProblemaColeta.objects.all()).items()
+        ]
+        cls.objects.all().delete()
+        cls.objects.bulk_create(linhas, batch_size=1000)
+        return len(linhas)
+
+
+class DenunciaAgrupada(models.Model):
+    """
+    Protocolo de uma denúncia da fila que só incrementou um problema já
+    existente. As que viram problema guardam o protocolo no próprio
+    ProblemaColeta; com as duas tabelas, um lote reprocessado depois de uma
+    queda reconhece as denúncias já aplicadas e não conta de novo.
+    """
+
+    protocolo = models.CharField(max_length=32, unique=True)
+    recebida_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Denúncia Agrupada"
+        verbose_name_plural = "Denúncias Agrupadas"
+        db_table = "denuncias_agrupadas"
+
+    def __str__(self):
+        return self.protocolo
+
+
+class RegistroExclusao(models.Model):
+    """
+    Momento da última exclusão em cada tabela exposta pela API. Exclusões
+    não aparecem no máximo de data_atualizacao usado pelos validadores
+    (ETag/Last-Modified); gravado no banco, o registro vale para todos os
+    processos da aplicação.
+    """
+
+    tabela = models.CharField(max_length=64, unique=True)
+    data = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Registro de Exclusão"
+        verbose_name_plural = "Registros de Exclusão"
+        db_table = "registro_exclusoes"
+
+    def __str__(self):
+        return f"{self.tabela}: {self.data}"
+
+    @classmethod
+    def marcar(cls, tabela):
+        agora = timezone.now()
+        if cls.objects.filter(tabela=tabela).update(data=agora):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(tabela=tabela, data=agora)
+        except IntegrityError:
+            # Criado por outra exclusão entre o UPDATE e o INSERT
+            cls.objects.filter(tabela=tabela).update(data=agora)
+
+    @classmethod
+    def ultima(cls, *tabelas):
+        """Momento da última exclusão em alguma das tabelas (None se nunca houve)."""
+        return cls.objects.filter(tabela__in=tabelas).aggregate(ultima=models.Max('data'))['ultima']
+
+
+# Signals para manter o snapshot de EstatisticaDiaria atualizado
+
+def _dia(valor):
+    if valor is None or not isinstance(valor, datetime.datetime):
+        return valor
+    if timezone.is_aware(valor):
+        return timezone.localdate(valor)
+    return valor.date()
+
+
+# Data pela qual cada modelo é contabilizado no snapshot (padrão: data_cadastro)
+_CAMPO_DATA_ESTATISTICA = {ProblemaColeta: 'data_ocorrencia', OcorrenciaRota: 'data'}
+
+
+def _chave_estatistica(instance):
+    """
+    Par (veiculo_id, dia) em que o registro é contabilizado. Lê direto do
+    __dict__ para não disparar consultas em campos adiados (.only/.defer).
+    """
+    campo_data = _CAMPO_DATA_ESTATISTICA.get(type(instance), 'data_cadastro')
+    veiculo_id = instance.__dict__.get('veiculo_id')
+    dia = _dia(instance.__dict__.get(campo_data))
+    if veiculo_id is None or dia is None:
+        return None
+    return (veiculo_id, dia)
+
+
+def _exclusao_do_veiculo(origin):
+    # Quando o próprio veículo é excluído, o CASCADE já remove suas estatísticas
+    return origin is not None and getattr(origin, 'model', type(origin)) is Veiculo
+
+
+@receiver(post_init, sender=Rota)
+@receiver(post_init, sender=ProblemaColeta)
+@receiver(post_init, sender=OcorrenciaRota)
+def guardar_chave_estatistica(sender, instance, **kwargs):
+    instance._chave_estatistica = _chave_estatistica(instance)
+
+
+@receiver(post_save, sender=Rota)
+@receiver(post_save, sender=ProblemaColeta)
+@receiver(post_save, sender=OcorrenciaRota)
+def atualizar_estatistica_diaria(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    chave_anterior = getattr(instance, '_chave_estatistica', None)
+    chave_atual = _chave_estatistica(instance)
+
+    for chave in {chave_anterior, chave_atual} - {None}:
+        EstatisticaDiaria.recalcular(*chave)
+
+    instance._chave_estatistica = chave_atual
+
+
+@receiver(post_delete, sender=Rota)
+@receiver(post_delete, sender=ProblemaColeta)
+@receiver(post_delete, sender=OcorrenciaRota)
+def remover_estatistica_diaria(sender, instance, origin=None, **kwargs):
+    if _exclusao_do_veiculo(origin):
+        return
+    # Ocorrências pendentes não entram no snapshot
+    if sender is OcorrenciaRota and not instance.concluida:
+        return
+    chave = _chave_estatistica(instance)
+    if chave:
+        EstatisticaDiaria.recalcular(*chave)
+
+
+@receiver(post_save, sender=Veiculo)
+def atualizar_tipo_estatistica(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    EstatisticaDiaria.objects.filter(veiculo=instance).exclude(
+        tipo_veiculo=instance.tipo
+    ).update(tipo_veiculo=instance.tipo)
+
+
+@receiver(post_save, sender=Veiculo)
+@receiver(post_delete, sender=Veiculo)
+def invalidar_referencias_veiculo(sender, **kwargs):
+    from .referencias import ROTAS, VEICULOS, invalidar
+    # O rótulo das rotas inclui a placa do veículo
+    invalidar(VEICULOS, ROTAS)
+
+
+@receiver(post_save, sender=Rota)
+@receiver(post_delete, sender=Rota)
+def invalidar_referencias_rota(sender, **kwargs):
+    from .referencias import ROTAS, invalidar
+    invalidar(ROTAS)
+
+
+@receiver(post_init, sender=Rota)
+def guardar_celula_anterior(sender, instance, **kwargs):
+    from .localizacao import celula_de
+    instance._celula_geo = celula_de(instance)
+
+
+@receiver(post_save, sender=Rota)
+@receiver(post_delete, sender=Rota)
+def invalidar_grade_rota(sender, instance, **kwargs):
+    from .localizacao import celula_de, invalidar
+    # Só as células em que a rota estava e passou a estar
+    atual = celula_de(instance)
+    invalidar(getattr(instance, '_celula_geo', None), atual)
+    instance._celula_geo = atual
+
+
+@receiver(post_init, sender=Rota)
+def guardar_escala_anterior(sender, instance, **kwargs):
+    instance._dias_mask_agenda = instance.__dict__.get('dias_mask')
+
+
+@receiver(post_save, sender=Rota)
+@receiver(post_delete, sender=Rota)
+def invalidar_agenda_rota(sender, instance, **kwargs):
+    from .agenda import invalidar
+    from .dias_semana import TODOS_OS_DIAS
+    anterior = getattr(instance, '_dias_mask_agenda', None)
+    atual = instance.__dict__.get('dias_mask')
+    # Só os dias em que a rota operava ou passou a operar; sem a máscara anterior, todos
+    if anterior is None or atual is None:
+        invalidar(TODOS_OS_DIAS)
+    else:
+        invalidar(anterior | atual)
+    instance._dias_mask_agenda = atual
+
+
+@receiver(post_save, sender=Veiculo)
+@receiver(post_delete, sender=Veiculo)
+def invalidar_agenda_veiculo(sender, **kwargs):
+    from .agenda import invalidar
+    # A agenda traz a placa e só inclui veículos ativos
+    invalidar()
+
+
+@receiver(post_delete, sender=Veiculo)
+@receiver(post_delete, sender=Rota)
+@receiver(post_delete, sender=OcorrenciaRota)
+@receiver(post_delete, sender=ProblemaColeta)
+def registrar_exclusao(sender, origin=None, **kwargs):
+    # Exclusões não aparecem no máximo de data_atualizacao usado pela API.
+    # O signal chega uma vez por linha, inclusive nas apagadas em cascata; só
+    # a primeira linha da exclusão pedida marca, uma vez por tabela afetada
+    if getattr(origin, 'model', type(origin)) is not sender:
+        return
+    anterior = getattr(_exclusao_atual, 'origem', None)
+    if anterior is not None and anterior() is origin:
+        return
+    _exclusao_atual.origem = weakref.ref(origin)
+
+    tabelas = _tabelas_afetadas(sender)
+
+    def marcar():
+        _exclusao_atual.origem = None
+        for tabela in tabelas:
+            RegistroExclusao.marcar(tabela)
+
+    # Marca só depois do commit: antes dele a API ainda entrega os dados antigos
+    transaction.on_commit(marcar)
+
+
+_exclusao_atual = threading.local()
+
+
+def _tabelas_afetadas(modelo):
+    """Tabelas da API que uma exclusão em `modelo` altera, contando as cascatas."""
+    da_api = {Veiculo, Rota, OcorrenciaRota, ProblemaColeta}
+    tabelas, pendentes, vistos = set(), [modelo], set()
+    while pendentes:
+        atual = pendentes.pop()
+        if atual in vistos:
+            continue
+        vistos.add(atual)
+        if atual in da_api:
+            tabelas.add(atual._meta.db_table)
+        for relacao in atual._meta.related_objects:
+            # CASCADE apaga e SET_NULL altera as linhas relacionadas
+            if relacao.on_delete in (models.CASCADE, models.SET_NULL):
+                pendentes.append(relacao.related_model)
+    return sorted(tabelas)
+
+
+@receiver(post_init, sender=ProblemaColeta)
+def guardar_status_anterior(sender, instance, **kwargs):
+    instance._status_anterior = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=ProblemaColeta)
+def registrar_transicao_status(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, '_status_anterior', None)
+    if raw or created or anterior is None or anterior == instance.status:
+        instance._status_anterior = instance.status
+        return
+    # O usuário vem de status_problema.aplicar(); gravações sem ele ficam sem autor
+    TransicaoStatus.de(
+        instance, anterior, usuario=getattr(instance, '_usuario_transicao', None)
+    ).save()
+    instance._status_anterior = instance.status
+
+
+def _chave_backlog(instance):
+    """(prioridade, dia) em que um problema pendente é contado no backlog; None se não pendente."""
+    if instance.__dict__.get('status') not in ProblemaColeta.STATUS_PENDENTES:
+        return None
+    prioridade = instance.__dict__.get('prioridade')
+    dia = _dia(instance.__dict__.get('data_ocorrencia'))
+    if prioridade is None or dia is None:
+        return None
+    return (prioridade, dia)
+
+
+def variacoes_do_backlog(pares):
+    """Variações de BacklogDiario para uma sequência de (chave anterior, chave atual)."""
+    variacoes = {}
+    for anterior, atual in pares:
+        if anterior == atual:
+            continue
+        if anterior is not None:
+            variacoes[anterior] = variacoes.get(anterior, 0) - 1
+        if atual is not None:
+            variacoes[atual] = variacoes.get(atual, 0) + 1
+    return variacoes
+
+
+@receiver(post_init, sender=ProblemaColeta)
+def guardar_chave_backlog(sender, instance, **kwargs):
+    instance._chave_backlog = _chave_backlog(instance)
+
+
+@receiver(post_save, sender=ProblemaColeta)
+def atualizar_backlog(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Chave guardada na leitura do banco; um problema novo ainda não era contado
+    anterior = None if created else getattr(instance, '_chave_backlog', None)
+    atual = _chave_backlog(instance)
+    BacklogDiario.aplicar_variacoes(variacoes_do_backlog([(anterior, atual)]))
+    instance._chave_backlog = atual
+
+
+@receiver(post_delete, sender=ProblemaColeta)
+def remover_do_backlog(sender, instance, origin=None, **kwargs):
+    variacoes = variacoes_do_backlog([(getattr(instance, '_chave_backlog', None), None)])
+    if _exclusao_do_veiculo(origin):
+        # Exclusão em cascata: as variações são somadas e gravadas de uma vez
+        # no post_delete do veículo, que vem depois do de seus problemas
+        acumuladas = origin.__dict__.setdefault('_variacoes_backlog', {})
+        for chave, variacao in variacoes.items():
+            acumuladas[chave] = acumuladas.get(chave, 0) + variacao
+        return
+    BacklogDiario.aplicar_variacoes(variacoes)
+
+
+@receiver(post_delete, sender=Veiculo)
+def aplicar_backlog_do_veiculo(sender, origin=None, **kwargs):
+    if origin is not None:
+        BacklogDiario.aplicar_variacoes(origin.__dict__.pop('_variacoes_backlog', {}))
@@ -0,0 +1,215 @@
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Mantém os microssegundos que o DjangoJSONEncoder trunca, para o cursor ser exato."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage:
+    """
+    Página de resultados de um CursorPaginator. Expõe a mesma interface de
+    iteração e navegação que os templates já usam com o Paginator do Django.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return ''
+        return self.paginator.codificar_cursor('n', self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ''
+        return self.paginator.codificar_cursor('p', self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return CursorPaginator.ULTIMA_PAGINA
+
+
+class CursorPaginator:
+    """
+    Paginação por cursor (keyset) sobre uma ordenação estável.
+
+    Em vez de OFFSET, cada página filtra os registros posteriores à última
+    linha da página anterior, de modo que a página N custa o mesmo que a
+    primeira. A ordenação deve terminar em um campo único e não nulo
+    (ex: ('horario', 'id')). O total de registros é opcional e, quando
+    pedido, é limitado a `limite_contagem` ou estimado pelo banco.
+    """
+
+    ULTIMA_PAGINA = 'p'
+
+    def __init__(self, queryset, per_page, ordering, contagem_aproximada=False, limite_contagem=1000):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.contagem_aproximada = contagem_aproximada
+        self.limite_contagem = limite_contagem
+        self._count = None
+        self._contagem_exata = False
+
+    # Cursor
+
+    def _campos(self):
+        return [(campo.lstrip('-'), campo.startswith('-')) for campo in self.ordering]
+
+    def codificar_cursor(self, direcao, obj):
+        # Aceita instâncias e também os dicionários de um queryset .values()
+        if isinstance(obj, dict):
+            valores = [obj[campo] for campo, _ in self._campos()]
+        else:
+            valores = [getattr(obj, campo) for campo, _ in self._campos()]
+        dados = json.dumps(valores, cls=_CursorEncoder, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+        return f'{direcao}.{token}'
+
+    def decodificar_cursor(self, cursor):
+        """Retorna (direcao, valores); cursores inválidos voltam para a primeira página."""
+        if not cursor:
+            return 'n', None
+        if cursor == self.ULTIMA_PAGINA:
+            return 'p', None
+        try:
+            direcao, token = cursor.split('.', 1)
+            token += '=' * (-len(token) % 4)
+            valores = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except (ValueError, TypeError):
+            return 'n', None
+        if direcao not in ('n', 'p') or not isinstance(valores, list) or len(valores) != len(self.ordering):
+            return 'n', None
+        return direcao, valores
+
+    def _filtro_apos(self, valores, invertido):
+        """
+        Condição lexicográfica "linha vem depois do cursor":
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        filtro = Q()
+        iguais = {}
+        for (campo, descendente), valor in zip(self._campos(), valores):
+            crescente = descendente == invertido
+            lookup = 'gt' if crescente else 'lt'
+            filtro |= Q(**iguais, **{f'{campo}__{lookup}': valor})
+            iguais[campo] = valor
+        return filtro
+
+    # Páginas
+
+    def get_page(self, cursor=None):
+        direcao, valores = self.decodificar_cursor(cursor)
+        invertido = direcao == 'p'
+
+        ordering = self.ordering
+        if invertido:
+            ordering = tuple(
+                campo[1:] if campo.startswith('-') else f'-{campo}' for campo in self.ordering
+            )
+
+        queryset = self.queryset.order_by(*ordering)
+        if valores is not None:
+            try:
+                queryset = queryset.filter(self._filtro_apos(valores, invertido))
+            except (ValidationError, ValueError, TypeError):
+                return self.get_page()
+
+        try:
+            object_list = list(queryset[:self.per_page + 1])
+        except (ValidationError, ValueError, TypeError):
+            return self.get_page()
+        tem_mais = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if invertido:
+            object_list.reverse()
+            return CursorPage(object_list, self, has_next=valores is not None, has_previous=tem_mais)
+        return CursorPage(object_list, self, has_next=tem_mais, has_previous=valores is not None)
+
+    def percorrer(self):
+        """
+        Percorre todas as páginas a partir da primeira, uma consulta de
+        `per_page` linhas por vez. Ao contrário de .iterator(), mantém a
+        memória constante também no MySQL, cujo driver lê o resultado inteiro.
+        """
+        page = self.get_page()
+        while True:
+            yield from page
+            if not page.has_next():
+                return
+            page = self.get_page(page.next_cursor)
+
+    # Contagem opcional
+
+    @property
+    def count(self):
+        if not self.contagem_aproximada:
+            return None
+        if self._count is None:
+            self._count = self._contar()
+        return self._count
+
+    @property
+    def contagem_exata(self):
+        return self.count is not None and self._contagem_exata
+
+    def _contar(self):
+        total = self.queryset.order_by()[:self.limite_contagem + 1].count()
+        if total <= self.limite_contagem:
+            self._contagem_exata = True
+            return total
+
+        estimativa = self._estimativa_do_banco()
+        return max(estimativa or 0, self.limite_contagem)
+
+    def _estimativa_do_banco(self):
+        """Número de linhas estimado pelas estatísticas do MySQL (apenas sem filtros)."""
+        if self.queryset.query.where:
+            return None
+        connection = connections[self.queryset.db]
+        if connection.vendor != 'mysql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [self.queryset.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+        return linha[0] if linha else None
@@ -0,0 +1,107 @@
+import json
+import re
+
+from django.db import connections
+
+from .filtros import filtrar_veiculos, filtrar_rotas, filtrar_problemas
+from .models import Veiculo, Rota, ProblemaColeta, EstatisticaDiaria
+from .relatorios import intervalo_de_datas
+
+
+def consultas_das_listagens():
+    """
+    Formatos de consulta gerados pelas listagens e relatórios, com os mesmos
+    filtros, ordenação e limite de página que as views usam. A busca textual
+    entra pelo índice FTS/FULLTEXT; filtros __icontains ficam de fora porque
+    não são atendidos por índices B-tree.
+    """
+    veiculos = Veiculo.objects.order_by('placa')
+    rotas = Rota.objects.select_related('veiculo').com_situacao().order_by('horario', 'id')
+    problemas = ProblemaColeta.objects.select_related('veiculo', 'rota').order_by('-data_ocorrencia', '-id')
+    inicio, fim = intervalo_de_datas(None, None)
+
+    return [
+        ('veiculo_list', filtrar_veiculos(veiculos)[:11]),
+        ('veiculo_list?ativo', filtrar_veiculos(veiculos, ativo='true')[:11]),
+        ('rota_list', filtrar_rotas(rotas)[:11]),
+        ('rota_list?concluida', filtrar_rotas(rotas, concluida='false')[:11]),
+        ('rota_list?veiculo', filtrar_rotas(rotas, veiculo='1')[:11]),
+        ('rota_list?veiculo&concluida', filtrar_rotas(rotas, veiculo='1', concluida='true')[:11]),
+        ('relatorio_rotas?dias', filtrar_rotas(rotas, dias='qua')[:21]),
+        ('problema_list', filtrar_problemas(problemas)[:16]),
+        ('problema_list?status', filtrar_problemas(problemas, status='aberto')[:16]),
+        ('problema_list?prioridade', filtrar_problemas(problemas, prioridade='alta')[:16]),
+        ('problema_list?tipo', filtrar_problemas(problemas, tipo='outros')[:16]),
+        ('problema_list?veiculo', filtrar_problemas(problemas, veiculo='1')[:16]),
+        ('problema_list?search', filtrar_problemas(problemas, search='coleta').order_by('relevancia', 'id')[:16]),
+        ('problema_list?search&status', filtrar_problemas(
+            problemas, search='coleta', status='aberto',
+        ).order_by('relevancia', 'id')[:16]),
+        ('relatorio_servico:rotas_periodo', Rota.objects.select_related('veiculo').com_situacao().filter(
+            data_cadastro__gte=inicio, data_cadastro__lt=fim,
+        ).order_by('-data_cadastro', '-id')[:51]),
+        ('relatorio_servico:totais_periodo', EstatisticaDiaria.objects.filter(
+            data__gte=inicio.date(), data__lt=fim.date(),
+        )),
+    ]
+
+
+def _varreduras_sqlite(plano):
+    # "SCAN tabela" sem "USING INDEX" é leitura da tabela inteira. Na tabela
+    # FTS5 o índice vem no idxStr: "M" é o MATCH, e "=" junto dele indica o
+    # MATCH refeito para cada linha de outra tabela (laço interno)
+    tabelas = []
+    for linha in plano.splitlines():
+        encontrado = re.search(r'\bSCAN (\w+)(.*)$', linha)
+        if not encontrado:
+            continue
+        tabela, resto = encontrado.groups()
+        virtual = re.search(r'VIRTUAL TABLE INDEX \d+:(\S*)', resto)
+        if virtual:
+            if 'M' not in virtual.group(1) or '=' in virtual.group(1):
+                tabelas.append(tabela)
+        elif 'USING' not in resto:
+            tabelas.append(tabela)
+    return tabelas
+
+
+def _varreduras_mysql(plano):
+    tabelas = []
+
+    def visitar(no):
+        if isinstance(no, dict):
+            if no.get('access_type') == 'ALL' and 'table_name' in no:
+                tabelas.append(no['table_name'])
+            for valor in no.values():
+                visitar(valor)
+        elif isinstance(no, list):
+            for valor in no:
+                visitar(valor)
+
+    visitar(json.loads(plano))
+    return tabelas
+
+
+def _varreduras_postgresql(plano):
+    return re.findall(r'Seq Scan on (\w+)', plano)
+
+
+def analisar(queryset):
+    """Executa EXPLAIN e devolve (plano, tabelas lidas por varredura completa)."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        plano = queryset.explain(format='json')
+        return plano, _varreduras_mysql(plano)
+    plano = queryset.explain()
+    if vendor == 'postgresql':
+        return plano, _varreduras_postgresql(plano)
+    return plano, _varreduras_sqlite(plano)
+
+
+def analisar_listagens():
+    """Lista de (nome, plano, varreduras completas) para cada consulta de listagem."""
+    resultados = []
+    for nome, queryset in consultas_das_listagens():
+        plano, varreduras = analisar(queryset)
+        resultados.append((nome, plano, varreduras))
+    return resultados
@@ -0,0 +1,111 @@
+"""
+Listas de referência usadas em selects (veículos ativos, rotas) servidas pelo
+cache do Django. As chaves carregam um número de versão por grupo; os signals
+de Veiculo e Rota incrementam a versão, o que torna as listas antigas
+inalcançáveis sem precisar apagá-las uma a uma.
+
+A versão nova só é vista por quem lê o mesmo cache: com o LocMemCache (um
+por processo) os outros workers ficam com a lista antiga até ela expirar,
+e o tempo de vida padrão é curto (ver REFERENCIAS_CACHE_TIMEOUT).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Rota, Veiculo
+
+# Alias em settings.CACHES e tempo de vida das listas (segundos)
+CACHE_ALIAS = getattr(settings, 'REFERENCIAS_CACHE_ALIAS', 'default')
+TIMEOUT = getattr(settings, 'REFERENCIAS_CACHE_TIMEOUT', 60 * 60)
+
+VEICULOS = 'veiculos'
+ROTAS = 'rotas'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _chave_versao(grupo):
+    return f'referencias:{grupo}:versao'
+
+
+def versao(grupo):
+    cache = _cache()
+    atual = cache.get(_chave_versao(grupo))
+    if atual is None:
+        # Se a versão foi descartada pelo cache, recomeça de um valor novo
+        # para não reaproveitar listas gravadas com a numeração anterior
+        cache.add(_chave_versao(grupo), time.time_ns(), None)
+        atual = cache.get(_chave_versao(grupo))
+    return atual
+
+
+def invalidar(*grupos):
+    cache = _cache()
+    for grupo in grupos:
+        try:
+            cache.incr(_chave_versao(grupo))
+        except ValueError:
+            cache.set(_chave_versao(grupo), time.time_ns(), None)
+
+
+def _obter(grupo, carregar):
+    cache = _cache()
+    chave = f'referencias:{grupo}:v{versao(grupo)}'
+    valor = cache.get(chave)
+    if valor is None:
+        valor = carregar()
+        cache.set(chave, valor, TIMEOUT)
+    return valor
+
+
+def _obter_varios(grupos, carregar):
+    """
+    Como _obter, para vários grupos: duas leituras do cache (versões e
+    valores) e uma chamada a `carregar(faltantes)`, que devolve
+    {grupo: valor}, apenas para os grupos ausentes.
+    """
+    cache = _cache()
+    versoes = cache.get_many([_chave_versao(grupo) for grupo in grupos])
+    chaves = {}
+    for grupo in grupos:
+        atual = versoes.get(_chave_versao(grupo))
+        chaves[grupo] = f'referencias:{grupo}:v{versao(grupo) if atual is None else atual}'
+    valores = cache.get_many(list(chaves.values()))
+    resultado = {grupo: valores[chaves[grupo]] for grupo in grupos if chaves[grupo] in valores}
+    faltantes = [grupo for grupo in grupos if grupo not in resultado]
+    if faltantes:
+        carregados = carregar(faltantes)
+        cache.set_many({chaves[grupo]: carregados[grupo] for grupo in faltantes}, TIMEOUT)
+        resultado.update(carregados)
+    return resultado
+
+
+def veiculos_ativos():
+    """Veículos ativos, na ordenação padrão do modelo (filtros das listagens)."""
+    return _obter(VEICULOS, lambda: list(Veiculo.objects.filter(ativo=True)))
+
+
+def escolhas_de_veiculos():
+    return [(veiculo.pk, str(veiculo)) for veiculo in veiculos_ativos()]
+
+
+def escolhas_de_rotas():
+    """(pk, rótulo) de todas as rotas, ordenadas pelo local."""
+    return _obter(ROTAS, lambda: [
+        (rota.pk, str(rota))
+        for rota in Rota.objects.select_related('veiculo').order_by('local')
+    ])
+
+
+def aplicar_escolhas(campo, escolhas):
+    """
+    Preenche um ModelChoiceField com escolhas já carregadas. O queryset do
+    campo continua sendo usado só para validar o valor enviado.
+    """
+    opcoes = list(escolhas)
+    if campo.empty_label is not None:
+        opcoes.insert(0, ('', campo.empty_label))
+    campo.choices = opcoes
@@ -0,0 +1,305 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import (
+    Avg, Count, DateTimeField, DurationField, ExpressionWrapper, F, FilteredRelation, IntegerField, Max, Min,
+    OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Veiculo, Rota, OcorrenciaRota, ProblemaColeta, TransicaoStatus, BacklogDiario
+from .status_problema import STATUS_PENDENTES
+
+
+def _contagem_por_veiculo(model, filtro=None):
+    """
+    Subquery correlacionada que conta as linhas de `model` ligadas ao
+    veículo da consulta externa, opcionalmente restritas por `filtro`.
+    """
+    queryset = model.objects.filter(veiculo=OuterRef('pk'))
+    if filtro is not None:
+        queryset = queryset.filter(filtro)
+
+    contagem = (
+        queryset.order_by()
+        .values('veiculo')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(contagem, output_field=IntegerField()), Value(0))
+
+
+def _situacao_do_dia(data=None):
+    """
+    Subqueries, por veículo, das coletas concluídas em `data` (padrão: hoje)
+    e das rotas que operam no dia e ainda estão sem conclusão, como no
+    filtro de rota_list.
+    """
+    data = data or timezone.localdate()
+    pendentes = Rota.objects.pendentes_em(data).values('pk')
+    return {
+        'rotas_concluidas': _contagem_por_veiculo(OcorrenciaRota, Q(data=data, concluida=True)),
+        'rotas_pendentes': _contagem_por_veiculo(Rota, Q(pk__in=pendentes)),
+    }
+
+
+def veiculos_com_estatisticas(veiculos=None):
+    """
+    Anota cada veículo com as estatísticas de rotas e problemas em uma
+    única consulta agrupada, sem consultas adicionais por veículo. As rotas
+    concluídas e pendentes são as do dia.
+    """
+    if veiculos is None:
+        veiculos = Veiculo.objects.all()
+
+    return veiculos.annotate(
+        total_rotas=_contagem_por_veiculo(Rota),
+        **_situacao_do_dia(),
+        total_problemas=_contagem_por_veiculo(ProblemaColeta),
+        problemas_abertos=_contagem_por_veiculo(
+            ProblemaColeta, Q(status__in=['aberto', 'em_andamento'])
+        ),
+    )
+
+
+def resumo_veiculos(veiculos):
+    """Totais do relatório de veículos calculados a partir da lista já anotada."""
+    resumo = {
+        'total': 0,
+        'ativos': 0,
+        'compactadores': 0,
+        'cacambas': 0,
+    }
+    for veiculo in veiculos:
+        resumo['total'] += 1
+        if veiculo.ativo:
+            resumo['ativos'] += 1
+        if veiculo.tipo == 'compactador':
+            resumo['compactadores'] += 1
+        elif veiculo.tipo == 'caçamba':
+            resumo['cacambas'] += 1
+    return resumo
+
+
+def veiculos_com_totais_diarios(veiculos=None, dias=None):
+    """
+    Anota cada veículo com o total de rotas somado a partir do snapshot de
+    EstatisticaDiaria, sem varrer a tabela de rotas, e com a situação do dia.
+    Com `dias` (início, fim), soma só as linhas do snapshot nesse intervalo.
+    """
+    if veiculos is None:
+        veiculos = Veiculo.objects.all()
+
+    if dias:
+        # O intervalo entra na condição do JOIN, não em um filtro sobre o histórico inteiro
+        veiculos = veiculos.annotate(
+            estatisticas_periodo=FilteredRelation('estatisticas', condition=Q(estatisticas__data__range=dias)),
+        )
+        total = Sum('estatisticas_periodo__rotas_cadastradas')
+    else:
+        total = Sum('estatisticas__rotas_cadastradas')
+    return veiculos.annotate(total_rotas=Coalesce(total, Value(0)), **_situacao_do_dia())
+
+
+def intervalo_de_datas(data_inicio, data_fim):
+    """
+    Converte as datas do filtro (AAAA-MM-DD) em um intervalo semiaberto
+    [início, fim) de datetimes, para que o filtro por data_cadastro use o
+    índice da coluna em vez de aplicar DATE() linha a linha.
+    """
+    def _parse(valor):
+        try:
+            return parse_date(valor) if valor else None
+        except ValueError:
+            return None
+
+    hoje = timezone.localdate()
+    inicio = _parse(data_inicio) or hoje - timedelta(days=30)
+    fim = _parse(data_fim) or hoje
+
+    return (
+        timezone.make_aware(datetime.combine(inicio, time.min)),
+        timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)),
+    )
+
+
+# Agrupamentos aceitos pelas métricas de resolução e de backlog
+AGRUPAMENTOS = {
+    'veiculo': 'veiculo__placa',
+    'tipo': 'tipo_problema',
+}
+
+
+def _horas(segundos):
+    return round(segundos / 3600, 1) if segundos is not None else None
+
+
+def _rotulo_do_grupo(agrupamento, valor):
+    if agrupamento == 'tipo':
+        return dict(ProblemaColeta.TIPO_PROBLEMA_CHOICES).get(valor, valor)
+    return valor
+
+
+def _por_agrupamento(linhas, acumular, concluir):
+    """
+    Junta as linhas de uma consulta agrupada por tipo e veículo nos dois
+    agrupamentos: {'tipo': [...], 'veiculo': [...]}, cada lista ordenada
+    pelo grupo. `acumular(total, linha)` soma a linha no total do grupo e
+    `concluir(grupo, total)` monta o resultado.
+    """
+    totais = {agrupamento: {} for agrupamento in AGRUPAMENTOS}
+    for linha in linhas:
+        for agrupamento, campo in AGRUPAMENTOS.items():
+            acumular(totais[agrupamento].setdefault(linha[campo], {}), linha)
+    return {
+        agrupamento: [
+            concluir(_rotulo_do_grupo(agrupamento, valor), total)
+            for valor, total in sorted(grupos.items(), key=lambda item: item[0])
+        ]
+        for agrupamento, grupos in totais.items()
+    }
+
+
+def _somar(total, **valores):
+    for chave, valor in valores.items():
+        if valor is not None:
+            total[chave] = total.get(chave, 0) + valor
+
+
+def _maior(total, chave, valor):
+    if valor is not None and (total.get(chave) is None or valor > total[chave]):
+        total[chave] = valor
+
+
+def tempo_de_resolucao(inicio, fim):
+    """
+    Resoluções registradas no histórico em [inicio, fim): quantidade e tempo
+    médio e máximo (em horas) desde a ocorrência, por tipo e por veículo
+    ({'tipo': [...], 'veiculo': [...]}), de uma consulta agrupada pelos dois.
+    Um problema reaberto e resolvido de novo conta nas duas resoluções.
+    """
+    linhas = (
+        TransicaoStatus.objects.filter(status_novo='resolvido', data__gte=inicio, data__lt=fim)
+        .values(*AGRUPAMENTOS.values())
+        .annotate(
+            resolvidos=Count('id'),
+            medidos=Count('segundos_desde_ocorrencia'),
+            segundos=Sum('segundos_desde_ocorrencia'),
+            maximo=Max('segundos_desde_ocorrencia'),
+        )
+        .order_by()
+    )
+
+    def acumular(total, linha):
+        _somar(total, resolvidos=linha['resolvidos'], medidos=linha['medidos'], segundos=linha['segundos'])
+        _maior(total, 'maximo', linha['maximo'])
+
+    def concluir(grupo, total):
+        return {
+            'grupo': grupo,
+            'resolvidos': total['resolvidos'],
+            'media_horas': _horas(total['segundos'] / total['medidos']) if total.get('medidos') else None,
+            'maximo_horas': _horas(total.get('maximo')),
+        }
+
+    return _por_agrupamento(linhas, acumular, concluir)
+
+
+def idade_do_backlog(agora=None):
+    """
+    Problemas ainda pendentes (aberto ou em andamento): quantidade e idade
+    média e máxima (em horas), por tipo e por veículo ({'tipo': [...],
+    'veiculo': [...]}). Uma consulta agrupada pelos dois sobre o índice
+    parcial de problemas pendentes; a idade máxima vem da ocorrência mais
+    antiga do grupo.
+    """
+    agora = agora or timezone.now()
+    idade = ExpressionWrapper(
+        Value(agora, output_field=DateTimeField()) - F('data_ocorrencia'),
+        output_field=DurationField(),
+    )
+    linhas = (
+        ProblemaColeta.objects.filter(status__in=STATUS_PENDENTES)
+        .values(*AGRUPAMENTOS.values())
+        .annotate(pendentes=Count('id'), mais_antiga=Min('data_ocorrencia'), idade_total=Sum(idade))
+        .order_by()
+    )
+
+    def acumular(total, linha):
+        _somar(total, pendentes=linha['pendentes'], segundos=linha['idade_total'].total_seconds())
+        _maior(total, 'idade_maxima', agora - linha['mais_antiga'])
+
+    def concluir(grupo, total):
+        return {
+            'grupo': grupo,
+            'pendentes': total['pendentes'],
+            'media_horas': _horas(max(total['segundos'] / total['pendentes'], 0)),
+            'maximo_horas': _horas(max(total['idade_maxima'].total_seconds(), 0)),
+        }
+
+    return _por_agrupamento(linhas, acumular, concluir)
+
+
+# Faixas de idade do painel de backlog: (a partir de N dias, rótulo)
+FAIXAS_DE_IDADE = [
+    (0, 'Hoje'),
+    (1, '1 a 2 dias'),
+    (3, '3 a 6 dias'),
+    (7, '7 a 29 dias'),
+    (30, '30 dias ou mais'),
+]
+
+# Prazo de atendimento, em dias desde a ocorrência
+SLA_PADRAO_DIAS = {'urgente': 1, 'alta': 3, 'media': 7, 'baixa': 30}
+
+
+def prazos_sla():
+    return {**SLA_PADRAO_DIAS, **getattr(settings, 'SLA_DIAS_POR_PRIORIDADE', {})}
+
+
+def _faixa(idade):
+    indice = 0
+    for posicao, (inicio, _) in enumerate(FAIXAS_DE_IDADE):
+        if idade >= inicio:
+            indice = posicao
+    return indice
+
+
+def painel_backlog(hoje=None):
+    """
+    Problemas pendentes por prioridade e faixa de idade, e quantos passaram
+    do prazo da prioridade. Lê só os contadores de BacklogDiario (uma linha
+    por prioridade e dia com pendências), qualquer que seja o histórico.
+    """
+    hoje = hoje or timezone.localdate()
+    prazos = prazos_sla()
+    linhas = {
+        prioridade: {
+            'prioridade': prioridade,
+            'rotulo': rotulo,
+            'prazo_dias': prazos.get(prioridade),
+            'faixas': [0] * len(FAIXAS_DE_IDADE),
+            'total': 0,
+            'fora_do_prazo': 0,
+        }
+        for prioridade, rotulo in reversed(ProblemaColeta.PRIORIDADE_CHOICES)
+    }
+    for prioridade, data, pendentes in BacklogDiario.objects.values_list('prioridade', 'data', 'pendentes'):
+        linha = linhas.get(prioridade)
+        if linha is None or pendentes <= 0:
+            continue
+        idade = max((hoje - data).days, 0)
+        linha['faixas'][_faixa(idade)] += pendentes
+        linha['total'] += pendentes
+        if linha['prazo_dias'] is not None and idade >= linha['prazo_dias']:
+            linha['fora_do_prazo'] += pendentes
+
+    linhas = list(linhas.values())
+    return {
+        'faixas': [rotulo for _, rotulo in FAIXAS_DE_IDADE],
+        'linhas': linhas,
+        'total': sum(linha['total'] for linha in linhas),
+        'fora_do_prazo': sum(linha['fora_do_prazo'] for linha in linhas),
+    }
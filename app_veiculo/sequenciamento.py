@@ -0,0 +1,169 @@
+"""
+Sequência sugerida de visita às rotas de um veículo em um dia da semana.
+
+Com as coordenadas das rotas, monta a matriz de distâncias (haversine) e
+aplica o vizinho mais próximo seguido de 2-opt, que desfaz cruzamentos
+enquanto houver melhora e tempo (TEMPO_LIMITE). O percurso é aberto:
+começa na primeira coleta do dia pelo horário atual e não volta ao ponto
+de partida. Rotas sem coordenadas ficam fora da sugestão.
+
+O cálculo usa só a biblioteca padrão; a frota inteira é otimizada
+dividindo os veículos entre processos, que recebem apenas as coordenadas.
+"""
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+import django
+from django.conf import settings
+
+from .localizacao import RAIO_TERRA_KM
+from .models import Rota
+
+# Tempo máximo do 2-opt por veículo (segundos)
+TEMPO_LIMITE = getattr(settings, 'SEQUENCIAMENTO_TEMPO_LIMITE', 0.5)
+
+
+def matriz_de_distancias(pontos):
+    """Distâncias em km entre todos os pares de (latitude, longitude)."""
+    radianos = [(math.radians(float(lat)), math.radians(float(lon))) for lat, lon in pontos]
+    cossenos = [math.cos(lat) for lat, _ in radianos]
+    n = len(radianos)
+    matriz = [[0.0] * n for _ in range(n)]
+    # Simétrica: cada par é calculado uma vez
+    for i, (lat_i, lon_i) in enumerate(radianos):
+        for j in range(i + 1, n):
+            lat_j, lon_j = radianos[j]
+            a = (
+                math.sin((lat_j - lat_i) / 2) ** 2
+                + cossenos[i] * cossenos[j] * math.sin((lon_j - lon_i) / 2) ** 2
+            )
+            matriz[i][j] = matriz[j][i] = 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+    return matriz
+
+
+def comprimento(ordem, matriz):
+    """Distância percorrida visitando os pontos em `ordem`."""
+    return sum(matriz[a][b] for a, b in zip(ordem, ordem[1:]))
+
+
+def vizinho_mais_proximo(matriz, inicio=0):
+    """Percurso que sempre segue para o ponto ainda não visitado mais perto."""
+    restantes = set(range(len(matriz))) - {inicio}
+    ordem = [inicio]
+    while restantes:
+        distancias = matriz[ordem[-1]]
+        proximo = min(restantes, key=lambda j: (distancias[j], j))
+        restantes.remove(proximo)
+        ordem.append(proximo)
+    return ordem
+
+
+def dois_opt(ordem, matriz, prazo):
+    """
+    Inverte trechos do percurso enquanto isso o encurtar, até não haver
+    melhora ou até `prazo` (em time.perf_counter()). O primeiro ponto fica fixo.
+    """
+    ordem = list(ordem)
+    n = len(ordem)
+    melhorou = True
+    while melhorou and time.perf_counter() < prazo:
+        melhorou = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b, c = ordem[i - 1], ordem[i], ordem[j]
+                delta = matriz[a][c] - matriz[a][b]
+                # O último ponto não tem aresta de saída
+                if j + 1 < n:
+                    d = ordem[j + 1]
+                    delta += matriz[b][d] - matriz[c][d]
+                if delta < -1e-9:
+                    ordem[i:j + 1] = ordem[i:j + 1][::-1]
+                    melhorou = True
+            if time.perf_counter() >= prazo:
+                break
+    return ordem
+
+
+def otimizar_sequencia(pontos, tempo_limite=TEMPO_LIMITE):
+    """
+    (ordem sugerida, distância pela ordem atual, distância sugerida) para
+    `pontos` na ordem atual; a ordem é uma lista de índices de `pontos`.
+    """
+    prazo = time.perf_counter() + tempo_limite
+    matriz = matriz_de_distancias(pontos)
+    atual = list(range(len(pontos)))
+    ordem = dois_opt(vizinho_mais_proximo(matriz), matriz, prazo) if pontos else []
+    # Nunca sugere um percurso mais longo que o atual
+    if comprimento(ordem, matriz) >= comprimento(atual, matriz):
+        ordem = atual
+    return ordem, comprimento(atual, matriz), comprimento(ordem, matriz)
+
+
+def _otimizar(tarefa):
+    # Executada nos processos da frota: recebe e devolve só tipos simples
+    veiculo_id, rota_ids, pontos, tempo_limite = tarefa
+    ordem, atual, sugerida = otimizar_sequencia(pontos, tempo_limite)
+    return {
+        'veiculo_id': veiculo_id,
+        'rota_ids': [rota_ids[indice] for indice in ordem],
+        'distancia_atual': atual,
+        'distancia_sugerida': sugerida,
+    }
+
+
+def _localizada(rota):
+    return rota.latitude is not None and rota.longitude is not None
+
+
+def sugerir_sequencia(veiculo, dia, tempo_limite=TEMPO_LIMITE):
+    """
+    Rotas de `veiculo` que operam em `dia`, na ordem sugerida, com as
+    distâncias (km) pelo horário atual e pela sugestão. As rotas sem
+    coordenadas vêm à parte, em `sem_coordenadas`.
+    """
+    rotas = list(veiculo.rotas.operando_em(dia).order_by('horario', 'id'))
+    localizadas = [rota for rota in rotas if _localizada(rota)]
+    ordem, atual, sugerida = otimizar_sequencia(
+        [(rota.latitude, rota.longitude) for rota in localizadas], tempo_limite
+    )
+    return {
+        'rotas': [localizadas[indice] for indice in ordem],
+        'sem_coordenadas': [rota for rota in rotas if not _localizada(rota)],
+        'distancia_atual': atual,
+        'distancia_sugerida': sugerida,
+        'economia': atual - sugerida,
+    }
+
+
+def otimizar_frota(dia, processos=None, tempo_limite=TEMPO_LIMITE):
+    """
+    Sugestão para cada veículo ativo com rotas localizadas em `dia`:
+    [{'veiculo_id', 'rota_ids' (na ordem sugerida), 'distancia_atual',
+    'distancia_sugerida'}]. As rotas vêm em uma consulta e os veículos são
+    divididos entre `processos` processos (padrão: um por CPU; 1 calcula
+    no próprio processo).
+    """
+    linhas = (
+        Rota.objects.operando_em(dia)
+        .filter(veiculo__ativo=True, latitude__isnull=False, longitude__isnull=False)
+        .order_by('veiculo_id', 'horario', 'id')
+        .values_list('veiculo_id', 'id', 'latitude', 'longitude')
+    )
+    tarefas = []
+    for veiculo_id, grupo in groupby(linhas, key=itemgetter(0)):
+        grupo = list(grupo)
+        tarefas.append((
+            veiculo_id,
+            [rota_id for _, rota_id, _, _ in grupo],
+            [(float(latitude), float(longitude)) for _, _, latitude, longitude in grupo],
+            tempo_limite,
+        ))
+
+    if processos == 1 or len(tarefas) < 2:
+        return [_otimizar(tarefa) for tarefa in tarefas]
+    # django.setup() prepara os processos também quando são iniciados do zero (spawn)
+    with ProcessPoolExecutor(max_workers=processos, initializer=django.setup) as executor:
+        return list(executor.map(_otimizar, tarefas, chunksize=max(1, len(tarefas) // 64)))
@@ -0,0 +1,139 @@
+"""
+Máquina de estados do status dos problemas de coleta.
+
+TRANSICOES lista, para cada status, os status que ele pode assumir; o botão
+da listagem segue o ciclo PROXIMO_STATUS (aberto -> em andamento ->
+resolvido -> aberto), que é um caminho dentro dessas transições. Toda
+mudança fica registrada em TransicaoStatus: `aplicar` marca o usuário e o
+signal de ProblemaColeta grava a linha; `transicionar_em_lote` grava as
+linhas do lote com um único bulk_create.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    BacklogDiario, EstatisticaDiaria, ProblemaColeta, TransicaoStatus, _chave_backlog, variacoes_do_backlog,
+)
+
+TRANSICOES = {
+    'aberto': {'em_andamento', 'resolvido', 'cancelado'},
+    'em_andamento': {'aberto', 'resolvido', 'cancelado'},
+    'resolvido': {'aberto'},
+    'cancelado': {'aberto'},
+}
+
+PROXIMO_STATUS = {
+    'aberto': 'em_andamento',
+    'em_andamento': 'resolvido',
+    'resolvido': 'aberto',
+}
+
+STATUS_PENDENTES = ProblemaColeta.STATUS_PENDENTES
+
+# Problemas alterados por requisição (seleção ou filtro da listagem)
+LIMITE_LOTE = 1000
+
+# Aberto e em andamento contam juntos no snapshot de EstatisticaDiaria
+_ALTERAM_ESTATISTICA = {'resolvido', 'aberto', 'cancelado'}
+
+
+class TransicaoInvalida(ValueError):
+    pass
+
+
+def rotulo(status):
+    return dict(ProblemaColeta.STATUS_CHOICES).get(status, status)
+
+
+def transicao_permitida(origem, destino):
+    return destino in TRANSICOES.get(origem, ())
+
+
+def mensagem_de_recusa(origem, destino):
+    return f'Transição de {rotulo(origem)} para {rotulo(destino)} não permitida.'
+
+
+def campos_da_transicao(destino, agora):
+    """Campos gravados junto com o novo status."""
+    if destino == 'resolvido':
+        return {'data_resolucao': agora}
+    if destino in STATUS_PENDENTES:
+        return {'data_resolucao': None}
+    return {}
+
+
+def aplicar(problema, destino, usuario=None, agora=None):
+    """
+    Leva o problema (em memória) a `destino` a partir do status gravado,
+    com os campos que acompanham a transição. Cabe a quem chama o save(),
+    que registra a transição. Sem mudança de status, não faz nada.
+    """
+    origem = getattr(problema, '_status_anterior', None) or problema.status
+    if origem == destino:
+        problema.status = destino
+        return
+    if not transicao_permitida(origem, destino):
+        raise TransicaoInvalida(mensagem_de_recusa(origem, destino))
+    problema.status = destino
+    for campo, valor in campos_da_transicao(destino, agora or timezone.now()).items():
+        setattr(problema, campo, valor)
+    problema._usuario_transicao = usuario
+
+
+def transicionar_em_lote(ids, destino=None, usuario=None):
+    """
+    Sem `destino`, avança cada problema um passo no ciclo; com `destino`,
+    leva a ele os problemas que têm essa transição e recusa os demais. As
+    linhas ficam travadas durante a operação, cada status de destino é
+    gravado em um único UPDATE e o histórico em um único bulk_create.
+
+    Retorna {id: resultado}, na ordem de `ids`.
+    """
+    ids = list(dict.fromkeys(ids))
+    agora = timezone.now()
+    resultados = {}
+    grupos = defaultdict(list)
+
+    with transaction.atomic():
+        encontrados = ProblemaColeta.objects.select_for_update().only(
+            'id', 'status', 'prioridade', 'veiculo_id', 'tipo_problema', 'data_ocorrencia', 'solucao'
+        ).in_bulk(ids)
+
+        transicoes, chaves_backlog = [], []
+        for pk in ids:
+            problema = encontrados.get(pk)
+            if problema is None:
+                resultados[pk] = {'success': False, 'error': 'Problema não encontrado.'}
+                continue
+            novo_status = destino or PROXIMO_STATUS.get(problema.status)
+            if not transicao_permitida(problema.status, novo_status):
+                resultados[pk] = {
+                    'success': False,
+                    'status': problema.status,
+                    'error': mensagem_de_recusa(problema.status, novo_status or problema.status),
+                }
+                continue
+            anterior, problema.status = problema.status, novo_status
+            chaves_backlog.append((problema._chave_backlog, _chave_backlog(problema)))
+            grupos[novo_status].append(problema)
+            transicoes.append(TransicaoStatus.de(problema, anterior, usuario=usuario, data=agora))
+            resultados[pk] = {'success': True, 'status': novo_status, 'status_display': rotulo(novo_status)}
+
+        for novo_status, problemas in grupos.items():
+            # update() não aplica auto_now; a data de atualização vai junto
+            ProblemaColeta.objects.filter(pk__in=[problema.pk for problema in problemas]).update(
+                status=novo_status, data_atualizacao=agora, **campos_da_transicao(novo_status, agora)
+            )
+        TransicaoStatus.objects.bulk_create(transicoes)
+        BacklogDiario.aplicar_variacoes(variacoes_do_backlog(chaves_backlog))
+
+        # update() não dispara os signals do histórico, do backlog e do snapshot
+        EstatisticaDiaria.recalcular_registros([
+            problema
+            for novo_status, problemas in grupos.items() if novo_status in _ALTERAM_ESTATISTICA
+            for problema in problemas
+        ])
+
+    return resultados
@@ -1,3 +1,1635 @@
-from django.test import TestCase
+import importlib.util
+import io
+import json
+import random
+import tempfile
+import zipfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from xml.etree import ElementTree
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Projeto_Residuo.bancos import bancos
+
+from .models import (
+    Veiculo, Rota, OcorrenciaRota, ProblemaColeta, EstatisticaDiaria, BacklogDiario, RegistroExclusao,
+)
+from .agenda import agenda_por_veiculo, coletas_do_dia
+from .agrupamento import chave_agrupamento, normalizar_local
+from .conflitos import IndiceDeHorarios, intervalos
+from .balanceamento import aplicar_propostas, cargas, propor_redistribuicao, situacao_da_frota
+from .benchmark import comparar, medir, medir_conexoes, popular_banco, urls_medidas, usuario_benchmark
+from .busca import _busca_mysql, buscar_problemas
+from .importacao import importar_rotas, importar_veiculos
+from .localizacao import GradeDeRotas, problemas_perto_da_rota, rota_mais_proxima
+from . import diagnostico, fila_denuncias
+from .dias_semana import ROTULOS, bit_do_dia, interpretar, texto_da_mascara
+from .filtros import filtrar_problemas
+from .forms import RotaForm
+from .paginacao import CursorPaginator
+from .planos import analisar_listagens
+from .referencias import escolhas_de_rotas, veiculos_ativos
+from .sequenciamento import otimizar_frota, otimizar_sequencia, sugerir_sequencia
+from .relatorios import idade_do_backlog, painel_backlog, tempo_de_resolucao, veiculos_com_estatisticas
+from .status_problema import TransicaoInvalida, aplicar, transicionar_em_lote
+
+
+def criar_usuario(username, status):
+    user = User.objects.create_user(username=username, password='senha-teste-123', email=f'{username}@teste.com')
+    user.perfil.status = status
+    user.perfil.save()
+    return user
+
+
+def criar_veiculo(indice, tipo='compactador', ativo=True):
+    return Veiculo.objects.create(
+        placa=f'ABC{indice:04d}',
+        tipo=tipo,
+        numero_caminhao=f'CAM-{indice}',
+        ativo=ativo,
+    )
+
+
+def criar_rota(veiculo, hora, concluida=False, **kwargs):
+    rota = Rota.objects.create(
+        veiculo=veiculo,
+        local=kwargs.pop('local', f'Rua {hora}'),
+        horario=time(hora),
+        **kwargs
+    )
+    if concluida:
+        # Coleta concluída hoje
+        OcorrenciaRota.alternar(rota)
+    return rota
+
+
+def criar_problema(veiculo, rota=None, **kwargs):
+    dados = {
+        'tipo_problema': 'coleta_nao_feita',
+        'descricao': 'Coleta não realizada',
+        'local_problema': 'Rua Principal, 123',
+        'data_ocorrencia': timezone.now(),
+        'responsavel_relato': 'Fulano',
+    }
+    dados.update(kwargs)
+    return ProblemaColeta.objects.create(veiculo=veiculo, rota=rota, **dados)
+
+
+class RelatorioVeiculosTests(TestCase):
+    def setUp(self):
+        self.gestor = criar_usuario('gestor', 'gestor_rotas')
+        self.client.force_login(self.gestor)
+
+    def popular_frota(self, quantidade):
+        for indice in range(Veiculo.objects.count(), Veiculo.objects.count() + quantidade):
+            veiculo = criar_veiculo(indice)
+            criar_rota(veiculo, 6, concluida=True)
+            criar_rota(veiculo, 8)
+            criar_problema(veiculo, status='resolvido')
+
+    def contar_consultas(self):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('veiculo:relatorio_veiculos'))
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def test_estatisticas_por_veiculo(self):
+        veiculo = criar_veiculo(1)
+        outro = criar_veiculo(2, tipo='caçamba')
+        rota = criar_rota(veiculo, 6, concluida=True, dias_semana='Diariamente')
+        criar_rota(veiculo, 7, dias_semana='Diariamente')
+        criar_rota(veiculo, 8, dias_semana='Diariamente')
+        criar_problema(veiculo, rota=rota)
+        criar_problema(veiculo, status='resolvido')
+
+        stats = {v.pk: v for v in veiculos_com_estatisticas()}
+
+        self.assertEqual(stats[veiculo.pk].total_rotas, 3)
+        self.assertEqual(stats[veiculo.pk].rotas_concluidas, 1)
+        self.assertEqual(stats[veiculo.pk].rotas_pendentes, 2)
+        self.assertEqual(stats[veiculo.pk].total_problemas, 2)
+        self.assertEqual(stats[veiculo.pk].problemas_abertos, 1)
+        self.assertEqual(stats[outro.pk].total_rotas, 0)
+        self.assertEqual(stats[outro.pk].total_problemas, 0)
+
+    def test_relatorio_veiculos_numero_constante_de_consultas(self):
+        self.popular_frota(2)
+        consultas_frota_pequena = self.contar_consultas()
+
+        self.popular_frota(20)
+        consultas_frota_grande = self.contar_consultas()
+
+        self.assertEqual(consultas_frota_pequena, consultas_frota_grande)
+
+    def test_relatorio_servico_le_snapshot(self):
+        self.popular_frota(3)
+
+        response = self.client.get(reverse('veiculo:relatorio_servico'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_veiculos'], 3)
+        self.assertEqual(response.context['total_rotas'], 6)
+        self.assertEqual(response.context['rotas_concluidas'], 3)
+        self.assertEqual(response.context['totais_periodo']['problemas_registrados'], 3)
+
+    def test_relatorio_servico_soma_so_o_periodo(self):
+        self.popular_frota(1)
+        veiculo = Veiculo.objects.get()
+        EstatisticaDiaria.objects.create(
+            veiculo=veiculo, tipo_veiculo=veiculo.tipo, rotas_cadastradas=40,
+            data=timezone.localdate() - timedelta(days=400),
+        )
+        for hora in range(9, 24):
+            for minuto in range(0, 60, 15):
+                Rota.objects.create(veiculo=veiculo, local=f'Rua {hora}:{minuto}', horario=time(hora, minuto))
+
+        response = self.client.get(reverse('veiculo:relatorio_servico'))
+        self.assertEqual(response.context['total_rotas'], 62)
+        self.assertEqual(response.context['rotas_por_veiculo'][0].total_rotas, 62)
+        self.assertEqual(len(response.context['rotas_periodo']), 50)
+        self.assertTrue(response.context['rotas_periodo'].has_next())
+
+        inicio = (timezone.localdate() - timedelta(days=401)).isoformat()
+        response = self.client.get(reverse('veiculo:relatorio_servico'), {'data_inicio': inicio})
+        self.assertEqual(response.context['total_rotas'], 102)
+
+
+class EstatisticaDiariaTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        self.hoje = timezone.localdate()
+
+    def estatistica(self, veiculo=None):
+        return EstatisticaDiaria.objects.get(veiculo=veiculo or self.veiculo, data=self.hoje)
+
+    def test_signals_mantem_snapshot_atualizado(self):
+        rota = criar_rota(self.veiculo, 6)
+        criar_rota(self.veiculo, 7, concluida=True)
+        problema = criar_problema(self.veiculo, rota=rota)
+
+        estatistica = self.estatistica()
+        self.assertEqual(estatistica.tipo_veiculo, 'compactador')
+        self.assertEqual(estatistica.rotas_cadastradas, 2)
+        self.assertEqual(estatistica.rotas_concluidas, 1)
+        self.assertEqual(estatistica.problemas_abertos, 1)
+
+        OcorrenciaRota.alternar(rota)
+        problema.status = 'resolvido'
+        problema.save()
+
+        estatistica = self.estatistica()
+        self.assertEqual(estatistica.rotas_concluidas, 2)
+        self.assertEqual(estatistica.problemas_abertos, 0)
+        self.assertEqual(estatistica.problemas_resolvidos, 1)
+
+        rota.delete()
+        estatistica = self.estatistica()
+        self.assertEqual(estatistica.rotas_cadastradas, 1)
+        self.assertEqual(estatistica.problemas_registrados, 0)
+
+    def test_troca_de_veiculo_atualiza_os_dois_lados(self):
+        outro = criar_veiculo(2, tipo='caçamba')
+        rota = criar_rota(self.veiculo, 6)
+
+        rota = Rota.objects.get(pk=rota.pk)
+        rota.veiculo = outro
+        rota.save()
+
+        self.assertFalse(EstatisticaDiaria.objects.filter(veiculo=self.veiculo).exists())
+        self.assertEqual(self.estatistica(outro).rotas_cadastradas, 1)
+        self.assertEqual(self.estatistica(outro).tipo_veiculo, 'caçamba')
+
+        outro.tipo = 'compactador'
+        outro.save()
+        self.assertEqual(self.estatistica(outro).tipo_veiculo, 'compactador')
+
+    def test_exclusao_do_veiculo_remove_estatisticas(self):
+        criar_problema(self.veiculo, rota=criar_rota(self.veiculo, 6))
+        self.veiculo.delete()
+        self.assertFalse(EstatisticaDiaria.objects.exists())
+
+    def test_comando_reconstroi_snapshot(self):
+        criar_rota(self.veiculo, 6, concluida=True)
+        criar_problema(self.veiculo)
+        esperado = EstatisticaDiaria.objects.values().get()
+        EstatisticaDiaria.objects.all().delete()
+
+        call_command('recalcular_estatisticas', stdout=StringIO())
+
+        reconstruida = EstatisticaDiaria.objects.values().get()
+        for campo in ['data', 'veiculo_id', 'tipo_veiculo', 'rotas_cadastradas', 'rotas_concluidas',
+                      'problemas_registrados', 'problemas_abertos', 'problemas_resolvidos']:
+            self.assertEqual(reconstruida[campo], esperado[campo])
+
+
+class CursorPaginatorTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        agora = timezone.now()
+        # Datas repetidas para exercitar o desempate pelo id
+        self.problemas = [
+            criar_problema(self.veiculo, data_ocorrencia=agora - timezone.timedelta(hours=indice // 2))
+            for indice in range(7)
+        ]
+
+    def percorrer(self, paginator):
+        vistos = []
+        page = paginator.get_page()
+        vistos.extend(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            vistos.extend(page)
+        return vistos
+
+    def test_percorre_todas_as_paginas_na_ordem(self):
+        queryset = ProblemaColeta.objects.all()
+        paginator = CursorPaginator(queryset, 3, ordering=('-data_ocorrencia', '-id'))
+
+        vistos = self.percorrer(paginator)
+
+        esperado = list(queryset.order_by('-data_ocorrencia', '-id'))
+        self.assertEqual(vistos, esperado)
+
+    def test_pagina_anterior_e_ultima(self):
+        paginator = CursorPaginator(ProblemaColeta.objects.all(), 3, ordering=('-data_ocorrencia', '-id'))
+        primeira = paginator.get_page()
+        segunda = paginator.get_page(primeira.next_cursor)
+
+        self.assertFalse(primeira.has_previous())
+        self.assertEqual(list(paginator.get_page(segunda.previous_cursor)), list(primeira))
+
+        ultima = paginator.get_page(primeira.last_cursor)
+        self.assertEqual(len(ultima), 3)
+        self.assertFalse(ultima.has_next())
+        self.assertTrue(ultima.has_previous())
+        self.assertEqual(list(ultima), self.percorrer(paginator)[-3:])
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        paginator = CursorPaginator(ProblemaColeta.objects.all(), 3, ordering=('-data_ocorrencia', '-id'))
+        self.assertEqual(list(paginator.get_page('n.lixo')), list(paginator.get_page()))
+
+    def test_contagem_aproximada_opcional(self):
+        queryset = ProblemaColeta.objects.all()
+        self.assertIsNone(CursorPaginator(queryset, 3, ordering=('id',)).count)
+
+        paginator = CursorPaginator(queryset, 3, ordering=('id',), contagem_aproximada=True, limite_contagem=5)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.contagem_exata)
+
+        paginator = CursorPaginator(queryset, 3, ordering=('id',), contagem_aproximada=True)
+        self.assertEqual(paginator.count, 7)
+        self.assertTrue(paginator.contagem_exata)
+
+    def test_listas_usam_cursor(self):
+        self.client.force_login(criar_usuario('gestor', 'gestor_rotas'))
+        for indice in range(2, 14):
+            criar_rota(criar_veiculo(indice), 6)
+
+        for nome in ['veiculo_list', 'rota_list', 'problema_list', 'relatorio_rotas']:
+            response = self.client.get(reverse(f'veiculo:{nome}'))
+            self.assertEqual(response.status_code, 200)
+            page_obj = response.context['page_obj']
+            if page_obj.has_next():
+                response = self.client.get(reverse(f'veiculo:{nome}'), {'cursor': page_obj.next_cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['page_obj'].has_previous())
+
+
+class IndicesListagensTests(TestCase):
+    def test_listagens_nao_fazem_varredura_completa(self):
+        for nome, plano, varreduras in analisar_listagens():
+            with self.subTest(consulta=nome):
+                self.assertEqual(varreduras, [], plano)
+
+    def test_comando_explicar_consultas(self):
+        saida = StringIO()
+        call_command('explicar_consultas', stdout=saida)
+        self.assertIn('problema_list?status: usa índice', saida.getvalue())
+
+
+class BuscaProblemasTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        self.joao = criar_problema(self.veiculo, local_problema='Rua São João, 10', descricao='Lixo acumulado')
+        self.flores = criar_problema(self.veiculo, local_problema='Rua das Flores', descricao='Coleta não passou na rua')
+
+    def buscar(self, texto):
+        return list(buscar_problemas(ProblemaColeta.objects.all(), texto).order_by('relevancia'))
+
+    def test_busca_ignora_acentos_e_aceita_prefixo(self):
+        self.assertEqual(self.buscar('sao joa'), [self.joao])
+        self.assertEqual(self.buscar('COLETA nao'), [self.flores])
+
+    def test_resultados_ordenados_por_relevancia(self):
+        criar_problema(self.veiculo, local_problema='Avenida Central', descricao='Sem relação')
+        citado = criar_problema(
+            self.veiculo,
+            local_problema='Praça Central',
+            descricao='Morador informou que o caminhão passou direto pela esquina com a João Pessoa '
+                      'e não recolheu os sacos deixados na calçada durante toda a semana',
+        )
+        self.assertEqual(self.buscar('joao'), [self.joao, citado])
+
+    def test_indice_acompanha_alteracoes(self):
+        self.joao.local_problema = 'Travessa Nova'
+        self.joao.save()
+        self.assertEqual(self.buscar('joao'), [])
+        self.assertEqual(self.buscar('travessa'), [self.joao])
+
+        self.veiculo.placa = 'XYZ9876'
+        self.veiculo.save()
+        self.assertEqual(set(self.buscar('xyz9876')), {self.joao, self.flores})
+
+        self.flores.delete()
+        self.assertEqual(self.buscar('flores'), [])
+
+    def test_busca_nao_limita_resultados_antes_dos_filtros(self):
+        ProblemaColeta.objects.bulk_create([
+            ProblemaColeta(
+                veiculo=self.veiculo, tipo_problema='coleta_nao_feita', descricao='Entulho na calçada',
+                local_problema=f'Rua Entulho {indice}', data_ocorrencia=timezone.now(), responsavel_relato='Fulano',
+            )
+            for indice in range(320)
+        ])
+        # Menos relevante que os demais e o único resolvido
+        resolvido = criar_problema(
+            self.veiculo, status='resolvido', local_problema='Praça Central',
+            descricao='Morador relatou entulho deixado durante a obra da esquina há várias semanas',
+        )
+
+        self.assertEqual(len(self.buscar('entulho')), 321)
+        filtrados = filtrar_problemas(ProblemaColeta.objects.all(), search='entulho', status='resolvido')
+        self.assertEqual(list(filtrados), [resolvido])
+
+        # O cursor da página seguinte usa a relevância calculada no banco
+        self.client.force_login(criar_usuario('gestor', 'gestor_rotas'))
+        primeira = self.client.get(reverse('veiculo:problema_list'), {'search': 'entulho'}).context['page_obj']
+        segunda = self.client.get(
+            reverse('veiculo:problema_list'), {'search': 'entulho', 'cursor': primeira.next_cursor}
+        ).context['page_obj']
+        self.assertTrue(segunda)
+        self.assertFalse({p.pk for p in primeira} & {p.pk for p in segunda})
+
+    def test_busca_mysql_deixa_o_match_sozinho_no_where(self):
+        problemas = ProblemaColeta.objects.filter(status='aberto')
+        where = str(_busca_mysql(problemas, ['coleta'], 'coleta').query).split(' WHERE ', 1)[1]
+        self.assertIn('MATCH(', where)
+        self.assertNotIn(' OR ', where)
+
+        # Placa em outra tabela: busca separada, unida pela UNION, sem OR
+        where = str(_busca_mysql(problemas, ['abc'], self.veiculo.placa).query).split(' WHERE ', 1)[1]
+        self.assertIn(' UNION ', where)
+        self.assertNotIn(' OR ', where)
+
+    def test_problema_list_pagina_resultados_da_busca(self):
+        self.client.force_login(criar_usuario('gestor', 'gestor_rotas'))
+        response = self.client.get(reverse('veiculo:problema_list'), {'search': 'sao joao'})
+        self.assertEqual(list(response.context['page_obj']), [self.joao])
+
+
+class DiasSemanaTests(TestCase):
+    def test_interpreta_formatos_livres(self):
+        casos = {
+            'Seg, Ter, Qua': 'Seg, Ter, Qua',
+            'Segunda, Terça': 'Seg, Ter',
+            'Segunda-feira a Sexta-feira': 'Seg, Ter, Qua, Qui, Sex',
+            'Segunda-feira, Quarta-feira': 'Seg, Qua',
+            'sex-seg': 'Seg, Sex, Sáb, Dom',
+            'Diariamente': 'Seg, Ter, Qua, Qui, Sex, Sáb, Dom',
+            'Fins de semana': 'Sáb, Dom',
+            'Aos sábados e domingos': 'Sáb, Dom',
+            '': '',
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(texto_da_mascara(interpretar(texto)), esperado)
+
+    def test_palavras_comuns_nao_viram_dias(self):
+        casos = {
+            'Terminal rodoviário': '',
+            'Quadra 5, Setor Sul': '',
+            'Domicílios da quinta quadra': 'Qui',
+            'Seg (exceto sextas de feriado)': 'Seg, Sex',
+            'Sequencial, quinzenal': '',
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(texto_da_mascara(interpretar(texto)), esperado)
+        self.assertEqual(bit_do_dia('Quarta-feira'), bit_do_dia('qua'))
+        with self.assertRaises(ValueError):
+            bit_do_dia('quadra')
+
+    def test_operando_em_usa_mascara(self):
+        veiculo = criar_veiculo(1)
+        seg_qua = criar_rota(veiculo, 6, dias_semana='Segunda, Quarta')
+        fim_de_semana = criar_rota(veiculo, 7, dias_semana='Sáb e Dom')
+        criar_rota(veiculo, 8)
+
+        self.assertEqual(list(Rota.objects.operando_em('qua')), [seg_qua])
+        self.assertEqual(list(Rota.objects.operando_em('Domingo')), [fim_de_semana])
+        self.assertEqual(list(Rota.objects.operando_em('seg', 'sab')), [seg_qua, fim_de_semana])
+
+        plano = Rota.objects.operando_em('qua').explain()
+        self.assertIn('rota_dias_horario_idx', plano)
+
+    def test_rota_form_grava_mascara_e_texto(self):
+        veiculo = criar_veiculo(1)
+        form = RotaForm(data={
+            'veiculo': veiculo.pk,
+            'local': 'Rua A',
+            'horario': '06:00',
+            'dias_semana': ['sex', 'seg'],
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        rota = form.save()
+
+        self.assertEqual(rota.dias_semana, 'Seg, Sex')
+        self.assertEqual(rota.dias, ['seg', 'sex'])
+        self.assertEqual(RotaForm(instance=rota).initial['dias_semana'], ['seg', 'sex'])
+
+
+class ReferenciasCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veiculo = criar_veiculo(1)
+        criar_veiculo(2, ativo=False)
+
+    def test_formulario_nao_consulta_veiculos_com_cache_quente(self):
+        str(RotaForm()['veiculo'])
+        with CaptureQueriesContext(connection) as consultas:
+            html = str(RotaForm()['veiculo'])
+        self.assertEqual(len(consultas), 0)
+        self.assertIn('ABC0001', html)
+        self.assertNotIn('ABC0002', html)
+
+    def test_signals_invalidam_listas(self):
+        self.assertEqual([v.pk for v in veiculos_ativos()], [self.veiculo.pk])
+
+        novo = criar_veiculo(3)
+        self.assertEqual([v.pk for v in veiculos_ativos()], [self.veiculo.pk, novo.pk])
+
+        rota = criar_rota(novo, 6, local='Rua Nova')
+        self.assertIn((rota.pk, str(rota)), escolhas_de_rotas())
+
+        novo.placa = 'XYZ9999'
+        novo.save()
+        rota.refresh_from_db()
+        self.assertIn((rota.pk, str(rota)), escolhas_de_rotas())
+
+        rota.delete()
+        self.assertEqual(escolhas_de_rotas(), [])
+
+    def test_formulario_valida_contra_o_banco(self):
+        inativo = Veiculo.objects.get(placa='ABC0002')
+        form = RotaForm(data={'veiculo': inativo.pk, 'local': 'Rua A', 'horario': '06:00'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('veiculo', form.errors)
+
+
+class BenchmarkTests(TestCase):
+    def test_popula_e_mede_todas_as_urls(self):
+        popular_banco(veiculos=3, rotas=6, problemas=20, lote=7)
+        self.assertEqual(Rota.objects.filter(dias_mask=0).count(), 0)
+        self.assertEqual(EstatisticaDiaria.totais()['problemas_registrados'], 20)
+
+        urls = urls_medidas()
+        nomes = [nome for nome, _ in urls]
+        self.assertIn('veiculo:veiculo_detail', nomes)
+        self.assertNotIn('logout', nomes)
+        self.assertNotIn('veiculo:problema_status_lote', nomes)
+
+        cliente = Client()
+        cliente.force_login(usuario_benchmark())
+        resultados = medir(urls, repeticoes=2, cliente=cliente)
+        self.assertEqual(resultados['veiculo:problema_list']['status'], 200)
+        self.assertEqual(resultados['gerenciar_usuarios']['status'], 200)
+        self.assertGreater(resultados['veiculo:rota_list']['consultas'], 0)
+        # Nenhuma view medida recusa GET
+        self.assertNotIn(405, {medida['status'] for medida in resultados.values()})
+
+        pior = {'resultados': {nome: dict(m, p95_ms=m['p95_ms'] * 2 + 1) for nome, m in resultados.items()}}
+        self.assertEqual(comparar({'resultados': resultados}, {'resultados': resultados}), [])
+        self.assertEqual(len(comparar({'resultados': resultados}, pior)), len(resultados))
+
+    def test_conexao_persistente_e_reaproveitada(self):
+        sem_persistencia = medir_conexoes(requisicoes=50, conn_max_age=0, latencia_conexao=0)
+        persistente = medir_conexoes(requisicoes=50, conn_max_age=60, latencia_conexao=0)
+
+        # Sem CONN_MAX_AGE cada requisição abre a sua conexão
+        self.assertEqual(sem_persistencia['conexoes'], 50)
+        self.assertEqual(persistente['conexoes'], 1)
+        self.assertGreater(persistente['rps'], 0)
+
+
+class BancosTests(TestCase):
+    base_dir = Path('/projeto')
+
+    def test_perfil_dev_usa_sqlite(self):
+        banco = bancos(self.base_dir, {'PERFIL_BANCO': 'dev'})['default']
+        self.assertEqual(banco['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(banco['NAME'], str(self.base_dir / 'db.sqlite3'))
+
+    def test_perfil_prod_mantem_conexoes_com_health_check(self):
+        banco = bancos(self.base_dir, {'DB_HOST': 'db.interno', 'DB_CONN_MAX_AGE': '300'})['default']
+        self.assertEqual(banco['ENGINE'], 'django.db.backends.mysql')
+        self.assertEqual(banco['HOST'], 'db.interno')
+        self.assertEqual(banco['CONN_MAX_AGE'], 300)
+        self.assertTrue(banco['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('POOL_OPTIONS', banco)
+
+    def test_perfil_invalido_ou_pool_sem_pacote(self):
+        with self.assertRaises(ImproperlyConfigured):
+            bancos(self.base_dir, {'PERFIL_BANCO': 'homologacao'})
+        with self.assertRaises(ImproperlyConfigured):
+            bancos(self.base_dir, {'DB_CONN_MAX_AGE': 'sempre'})
+        if importlib.util.find_spec('dj_db_conn_pool') is None:
+            with self.assertRaises(ImproperlyConfigured):
+                bancos(self.base_dir, {'DB_POOL': '10'})
+
+
+class DiagnosticoTests(TestCase):
+    def setUp(self):
+        diagnostico.limpar()
+        self.admin = criar_usuario('admin', 'admin')
+        self.client.force_login(self.admin)
+
+    def test_impressao_digital_agrupa_consultas_com_valores_diferentes(self):
+        a = diagnostico.impressao_digital('SELECT * FROM rotas WHERE veiculo_id = 1 AND local = \'Rua A\'')
+        b = diagnostico.impressao_digital('SELECT * FROM rotas WHERE veiculo_id = 27 AND local = \'Rua B\'')
+        self.assertEqual(a, b)
+        self.assertEqual(
+            diagnostico.impressao_digital('SELECT 1 FROM x WHERE id IN (%s, %s, %s)'),
+            diagnostico.impressao_digital('SELECT 1 FROM x WHERE id IN (%s)'),
+        )
+
+    @override_settings(DIAGNOSTICO_ATIVO=True, DIAGNOSTICO_AMOSTRAGEM=1)
+    def test_registra_consultas_e_tempos_por_view(self):
+        veiculo = criar_veiculo(1)
+        criar_rota(veiculo, 6)
+        self.client.get(reverse('veiculo:rota_list'))
+
+        amostra = diagnostico.amostras()[-1]
+        self.assertEqual(amostra['view'], 'veiculo:rota_list')
+        self.assertGreater(amostra['consultas'], 0)
+        self.assertGreater(amostra['template_ms'], 0)
+        self.assertGreaterEqual(amostra['total_ms'], amostra['sql_ms'])
+
+        resposta = self.client.get(reverse('veiculo:diagnostico'))
+        views = [linha['view'] for linha in resposta.context['linhas']]
+        self.assertIn('veiculo:rota_list', views)
+
+    @override_settings(DIAGNOSTICO_ATIVO=True, DIAGNOSTICO_AMOSTRAGEM=0)
+    def test_amostragem_zero_nao_registra(self):
+        self.client.get(reverse('veiculo:rota_list'))
+        self.assertEqual(diagnostico.amostras(), [])
+
+    @override_settings(DIAGNOSTICO_ATIVO=False, DIAGNOSTICO_AMOSTRAGEM=1)
+    def test_desativado_nao_mede(self):
+        self.client.get(reverse('veiculo:rota_list'))
+        self.assertEqual(diagnostico.amostras(), [])
+
+    def test_arquivo_gravado_em_lotes(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = f'{pasta}/diagnostico.jsonl'
+            with override_settings(DIAGNOSTICO_ARQUIVO=caminho, DIAGNOSTICO_LOTE_ARQUIVO=3):
+                diagnostico.descarregar()
+                for numero in range(2):
+                    diagnostico.registrar({'view': f'v{numero}'})
+                self.assertFalse(Path(caminho).exists())
+                diagnostico.registrar({'view': 'v2'})
+                with open(caminho, encoding='utf-8') as arquivo:
+                    self.assertEqual([json.loads(linha)['view'] for linha in arquivo], ['v0', 'v1', 'v2'])
+
+    def test_pagina_restrita_a_administradores(self):
+        self.client.force_login(criar_usuario('gestor', 'gestor_rotas'))
+        self.assertEqual(self.client.get(reverse('veiculo:diagnostico')).status_code, 302)
+
+
+class ExportacaoRelatoriosTests(TestCase):
+    def setUp(self):
+        self.client.force_login(criar_usuario('gestor', 'gestor_rotas'))
+        self.veiculo = criar_veiculo(1)
+        self.rota = criar_rota(self.veiculo, 6, local='Rua São João', dias_semana='Seg, Qua')
+        criar_problema(self.veiculo, rota=self.rota, status='em_andamento')
+        criar_problema(self.veiculo, descricao='Fora do período', data_ocorrencia=timezone.now() - timedelta(days=90))
+
+    def _conteudo(self, resposta):
+        self.assertTrue(resposta.streaming)
+        return b''.join(resposta.streaming_content)
+
+    def test_csv_de_rotas_respeita_filtros(self):
+        criar_rota(self.veiculo, 7, local='Rua Sexta', dias_semana='Sex')
+        resposta = self.client.get(reverse('veiculo:relatorio_rotas'), {'dias': 'qua', 'exportar': 'csv'})
+        self.assertIn('attachment; filename="relatorio_rotas.csv"', resposta['Content-Disposition'])
+
+        linhas = self._conteudo(resposta).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(linhas), 2)
+        self.assertTrue(linhas[0].startswith('ID;Veículo;Local'))
+        self.assertIn('Rua São João', linhas[1])
+        self.assertIn('06:00', linhas[1])
+
+    def test_csv_de_servico_exporta_problemas_do_periodo(self):
+        resposta = self.client.get(reverse('veiculo:relatorio_servico'), {'exportar': 'csv'})
+        conteudo = self._conteudo(resposta).decode('utf-8-sig')
+        self.assertIn('Em Andamento', conteudo)
+        self.assertIn('Rua São João', conteudo)
+        self.assertNotIn('Fora do período', conteudo)
+
+    def test_xlsx_de_veiculos_e_uma_planilha_valida(self):
+        resposta = self.client.get(reverse('veiculo:relatorio_veiculos'), {'exportar': 'xlsx'})
+        pacote = zipfile.ZipFile(io.BytesIO(self._conteudo(resposta)))
+        self.assertIn('xl/workbook.xml', pacote.namelist())
+
+        planilha = ElementTree.fromstring(pacote.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        linhas = planilha.findall('.//s:row', ns)
+        self.assertEqual(len(linhas), 2)
+        textos = [t.text for t in linhas[1].iter('{%s}t' % ns['s'])]
+        self.assertIn('ABC0001', textos)
+
+    def test_percorrer_le_em_lotes_com_cursor(self):
+        for hora in range(7, 12):
+            criar_rota(self.veiculo, hora)
+        paginator = CursorPaginator(Rota.objects.all(), 2, ordering=('horario', 'id'))
+        with CaptureQueriesContext(connection) as consultas:
+            horarios = [rota.horario.hour for rota in paginator.percorrer()]
+        self.assertEqual(horarios, list(range(6, 12)))
+        self.assertEqual(len(consultas), 3)
+
+
+class ImportacaoCSVTests(TestCase):
+    def test_importa_e_atualiza_veiculos_em_lotes(self):
+        criar_veiculo(1)
+        arquivo = io.StringIO(
+            'placa;tipo;numero_caminhao;ativo\n'
+            'abc-0001;Caçamba;CAM-1;não\n'
+            'xyz1d23;compactador;CAM-2;sim\n'
+            'INVALIDA;compactador;CAM-3;\n'
+            'XYZ1D23;compactador;CAM-4;\n'
+            'QWE1234;trator;CAM-5;\n'
+        )
+        resultado = importar_veiculos(arquivo, tamanho_lote=2)
+
+        self.assertEqual((resultado.criados, resultado.atualizados), (1, 1))
+        self.assertEqual([linha for linha, _ in resultado.erros], [4, 5, 6])
+        atualizado = Veiculo.objects.get(placa='ABC0001')
+        self.assertEqual((atualizado.tipo, atualizado.ativo), ('caçamba', False))
+        self.assertTrue(Veiculo.objects.filter(placa='XYZ1D23', numero_caminhao='CAM-2').exists())
+
+    def test_importa_rotas_resolvendo_placa_e_atualizando_horario_existente(self):
+        veiculo = criar_veiculo(1)
+        criar_rota(veiculo, 6, local='Rua Antiga')
+        arquivo = io.StringIO(
+            'placa,local,horario,dias_semana\n'
+            'ABC0001,Rua Nova,06:00,Segunda a Sexta\n'
+            'ABC0001,Rua B,07:30,Sáb\n'
+            'ZZZ9999,Rua C,08:00,\n'
+            'ABC0001,Rua D,25:00,\n'
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_rotas(arquivo)
+
+        self.assertEqual((resultado.criados, resultado.atualizados), (1, 1))
+        self.assertEqual(len(resultado.erros), 2)
+        self.assertLess(len(consultas), 20)
+
+        rotas = list(Rota.objects.order_by('horario'))
+        self.assertEqual([r.local for r in rotas], ['Rua Nova', 'Rua B'])
+        self.assertEqual(rotas[0].dias_semana, 'Seg, Ter, Qua, Qui, Sex')
+        self.assertEqual(list(Rota.objects.operando_em('sab')), [rotas[1]])
+        self.assertEqual(EstatisticaDiaria.totais()['rotas_cadastradas'], 2)
+
+    def test_upload_pelo_admin(self):
+        User.objects.create_superuser('root', 'root@teste.com', 'senha-teste-123')
+        self.client.login(username='root', password='senha-teste-123')
+        url = reverse('admin:app_veiculo_veiculo_importar_csv')
+        arquivo = SimpleUploadedFile('frota.csv', 'placa,tipo,numero_caminhao\nABC1234,compactador,CAM-9\n'.encode())
+
+        resposta = self.client.post(url, {'arquivo': arquivo, 'lote': 100})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(Veiculo.objects.filter(placa='ABC1234').exists())
+        self.assertContains(self.client.get(reverse('admin:app_veiculo_veiculo_changelist')), 'Importar CSV')
+
+
+class AgendaTests(TestCase):
+    # 03/01/2024 foi uma quarta-feira
+    QUARTA = date(2024, 1, 3)
+
+    def setUp(self):
+        cache.clear()
+        self.v1 = criar_veiculo(1)
+        self.v2 = criar_veiculo(2)
+        inativo = criar_veiculo(3, ativo=False)
+        self.tarde = criar_rota(self.v1, 14, dias_semana='Seg, Qua, Sex')
+        self.manha = criar_rota(self.v1, 6, dias_semana='Segunda a Sexta')
+        criar_rota(self.v1, 9, dias_semana='Ter, Qui')
+        self.v2_rota = criar_rota(self.v2, 7, dias_semana='Diariamente')
+        criar_rota(inativo, 8, dias_semana='Diariamente')
+
+    def test_agenda_do_dia_por_caminhao(self):
+        agenda = agenda_por_veiculo(self.QUARTA)
+        self.assertEqual([grupo['veiculo']['placa'] for grupo in agenda], ['ABC0001', 'ABC0002'])
+        self.assertEqual(
+            [coleta['rota_id'] for coleta in agenda[0]['coletas']],
+            [self.manha.pk, self.tarde.pk],
+        )
+        self.assertEqual([coleta['rota_id'] for coleta in agenda[1]['coletas']], [self.v2_rota.pk])
+
+    def test_cache_por_dia_invalidado_so_nos_dias_da_rota(self):
+        sabado = self.QUARTA + timedelta(days=3)
+        coletas_do_dia(self.QUARTA)
+        coletas_do_dia(sabado)
+
+        # Em cache, só a situação do dia vai ao banco
+        with CaptureQueriesContext(connection) as consultas:
+            coletas_do_dia(self.QUARTA)
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('"rotas"', consultas.captured_queries[0]['sql'])
+
+        nova = criar_rota(self.v2, 10, dias_semana='Sáb')
+        with CaptureQueriesContext(connection) as consultas:
+            coletas_do_dia(self.QUARTA)
+            sabado_atual = coletas_do_dia(sabado)
+        self.assertEqual(len(consultas), 3)
+        self.assertIn(nova.pk, [coleta['rota_id'] for coleta in sabado_atual])
+
+        nova.dias_semana = 'Qua'
+        nova.save()
+        self.assertIn(nova.pk, [coleta['rota_id'] for coleta in coletas_do_dia(self.QUARTA)])
+        self.assertNotIn(nova.pk, [coleta['rota_id'] for coleta in coletas_do_dia(sabado)])
+
+        self.v2.ativo = False
+        self.v2.save()
+        self.assertEqual({coleta['placa'] for coleta in coletas_do_dia(self.QUARTA)}, {'ABC0001'})
+
+    def test_pagina_e_json(self):
+        criar_usuario('operador', 'cidadao')
+        self.client.login(username='operador', password='senha-teste-123')
+
+        resposta = self.client.get(reverse('veiculo:agenda', args=['2024-01-03']))
+        self.assertContains(resposta, 'ABC0002')
+        self.assertNotContains(resposta, 'ABC0003')
+        self.assertEqual(self.client.get(reverse('veiculo:agenda', args=['03-01-2024'])).status_code, 404)
+
+        url = reverse('veiculo:agenda_json', args=['2024-01-03'])
+        dados = self.client.get(url, {'ate': '2024-01-04'}).json()
+        self.assertEqual([dia['data'] for dia in dados['dias']], ['2024-01-03', '2024-01-04'])
+        self.assertEqual(dados['dias'][0]['veiculos'][0]['coletas'][0]['horario'], '06:00')
+        self.assertEqual(self.client.get(url, {'ate': '2024-03-01'}).status_code, 400)
+
+
+class ConflitoHorarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veiculo = criar_veiculo(1)
+        self.rota = criar_rota(self.veiculo, 6, dias_semana='Seg, Qua', duracao=30)
+
+    def dados(self, horario, dias, **extra):
+        dados = {'veiculo': self.veiculo.pk, 'local': 'Rua Nova', 'horario': horario, 'duracao': 20, 'dias_semana': dias}
+        dados.update(extra)
+        return dados
+
+    def test_formulario_recusa_sobreposicao_no_mesmo_dia(self):
+        form = RotaForm(data=self.dados('06:05', ['qua', 'sex']))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Rua 6', form.errors['horario'][0])
+        self.assertIn('Qua', form.errors['horario'][0])
+
+        self.assertTrue(RotaForm(data=self.dados('06:30', ['qua'])).is_valid())
+        self.assertTrue(RotaForm(data=self.dados('06:05', ['ter'])).is_valid())
+        self.assertFalse(RotaForm(data=self.dados('05:50', ['seg'])).is_valid())
+
+    def test_edicao_nao_conflita_com_a_propria_rota(self):
+        form = RotaForm(data=self.dados('06:10', ['seg'], local='Rua 6', duracao=30), instance=self.rota)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        # A validação seguinte já lê a rota editada do banco
+        self.assertFalse(RotaForm(data=self.dados('06:35', ['seg'])).is_valid())
+        self.assertTrue(RotaForm(data=self.dados('06:05', ['qua'])).is_valid())
+
+    def test_virada_da_meia_noite(self):
+        criar_rota(self.veiculo, 23, dias_semana='Dom', duracao=90)
+        form = RotaForm(data=self.dados('00:15', ['seg']))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Rua 23', form.errors['horario'][0])
+
+    def test_rota_longa_cobre_candidato_apos_rota_sobreposta(self):
+        # Rotas gravadas antes da validação de conflitos podem se sobrepor
+        criar_rota(self.veiculo, 8, dias_semana='Ter', duracao=180, local='Rua Longa')
+        criar_rota(self.veiculo, 9, dias_semana='Ter', duracao=10)
+
+        form = RotaForm(data=self.dados('10:00', ['ter']))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Rua Longa', form.errors['horario'][0])
+
+        indice = IndiceDeHorarios().carregar([self.veiculo.pk])
+        self.assertEqual(set(indice.conflitos(self.veiculo.pk, time(9, 5), 10, 2)), {
+            rota.pk for rota in Rota.objects.filter(dias_mask=2)
+        })
+
+    def test_indice_confere_com_comparacao_direta(self):
+        sorteio = random.Random(7)
+        indice, rotas = IndiceDeHorarios(), {}
+        for rota_id in range(1, 301):
+            rota = (time(sorteio.randrange(24), sorteio.randrange(60)), sorteio.randrange(5, 300), 1)
+            indice.adicionar(rota_id, 1, *rota)
+            rotas[rota_id] = rota
+        for rota_id in range(1, 301, 3):
+            indice.remover(rota_id)
+            del rotas[rota_id]
+
+        for _ in range(200):
+            horario, duracao = time(sorteio.randrange(24), sorteio.randrange(60)), sorteio.randrange(5, 120)
+            esperado = {}
+            for rota_id, (outro_horario, outra_duracao, mascara) in rotas.items():
+                for dia, inicio, fim in intervalos(horario, duracao, 1):
+                    for outro_dia, outro_inicio, outro_fim in intervalos(outro_horario, outra_duracao, mascara):
+                        if dia == outro_dia and inicio < outro_fim and outro_inicio < fim:
+                            esperado[rota_id] = esperado.get(rota_id, 0) | 1 << dia
+            self.assertEqual(indice.conflitos(1, horario, duracao, 1), esperado)
+
+    def test_indice_remove_e_readiciona(self):
+        indice = IndiceDeHorarios().carregar([self.veiculo.pk])
+        self.assertEqual(indice.conflitos(self.veiculo.pk, time(6, 29), 10, 1), {self.rota.pk: 1})
+        indice.remover(self.rota.pk)
+        self.assertEqual(indice.conflitos(self.veiculo.pk, time(6, 29), 10, 1), {})
+
+    def test_importacao_recusa_conflitos_com_o_banco_e_entre_linhas(self):
+        arquivo = io.StringIO(
+            'placa,local,horario,dias_semana,duracao\n'
+            'ABC0001,Rua A,06:20,Seg,\n'
+            'ABC0001,Rua B,07:00,Seg,45\n'
+            'ABC0001,Rua C,07:30,Seg a Sex,\n'
+            'ABC0001,Rua D,06:00,Seg,15\n'
+        )
+        resultado = importar_rotas(arquivo)
+        self.assertEqual([linha for linha, _ in resultado.erros], [2, 4])
+        self.assertIn('Rua 6', resultado.erros[0][1])
+        self.assertIn('linha 3', resultado.erros[1][1])
+
+        self.rota.refresh_from_db()
+        self.assertEqual((self.rota.local, self.rota.duracao), ('Rua D', 15))
+        self.assertEqual(Rota.objects.get(local='Rua B').duracao, 45)
+
+
+class FilaDenunciasTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(DENUNCIAS_FILA_ARQUIVO=f'{pasta.name}/fila.sqlite3')
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.rota = criar_rota(criar_veiculo(1), 6)
+        criar_usuario('cidadao', 'cidadao')
+        self.client.login(username='cidadao', password='senha-teste-123')
+
+    def denunciar(self, **extra):
+        dados = {
+            'rota': self.rota.pk,
+            'local_problema': 'Rua das Flores, 10',
+            'data_ocorrencia': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            'descricao': 'Lixo não recolhido',
+        }
+        dados.update(extra)
+        return self.client.post(reverse('veiculo:problema_denuncia'), dados)
+
+    def test_denuncia_vai_para_a_fila_e_e_gravada_pelo_comando(self):
+        resposta = self.denunciar()
+        self.assertRedirects(resposta, reverse('veiculo:problema_denuncia'))
+        self.assertFalse(ProblemaColeta.objects.exists())
+        self.assertEqual(fila_denuncias.situacao()['pendentes'], 1)
+
+        saida = StringIO()
+        call_command('processar_denuncias', stdout=saida)
+        self.assertIn('1 denúncia(s) gravada(s)', saida.getvalue())
+
+        problema = ProblemaColeta.objects.get()
+        self.assertEqual((problema.veiculo_id, problema.status), (self.rota.veiculo_id, 'aberto'))
+        self.assertEqual(len(problema.protocolo), 32)
+        self.assertEqual(EstatisticaDiaria.totais()['problemas_abertos'], 1)
+        self.assertEqual(fila_denuncias.situacao()['pendentes'], 0)
+
+    def test_lote_reprocessado_nao_duplica(self):
+        self.denunciar()
+        (_, dados), = fila_denuncias.pendentes()
+        # Como se o processo tivesse caído depois do commit e antes de limpar a fila
+        fila_denuncias.enfileirar(dados)
+
+        self.assertEqual(fila_denuncias.drenar(), (2, 0))
+        problema = ProblemaColeta.objects.get()
+        self.assertEqual(problema.total_denuncias, 1)
+
+        # Denúncia agrupada ao problema existente, reprocessada da mesma forma
+        self.denunciar(local_problema='R. das Flores nº 52')
+        (_, dados), = fila_denuncias.pendentes()
+        self.assertEqual(fila_denuncias.drenar(), (1, 0))
+        fila_denuncias.enfileirar(dados)
+        self.assertEqual(fila_denuncias.drenar(), (1, 0))
+
+        problema.refresh_from_db()
+        self.assertEqual(problema.total_denuncias, 2)
+        self.assertEqual(ProblemaColeta.objects.count(), 1)
+
+    def test_rota_excluida_fica_com_erro_e_aparece_no_diagnostico(self):
+        self.denunciar()
+        self.rota.delete()
+        call_command('processar_denuncias', stdout=StringIO())
+
+        self.assertEqual(fila_denuncias.situacao(), {'pendentes': 0, 'com_erro': 1, 'atraso_segundos': 0})
+        criar_usuario('admin', 'admin')
+        self.client.login(username='admin', password='senha-teste-123')
+        self.assertContains(self.client.get(reverse('veiculo:diagnostico')), 'Rota não encontrada')
+
+    def test_denuncia_invalida_nao_bloqueia_o_lote(self):
+        self.denunciar()
+        (_, dados), = fila_denuncias.pendentes()
+        # Uma com data ilegível e outra que só falha ao gravar (latitude inválida)
+        fila_denuncias.enfileirar(dict(dados, protocolo='a' * 32, data_ocorrencia='ontem'))
+        fila_denuncias.enfileirar(dict(dados, protocolo='b' * 32, local_problema='Praça Sete', latitude='norte'))
+        self.denunciar(local_problema='Av. Central, 300')
+
+        self.assertEqual(fila_denuncias.drenar(), (2, 2))
+        self.assertEqual(
+            sorted(ProblemaColeta.objects.values_list('local_problema', flat=True)),
+            ['Av. Central, 300', 'Rua das Flores, 10'],
+        )
+        for _ in range(fila_denuncias.MAXIMO_TENTATIVAS - 1):
+            self.assertEqual(fila_denuncias.drenar(), (0, 2))
+        self.assertEqual(fila_denuncias.drenar(), (0, 0))
+        erro_data, erro_banco = [erro for _, _, erro in fila_denuncias.com_erro()]
+        self.assertIn("'ontem'", erro_data)
+        self.assertIn('ValidationError', erro_banco)
+
+    def test_lote_reservado_nao_e_pego_por_outra_drenagem(self):
+        self.denunciar()
+        self.denunciar(local_problema='Av. Central, 300')
+        reservadas = fila_denuncias.reservar()
+        self.assertEqual(len(reservadas), 2)
+        self.assertEqual(fila_denuncias.drenar(), (0, 0))
+
+        # Drenagem interrompida: o lote volta para a fila sem contar tentativa
+        fila_denuncias.liberar([identificador for identificador, _ in reservadas])
+        self.assertEqual(fila_denuncias.drenar(), (2, 0))
+
+    @override_settings(DENUNCIAS_ASSINCRONAS=False)
+    def test_gravacao_direta_quando_desativada(self):
+        resposta = self.denunciar()
+        problema = ProblemaColeta.objects.get()
+        self.assertRedirects(resposta, reverse('veiculo:problema_detail', args=[problema.pk]))
+
+
+@override_settings(DENUNCIAS_ASSINCRONAS=False)
+class AgrupamentoDenunciasTests(TestCase):
+    def setUp(self):
+        self.rota = criar_rota(criar_veiculo(1), 6)
+        criar_usuario('cidadao', 'cidadao')
+        self.client.login(username='cidadao', password='senha-teste-123')
+
+    def denunciar(self, local, quando=None):
+        quando = quando or timezone.localtime()
+        return self.client.post(reverse('veiculo:problema_denuncia'), {
+            'rota': self.rota.pk,
+            'local_problema': local,
+            'data_ocorrencia': quando.strftime('%Y-%m-%dT%H:%M'),
+            'descricao': 'Lixo não recolhido',
+        })
+
+    def test_normaliza_local(self):
+        self.assertEqual(normalizar_local('R. São José, nº 120 - Centro'), 'rua sao jose centro')
+        self.assertEqual(
+            chave_agrupamento(1, 'Rua Sao Jose 98, centro'),
+            chave_agrupamento(1, 'R. São José, nº 120 - Centro'),
+        )
+        self.assertNotEqual(chave_agrupamento(1, 'Rua A'), chave_agrupamento(2, 'Rua A'))
+
+    def test_denuncias_repetidas_somam_no_mesmo_problema(self):
+        self.denunciar('Rua das Flores, 10')
+        resposta = self.denunciar('R. das Flores nº 52')
+        problema = ProblemaColeta.objects.get()
+        self.assertRedirects(resposta, reverse('veiculo:problema_detail', args=[problema.pk]))
+        self.assertEqual(problema.total_denuncias, 2)
+
+        self.denunciar('Avenida Brasil, 10')
+        self.denunciar('Rua das Flores, 10', timezone.localtime() - timedelta(days=3))
+        self.assertEqual(ProblemaColeta.objects.count(), 3)
+
+        problema.status = 'resolvido'
+        problema.save()
+        self.denunciar('Rua das Flores, 10')
+        self.assertEqual(ProblemaColeta.objects.count(), 4)
+
+        resposta = self.client.get(reverse('veiculo:problema_list'))
+        self.assertContains(resposta, '2 denúncias')
+
+    @override_settings(DENUNCIAS_ASSINCRONAS=True)
+    def test_fila_agrupa_no_lote_e_com_o_banco(self):
+        with tempfile.TemporaryDirectory() as pasta, override_settings(DENUNCIAS_FILA_ARQUIVO=f'{pasta}/fila.sqlite3'):
+            existente = criar_problema(
+                self.rota.veiculo, self.rota, local_problema='Rua B, 1',
+                chave_agrupamento=chave_agrupamento(self.rota.pk, 'Rua B, 1'),
+            )
+            for local in ['Rua A, 1', 'Rua A, 2', 'Rua B, 3', 'Rua A, 9']:
+                self.denunciar(local)
+
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(fila_denuncias.drenar(), (4, 0))
+            # Uma busca de candidatos e um UPDATE por problema reforçado, não por
+            # denúncia; a checagem de protocolos já aplicados e a recontagem do
+            # backlog e do snapshot são fixas por lote
+            self.assertLessEqual(len(consultas), 22)
+
+            existente.refresh_from_db()
+            self.assertEqual(existente.total_denuncias, 2)
+            nova = ProblemaColeta.objects.exclude(pk=existente.pk).get()
+            self.assertEqual((nova.local_problema, nova.total_denuncias), ('Rua A, 1', 3))
+            self.assertEqual(EstatisticaDiaria.totais()['problemas_registrados'], 2)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.veiculo = criar_veiculo(1)
+        self.rotas = [criar_rota(self.veiculo, hora) for hora in (6, 7, 8)]
+        criar_usuario('gestor', 'gestor_rotas')
+        criar_usuario('cidadao', 'cidadao')
+        self.client.login(username='gestor', password='senha-teste-123')
+
+    def url(self, recurso, pk=None):
+        if pk is None:
+            return reverse('veiculo:api_colecao', args=[recurso])
+        return reverse('veiculo:api_detalhe', args=[recurso, pk])
+
+    def enviar(self, metodo, url, dados):
+        return getattr(self.client, metodo)(url, data=json.dumps(dados), content_type='application/json')
+
+    def test_campos_e_paginacao_por_cursor(self):
+        resposta = self.client.get(self.url('rotas'), {'campos': 'local,veiculo_placa', 'limite': 2})
+        dados = resposta.json()
+        self.assertEqual(dados['resultados'], [
+            {'local': 'Rua 6', 'veiculo_placa': 'ABC0001'},
+            {'local': 'Rua 7', 'veiculo_placa': 'ABC0001'},
+        ])
+        self.assertIsNone(dados['anterior'])
+
+        seguinte = self.client.get(self.url('rotas'), {'campos': 'id', 'limite': 2, 'cursor': dados['proximo']})
+        self.assertEqual(seguinte.json()['resultados'], [{'id': self.rotas[2].pk}])
+        self.assertIsNone(seguinte.json()['proximo'])
+
+        self.assertEqual(self.client.get(self.url('rotas'), {'campos': 'senha'}).status_code, 400)
+
+    def test_reusa_filtros_das_listagens(self):
+        criar_veiculo(2, tipo='caçamba')
+        resposta = self.client.get(self.url('veiculos'), {'tipo': 'caçamba', 'campos': 'placa'})
+        self.assertEqual(resposta.json()['resultados'], [{'placa': 'ABC0002'}])
+
+    def test_get_condicional_responde_304_ate_haver_alteracao(self):
+        resposta = self.client.get(self.url('rotas'))
+        etag = resposta['ETag']
+        self.assertTrue(resposta.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as consultas:
+            repetida = self.client.get(self.url('rotas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repetida.status_code, 304)
+        # Sessão, usuário e um MAX(data_atualizacao) por tabela envolvida
+        self.assertFalse(any('"rotas"."local"' in consulta['sql'] for consulta in consultas.captured_queries))
+
+        # Outro filtro, outra ETag
+        self.assertNotEqual(self.client.get(self.url('rotas'), {'concluida': 'true'})['ETag'], etag)
+
+        # A placa aparece nas rotas: alterar o veículo muda a resposta
+        self.veiculo.numero_caminhao = 'CAM-99'
+        self.veiculo.save()
+        self.assertEqual(self.client.get(self.url('rotas'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(self.url('rotas'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rotas[0].delete()
+        # O registro da exclusão fica no banco: vale para um processo com o cache vazio
+        cache.clear()
+        self.assertEqual(self.client.get(self.url('rotas'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.url('rotas'))['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(self.url('rotas'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_exclusao_em_cascata_marca_cada_tabela_uma_vez(self):
+        for _ in range(5):
+            criar_problema(self.veiculo, self.rotas[0])
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.veiculo.delete()
+        marcas = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('UPDATE "registro_exclusoes"')]
+        self.assertEqual(len(marcas), 4)
+        self.assertEqual(
+            set(RegistroExclusao.objects.values_list('tabela', flat=True)),
+            {'veiculos', 'rotas', 'ocorrencias_rotas', 'problemas_coleta'},
+        )
+
+    def test_cria_altera_e_exclui(self):
+        resposta = self.enviar('post', self.url('veiculos'), {
+            'placa': 'xyz-9876', 'tipo': 'compactador', 'numero_caminhao': 'CAM-50', 'ativo': True,
+        })
+        self.assertEqual(resposta.status_code, 201)
+        veiculo = resposta.json()['resultado']
+        self.assertEqual(veiculo['placa'], 'XYZ9876')
+        self.assertEqual(resposta['Location'], self.url('veiculos', veiculo['id']))
+
+        # PATCH mantém os campos não enviados
+        resposta = self.enviar('patch', self.url('rotas', self.rotas[0].pk), {'local': 'Praça Central'})
+        self.assertEqual(resposta.status_code, 200)
+        rota = Rota.objects.get(pk=self.rotas[0].pk)
+        self.assertEqual((rota.local, rota.horario, rota.veiculo_id), ('Praça Central', time(6), self.veiculo.pk))
+
+        # Mesmas validações do formulário: horário já ocupado pelo caminhão
+        resposta = self.enviar('patch', self.url('rotas', self.rotas[0].pk), {'horario': '07:00'})
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.json()['errors']['__all__'][0]['code'], 'unique_together')
+
+        resposta = self.client.delete(self.url('rotas', self.rotas[0].pk))
+        self.assertEqual(resposta.status_code, 204)
+        self.assertEqual(self.client.get(self.url('rotas', self.rotas[0].pk)).status_code, 404)
+
+    def test_permissoes(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url('veiculos')).status_code, 401)
+
+        self.client.login(username='cidadao', password='senha-teste-123')
+        self.assertEqual(self.client.get(self.url('veiculos')).status_code, 200)
+        resposta = self.client.delete(self.url('veiculos', self.veiculo.pk))
+        self.assertEqual(resposta.status_code, 403)
+        self.assertTrue(Veiculo.objects.filter(pk=self.veiculo.pk).exists())
+        self.assertEqual(self.client.get(self.url('inexistente')).status_code, 404)
+
+
+class StatusEmLoteTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        self.abertos = [criar_problema(self.veiculo) for _ in range(3)]
+        self.em_andamento = criar_problema(self.veiculo, status='em_andamento')
+        self.cancelado = criar_problema(self.veiculo, status='cancelado')
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+
+    def alterar(self, dados):
+        return self.client.post(
+            reverse('veiculo:problema_status_lote'), dados, HTTP_ACCEPT='application/json'
+        )
+
+    def test_avanca_um_passo_com_um_update_por_status(self):
+        ids = [problema.pk for problema in self.abertos] + [self.em_andamento.pk, self.cancelado.pk, 999]
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.alterar({'ids': ids})
+        updates = [c for c in consultas.captured_queries if c['sql'].startswith('UPDATE "problemas_coleta"')]
+        self.assertEqual(len(updates), 2)
+
+        dados = resposta.json()
+        self.assertEqual((dados['alterados'], dados['recusados']), (4, 2))
+        self.assertEqual(dados['resultados'][str(self.abertos[0].pk)]['status'], 'em_andamento')
+        self.assertFalse(dados['resultados'][str(self.cancelado.pk)]['success'])
+        self.assertEqual(dados['resultados']['999']['error'], 'Problema não encontrado.')
+
+        self.em_andamento.refresh_from_db()
+        self.assertEqual(self.em_andamento.status, 'resolvido')
+        self.assertIsNotNone(self.em_andamento.data_resolucao)
+        totais = EstatisticaDiaria.totais()
+        self.assertEqual((totais['problemas_abertos'], totais['problemas_resolvidos']), (3, 1))
+
+    def test_destino_recusa_transicoes_invalidas(self):
+        ids = [self.abertos[0].pk, self.cancelado.pk]
+        dados = self.alterar({'ids': ids, 'status_destino': 'em_andamento'}).json()
+        self.assertEqual((dados['alterados'], dados['recusados']), (1, 1))
+        self.assertIn('não permitida', dados['resultados'][str(self.cancelado.pk)]['error'])
+        self.assertEqual(ProblemaColeta.objects.get(pk=self.cancelado.pk).status, 'cancelado')
+
+        self.assertEqual(self.alterar({'ids': ids, 'status_destino': 'fechado'}).status_code, 400)
+
+    def test_aplica_ao_filtro_e_volta_para_a_listagem(self):
+        resposta = self.client.post(reverse('veiculo:problema_status_lote'), {
+            'todos_do_filtro': '1', 'status': 'aberto',
+        })
+        self.assertRedirects(resposta, reverse('veiculo:problema_list') + '?status=aberto')
+        self.assertEqual(ProblemaColeta.objects.filter(status='em_andamento').count(), 4)
+        self.assertEqual(ProblemaColeta.objects.filter(status='cancelado').count(), 1)
+
+
+class HistoricoStatusTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        self.gestor = criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+
+    def test_maquina_de_estados_e_historico(self):
+        problema = criar_problema(self.veiculo, data_ocorrencia=timezone.now() - timedelta(hours=5))
+        aplicar(problema, 'em_andamento', usuario=self.gestor)
+        problema.save()
+        aplicar(problema, 'resolvido')
+        problema.save()
+        self.assertIsNotNone(problema.data_resolucao)
+
+        with self.assertRaises(TransicaoInvalida):
+            aplicar(problema, 'em_andamento')
+
+        transicoes = list(problema.transicoes.values_list('status_anterior', 'status_novo', 'usuario'))
+        self.assertEqual(transicoes, [
+            ('aberto', 'em_andamento', self.gestor.pk),
+            ('em_andamento', 'resolvido', None),
+        ])
+        with self.assertRaises(ValueError):
+            problema.transicoes.first().save()
+
+    def test_formulario_recusa_transicao_invalida(self):
+        problema = criar_problema(self.veiculo, status='cancelado')
+        dados = {
+            'veiculo': self.veiculo.pk, 'tipo_problema': 'outros', 'prioridade': 'media',
+            'status': 'resolvido', 'descricao': 'x', 'local_problema': 'Rua A',
+            'data_ocorrencia': '2026-01-10T10:00', 'responsavel_relato': 'Fulano',
+        }
+        resposta = self.client.post(reverse('veiculo:problema_update', args=[problema.pk]), dados)
+        self.assertContains(resposta, 'não permitida')
+
+        dados['status'] = 'aberto'
+        self.client.post(reverse('veiculo:problema_update', args=[problema.pk]), dados)
+        transicao = problema.transicoes.get()
+        self.assertEqual((transicao.status_anterior, transicao.usuario), ('cancelado', self.gestor))
+
+    def test_admin_altera_status_pela_maquina_de_estados(self):
+        admin = User.objects.create_superuser('root', 'root@exemplo.com', 'senha-teste-123')
+        self.client.force_login(admin)
+        aberto = criar_problema(self.veiculo)
+        cancelado = criar_problema(self.veiculo, status='cancelado')
+
+        def editar_na_listagem(problema, status):
+            return self.client.post(reverse('admin:app_veiculo_problemacoleta_changelist'), {
+                'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+                'form-0-id': problema.pk, 'form-0-status': status, 'form-0-prioridade': problema.prioridade,
+                '_save': 'Salvar',
+            })
+
+        self.assertEqual(editar_na_listagem(aberto, 'resolvido').status_code, 302)
+        aberto.refresh_from_db()
+        self.assertIsNotNone(aberto.data_resolucao)
+        self.assertEqual(aberto.transicoes.get().usuario, admin)
+
+        self.assertContains(editar_na_listagem(cancelado, 'resolvido'), 'não permitida')
+        cancelado.refresh_from_db()
+        self.assertEqual(cancelado.status, 'cancelado')
+        self.assertFalse(cancelado.transicoes.exists())
+
+    def test_tempo_de_resolucao_e_backlog(self):
+        agora = timezone.now()
+        outro = criar_veiculo(2)
+        resolvidos = [
+            criar_problema(self.veiculo, data_ocorrencia=agora - timedelta(hours=horas), status='em_andamento')
+            for horas in (2, 4)
+        ]
+        criar_problema(outro, data_ocorrencia=agora - timedelta(hours=10), tipo_problema='outros')
+        transicionar_em_lote([problema.pk for problema in resolvidos], 'resolvido')
+
+        # Uma consulta traz os dois agrupamentos
+        with self.assertNumQueries(1):
+            linhas = tempo_de_resolucao(agora - timedelta(days=1), agora + timedelta(days=1))
+        self.assertEqual(linhas['veiculo'], [
+            {'grupo': 'ABC0001', 'resolvidos': 2, 'media_horas': 3.0, 'maximo_horas': 4.0},
+        ])
+        self.assertEqual(linhas['tipo'], [
+            {'grupo': 'Coleta sem ser feita', 'resolvidos': 2, 'media_horas': 3.0, 'maximo_horas': 4.0},
+        ])
+
+        backlog = idade_do_backlog(agora=agora)
+        self.assertEqual(backlog['tipo'], [
+            {'grupo': 'Outros', 'pendentes': 1, 'media_horas': 10.0, 'maximo_horas': 10.0},
+        ])
+
+        # Agregado no banco: uma consulta, qualquer que seja o número de pendentes
+        criar_problema(outro, data_ocorrencia=agora - timedelta(hours=20), tipo_problema='outros')
+        criar_problema(self.veiculo, data_ocorrencia=agora - timedelta(hours=30))
+        with self.assertNumQueries(1):
+            backlog = idade_do_backlog(agora=agora)
+        self.assertEqual(backlog['veiculo'], [
+            {'grupo': 'ABC0001', 'pendentes': 1, 'media_horas': 30.0, 'maximo_horas': 30.0},
+            {'grupo': 'ABC0002', 'pendentes': 2, 'media_horas': 15.0, 'maximo_horas': 20.0},
+        ])
+        self.assertEqual(backlog['tipo'], [
+            {'grupo': 'Coleta sem ser feita', 'pendentes': 1, 'media_horas': 30.0, 'maximo_horas': 30.0},
+            {'grupo': 'Outros', 'pendentes': 2, 'media_horas': 15.0, 'maximo_horas': 20.0},
+        ])
+
+        resposta = self.client.get(reverse('veiculo:relatorio_servico'))
+        self.assertContains(resposta, 'Tempo de Resolução no Período por Veículo')
+
+
+class BacklogTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        self.hoje = timezone.localdate()
+
+    def contadores(self):
+        return {(linha.prioridade, linha.data): linha.pendentes for linha in BacklogDiario.objects.all()}
+
+    def test_contadores_acompanham_gravacoes(self):
+        antigo = criar_problema(self.veiculo, prioridade='urgente', data_ocorrencia=timezone.now() - timedelta(days=5))
+        criar_problema(self.veiculo, prioridade='urgente')
+        baixa = criar_problema(self.veiculo, prioridade='baixa')
+        dia_antigo = timezone.localdate(antigo.data_ocorrencia)
+        self.assertEqual(self.contadores(), {
+            ('urgente', dia_antigo): 1, ('urgente', self.hoje): 1, ('baixa', self.hoje): 1,
+        })
+
+        baixa.prioridade = 'alta'
+        baixa.save()
+        aplicar(antigo, 'resolvido')
+        antigo.save()
+        self.assertEqual(self.contadores(), {('urgente', self.hoje): 1, ('alta', self.hoje): 1})
+
+        transicionar_em_lote([baixa.pk], 'cancelado')
+        aplicar(antigo, 'aberto')
+        antigo.save()
+        self.assertEqual(self.contadores(), {('urgente', dia_antigo): 1, ('urgente', self.hoje): 1})
+
+        # Exclusão em cascata pelo veículo zera tudo
+        self.veiculo.delete()
+        self.assertEqual(self.contadores(), {})
+
+    def test_painel_por_faixa_e_prazo(self):
+        for dias in (0, 2, 10):
+            criar_problema(self.veiculo, prioridade='urgente', data_ocorrencia=timezone.now() - timedelta(days=dias))
+        criar_problema(self.veiculo, prioridade='baixa', data_ocorrencia=timezone.now() - timedelta(days=10))
+
+        BacklogDiario.objects.all().delete()
+        call_command('recalcular_estatisticas', stdout=StringIO())
+
+        with self.assertNumQueries(1):
+            painel = painel_backlog()
+        urgente = painel['linhas'][0]
+        self.assertEqual(urgente['rotulo'], 'Urgente')
+        self.assertEqual(urgente['faixas'], [1, 1, 0, 1, 0])
+        self.assertEqual((urgente['total'], urgente['fora_do_prazo']), (3, 2))
+        self.assertEqual((painel['total'], painel['fora_do_prazo']), (4, 2))
+
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+        self.assertContains(self.client.get(reverse('dashboard')), '2 fora do prazo')
+
+
+class LocalizacaoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        veiculo = criar_veiculo(1)
+        self.perto = criar_rota(veiculo, 6, latitude=Decimal('-23.550500'), longitude=Decimal('-46.630500'))
+        self.vizinha = criar_rota(veiculo, 8, latitude=Decimal('-23.560000'), longitude=Decimal('-46.630000'))
+        self.longe = criar_rota(veiculo, 10, latitude=Decimal('-23.650000'), longitude=Decimal('-46.630000'))
+        criar_rota(veiculo, 12)
+
+    def test_rota_mais_proxima_e_busca_por_raio(self):
+        self.assertEqual(rota_mais_proxima(-23.55, -46.63), self.perto.pk)
+        self.assertEqual(rota_mais_proxima(-23.64, -46.63), self.longe.pk)
+        # A mais próxima está a mais de 4 km
+        self.assertIsNone(rota_mais_proxima(-23.60, -46.63, raio_km=2))
+        self.assertEqual(
+            [rota_id for _, rota_id in GradeDeRotas().no_raio(-23.55, -46.63, 2)],
+            [self.perto.pk, self.vizinha.pk],
+        )
+
+        # Células já carregadas vêm do cache
+        with self.assertNumQueries(0):
+            rota_mais_proxima(-23.55, -46.63)
+
+        # Mover a rota invalida só as células envolvidas
+        self.perto.latitude = Decimal('-23.700000')
+        self.perto.save()
+        self.assertEqual(rota_mais_proxima(-23.55, -46.63), self.vizinha.pk)
+        self.vizinha.delete()
+        self.assertIsNone(rota_mais_proxima(-23.55, -46.63))
+
+    @override_settings(DENUNCIAS_ASSINCRONAS=False)
+    def test_denuncia_sugere_rota_pela_localizacao(self):
+        criar_usuario('cidadao', 'cidadao')
+        self.client.login(username='cidadao', password='senha-teste-123')
+
+        resposta = self.client.get(reverse('veiculo:rota_proxima'), {'latitude': '-23.5501', 'longitude': '-46.6301'})
+        self.assertEqual(resposta.json()['rota']['id'], self.perto.pk)
+        self.assertEqual(self.client.get(reverse('veiculo:rota_proxima'), {'latitude': 'x'}).status_code, 400)
+
+        dados = {
+            'rota': '',
+            'local_problema': 'Rua das Flores, 10',
+            'data_ocorrencia': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            'descricao': 'Lixo não recolhido',
+        }
+        resposta = self.client.post(reverse('veiculo:problema_denuncia'), dados)
+        self.assertFormError(resposta.context['form'], 'rota', 'Selecione a rota relacionada.')
+
+        self.client.post(reverse('veiculo:problema_denuncia'), {**dados, 'latitude': '-23.5501', 'longitude': '-46.6301'})
+        problema = ProblemaColeta.objects.get()
+        self.assertEqual((problema.rota_id, problema.veiculo_id), (self.perto.pk, self.perto.veiculo_id))
+        self.assertEqual(problema.latitude, Decimal('-23.550100'))
+
+    def test_problemas_pendentes_perto_da_rota(self):
+        veiculo = self.perto.veiculo
+        mais_perto = criar_problema(veiculo, latitude=Decimal('-23.552000'), longitude=Decimal('-46.630500'))
+        a_800m = criar_problema(veiculo, latitude=Decimal('-23.557700'), longitude=Decimal('-46.630500'))
+        criar_problema(veiculo, latitude=Decimal('-23.580000'), longitude=Decimal('-46.630500'))
+        criar_problema(veiculo, status='resolvido', latitude=Decimal('-23.551000'), longitude=Decimal('-46.630500'))
+        criar_problema(veiculo)
+
+        self.assertEqual(problemas_perto_da_rota(self.perto), [mais_perto, a_800m])
+        self.assertEqual(problemas_perto_da_rota(Rota.objects.get(latitude__isnull=True)), [])
+
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+        resposta = self.client.get(reverse('veiculo:rota_detail', args=[self.perto.pk]))
+        self.assertContains(resposta, reverse('veiculo:problema_detail', args=[a_800m.pk]))
+
+
+class SequenciamentoTests(TestCase):
+    def setUp(self):
+        self.veiculo = criar_veiculo(1)
+        # Pontos em linha, a cada ~1,1 km, com os horários fora de ordem
+        for hora, passo in [(6, 0), (7, 3), (8, 1), (9, 4), (10, 2)]:
+            criar_rota(
+                self.veiculo, hora, local=f'Ponto {passo}', dias_semana='Seg',
+                latitude=Decimal('-23.550000') - Decimal('0.01') * passo, longitude=Decimal('-46.630000'),
+            )
+        criar_rota(self.veiculo, 11, local='Sem coordenadas', dias_semana='Seg')
+
+    def test_ordem_sugerida_encurta_o_percurso(self):
+        ordem, atual, sugerida = otimizar_sequencia([(0, 0), (0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02)])
+        self.assertEqual(ordem, [0, 2, 4, 1, 3])
+        self.assertLess(sugerida, atual)
+
+        sequencia = sugerir_sequencia(self.veiculo, 'seg')
+        self.assertEqual([rota.local for rota in sequencia['rotas']], [f'Ponto {passo}' for passo in range(5)])
+        self.assertEqual([rota.local for rota in sequencia['sem_coordenadas']], ['Sem coordenadas'])
+        self.assertAlmostEqual(sequencia['distancia_sugerida'], 4.45, places=1)
+        self.assertEqual(sugerir_sequencia(self.veiculo, 'ter')['rotas'], [])
+
+    def test_frota_no_comando_e_no_detalhe_do_veiculo(self):
+        (resultado,) = otimizar_frota('seg', processos=1)
+        self.assertEqual(resultado['veiculo_id'], self.veiculo.pk)
+        self.assertLess(resultado['distancia_sugerida'], resultado['distancia_atual'])
+
+        saida = StringIO()
+        call_command('otimizar_rotas', dia='seg', processos=1, stdout=saida)
+        self.assertIn(f'{self.veiculo.placa}: 5 rota(s)', saida.getvalue())
+
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+        # Sem pedido, a página não calcula a sequência
+        resposta = self.client.get(reverse('veiculo:veiculo_detail', args=[self.veiculo.pk]))
+        self.assertIsNone(resposta.context['sequencia'])
+        self.assertContains(resposta, 'clique em Calcular')
+
+        resposta = self.client.get(reverse('veiculo:veiculo_detail', args=[self.veiculo.pk]), {'dia': 'seg'})
+        self.assertEqual([rota.local for rota in resposta.context['sequencia']['rotas']][:2], ['Ponto 0', 'Ponto 1'])
+        self.assertContains(resposta, 'Sequência Sugerida de Coletas')
+
+
+class BalanceamentoFrotaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cheio = criar_veiculo(1)
+        self.leve = criar_veiculo(2)
+        self.cacamba = criar_veiculo(3, tipo='caçamba')
+        self.rotas = {
+            hora: criar_rota(self.cheio, hora, duracao=60, dias_semana='Seg a Sex')
+            for hora in (6, 8, 10, 12)
+        }
+        criar_rota(self.leve, 6, duracao=60, dias_semana='Seg a Sex')
+
+    def snapshot(self):
+        return sorted(EstatisticaDiaria.objects.values_list('veiculo_id', 'data', 'rotas_cadastradas'))
+
+    def test_proposta_respeita_tipo_horario_e_tolerancia(self):
+        carga = {item['veiculo'].pk: item for item in cargas()}
+        self.assertEqual(carga[self.cheio.pk]['minutos'], 1200)
+        self.assertEqual(carga[self.cheio.pk]['por_dia'], [240] * 5 + [0, 0])
+        self.assertEqual((carga[self.cheio.pk]['inicio'], carga[self.cheio.pk]['fim']), ('06:00', '13:00'))
+
+        # Às 6h o veículo leve já está ocupado; a caçamba é de outro tipo
+        with self.assertNumQueries(2):
+            propostas = propor_redistribuicao(tolerancia=60)
+        self.assertEqual(
+            [(p['rota_id'], p['origem'], p['destino']) for p in propostas],
+            [(self.rotas[8].pk, self.cheio, self.leve)],
+        )
+        self.assertEqual(propor_redistribuicao(tolerancia=1000), [])
+
+        # A tela lê a frota uma vez e passa a mesma situação para as duas funções
+        situacao = situacao_da_frota()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(propor_redistribuicao(tolerancia=60, situacao=situacao)), 1)
+            self.assertEqual({item['veiculo'].pk: item for item in cargas(situacao)}, carga)
+
+    def test_aplica_em_lote_e_mantem_snapshot_e_caches(self):
+        escolhas_de_rotas()
+        movidas, recusadas = aplicar_propostas([
+            (self.rotas[8].pk, self.leve.pk),
+            (self.rotas[10].pk, self.leve.pk),
+            (self.rotas[6].pk, self.leve.pk),
+            (self.rotas[12].pk, self.cacamba.pk),
+        ])
+        self.assertEqual(movidas, 2)
+        self.assertEqual(set(recusadas), {self.rotas[6].pk, self.rotas[12].pk})
+        self.assertEqual(Rota.objects.filter(veiculo=self.leve).count(), 3)
+        self.assertIn((self.rotas[8].pk, str(Rota.objects.get(pk=self.rotas[8].pk))), escolhas_de_rotas())
+
+        incremental = self.snapshot()
+        EstatisticaDiaria.reconstruir()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_tela_aplica_propostas_selecionadas(self):
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+        resposta = self.client.get(reverse('veiculo:balanceamento_frota'))
+        self.assertContains(resposta, f'{self.rotas[8].pk}:{self.leve.pk}')
+
+        resposta = self.client.post(reverse('veiculo:balanceamento_frota'), {
+            'propostas': [f'{self.rotas[8].pk}:{self.leve.pk}'],
+        })
+        self.assertRedirects(resposta, reverse('veiculo:balanceamento_frota'))
+        self.assertEqual(Rota.objects.get(pk=self.rotas[8].pk).veiculo, self.leve)
+
+
+class OcorrenciaRotaTests(TestCase):
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.veiculo = criar_veiculo(1)
+        self.diaria = criar_rota(self.veiculo, 6, dias_semana='Diariamente')
+        self.outra = criar_rota(self.veiculo, 8, dias_semana='Diariamente')
+        criar_rota(criar_veiculo(2, ativo=False), 7, dias_semana='Diariamente')
+        criar_usuario('gestor', 'gestor_rotas')
+        self.client.login(username='gestor', password='senha-teste-123')
+
+    def test_conclusao_vale_so_para_o_dia(self):
+        alterada = Rota.objects.get(pk=self.diaria.pk).data_atualizacao
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post(reverse('veiculo:rota_toggle_status', args=[self.diaria.pk]))
+        self.assertTrue(resposta.json()['concluida'])
+        self.assertFalse(any(consulta['sql'].startswith('UPDATE "rotas"') for consulta in consultas.captured_queries))
+        self.assertEqual(Rota.objects.get(pk=self.diaria.pk).data_atualizacao, alterada)
+
+        self.assertTrue(Rota.objects.com_situacao().get(pk=self.diaria.pk).concluida)
+        semana_que_vem = self.hoje + timedelta(days=7)
+        self.assertFalse(Rota.objects.com_situacao(semana_que_vem).get(pk=self.diaria.pk).concluida)
+        self.assertEqual(EstatisticaDiaria.totais(data=self.hoje)['rotas_concluidas'], 1)
+
+        resposta = self.client.get(reverse('veiculo:rota_list'), {'concluida': 'true'})
+        self.assertEqual([rota.pk for rota in resposta.context['page_obj']], [self.diaria.pk])
+        resposta = self.client.get(reverse('veiculo:relatorio_rotas'), {'status': 'false'})
+        self.assertNotIn(self.diaria.pk, [rota.pk for rota in resposta.context['page_obj']])
+
+        self.client.post(reverse('veiculo:rota_toggle_status', args=[self.diaria.pk]))
+        self.assertFalse(Rota.objects.com_situacao().get(pk=self.diaria.pk).concluida)
+        self.assertEqual(EstatisticaDiaria.totais(data=self.hoje)['rotas_concluidas'], 0)
+
+    def test_rota_que_nao_opera_hoje_nao_fica_pendente(self):
+        amanha = ROTULOS[(self.hoje.weekday() + 1) % 7]
+        so_amanha = criar_rota(self.veiculo, 9, dias_semana=amanha)
+
+        rota = Rota.objects.com_situacao().get(pk=so_amanha.pk)
+        self.assertFalse(rota.opera_no_dia)
+        self.assertFalse(rota.concluida)
+
+        resposta = self.client.get(reverse('veiculo:rota_list'), {'concluida': 'false'})
+        pendentes = [rota.pk for rota in resposta.context['page_obj']]
+        self.assertIn(self.diaria.pk, pendentes)
+        self.assertNotIn(so_amanha.pk, pendentes)
+
+        veiculo = veiculos_com_estatisticas().get(pk=self.veiculo.pk)
+        self.assertEqual((veiculo.total_rotas, veiculo.rotas_pendentes), (3, 2))
+        resposta = self.client.get(reverse('veiculo:rota_detail', args=[so_amanha.pk]))
+        self.assertContains(resposta, 'Sem coleta hoje')
+
+    def test_comando_abre_o_dia_de_uma_vez(self):
+        OcorrenciaRota.alternar(self.diaria)
+        ontem = self.hoje - timedelta(days=1)
+        OcorrenciaRota.objects.create(rota=self.outra, veiculo=self.veiculo, data=ontem)
+
+        saida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('virar_dia', stdout=saida)
+        self.assertEqual(sum(consulta['sql'].startswith('INSERT') for consulta in consultas.captured_queries), 1)
+        self.assertIn('1 coleta(s)', saida.getvalue())
+        self.assertIn('1 ocorrência(s) abertas', saida.getvalue())
+
+        # Só rotas de veículos ativos; a conclusão já registrada é mantida
+        do_dia = dict(OcorrenciaRota.objects.filter(data=self.hoje).values_list('rota_id', 'concluida'))
+        self.assertEqual(do_dia, {self.diaria.pk: True, self.outra.pk: False})
+
+        call_command('virar_dia', stdout=saida)
+        self.assertEqual(OcorrenciaRota.objects.filter(data=self.hoje).count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('virar_dia', data='2024-02-30', stdout=saida)
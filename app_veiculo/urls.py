@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'veiculo'
 
@@ -19,18 +19,33 @@ urlpatterns = [
     path('rota/<int:pk>/update/', views.rota_update, name='rota_update'),
     path('rota/<int:pk>/delete/', views.rota_delete, name='rota_delete'),
     path('rota/<int:pk>/toggle-status/', views.rota_toggle_status, name='rota_toggle_status'),
+    path('rotas/proxima/', views.rota_proxima, name='rota_proxima'),
     
+    # Agenda de coletas
+    path('agenda/', views.agenda, name='agenda_hoje'),
+    path('agenda/<str:data>/', views.agenda, name='agenda'),
+    path('agenda/<str:data>/json/', views.agenda_json, name='agenda_json'),
+
     # URLs para Relatórios
     path('relatorios/', views.relatorio_servico, name='relatorio_servico'),
     path('relatorios/veiculos/', views.relatorio_veiculos, name='relatorio_veiculos'),
     path('relatorios/rotas/', views.relatorio_rotas, name='relatorio_rotas'),
+    path('relatorios/carga/', views.balanceamento_frota, name='balanceamento_frota'),
     
     # URLs para Problemas de Coleta
     path('problemas/', views.problema_list, name='problema_list'),
     path('problema/denuncia/', views.problema_denuncia, name='problema_denuncia'),
+    path('problemas/status/', views.problema_status_lote, name='problema_status_lote'),
     path('problema/<int:pk>/', views.problema_detail, name='problema_detail'),
     path('problema/create/', views.problema_create, name='problema_create'),
     path('problema/<int:pk>/update/', views.problema_update, name='problema_update'),
     path('problema/<int:pk>/delete/', views.problema_delete, name='problema_delete'),
     path('problema/<int:pk>/toggle-status/', views.problema_toggle_status, name='problema_toggle_status'),
+
+    # API JSON (veiculos, rotas, problemas)
+    path('api/<str:recurso>/', api.colecao, name='api_colecao'),
+    path('api/<str:recurso>/<int:pk>/', api.detalhe, name='api_detalhe'),
+
+    # Diagnóstico de desempenho
+    path('diagnostico/', views.diagnostico, name='diagnostico'),
 ]
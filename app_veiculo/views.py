@@ -1,16 +1,36 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect, HttpResponse
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
 from datetime import datetime, timedelta
 import json
 from app_usuario.decorators import role_required
-from .models import Veiculo, Rota, ProblemaColeta
+from .models import Veiculo, Rota, OcorrenciaRota, ProblemaColeta, EstatisticaDiaria
 from .forms import VeiculoForm, RotaForm, ProblemaColetaForm, DenunciaProblemaForm
+from . import diagnostico as diagnostico_desempenho, fila_denuncias
+from .agenda import agenda_por_veiculo, agenda_do_periodo, JANELA_MAXIMA
+from .balanceamento import (
+    TOLERANCIA_MINUTOS, aplicar_propostas, cargas, propor_redistribuicao, situacao_da_frota,
+)
+from .dias_semana import DIAS, ROTULOS
+from .exportacao import formato_solicitado, exportar_problemas, exportar_rotas, exportar_veiculos
+from .localizacao import RAIO_PROXIMIDADE_KM, RAIO_SUGESTAO_KM, problemas_perto_da_rota, rota_mais_proxima
+from .referencias import veiculos_ativos
+from .filtros import filtrar_veiculos, filtrar_rotas, filtrar_problemas
+from .paginacao import CursorPaginator
+from .status_problema import LIMITE_LOTE, PROXIMO_STATUS, TRANSICOES, aplicar, transicionar_em_lote
+from .sequenciamento import sugerir_sequencia
+from .relatorios import (
+    veiculos_com_estatisticas, veiculos_com_totais_diarios, resumo_veiculos, intervalo_de_datas,
+    tempo_de_resolucao, idade_do_backlog,
+)
 
 # Views para Veículos
 @login_required
@@ -24,22 +44,11 @@ def veiculo_list(request):
         tipo_filter = request.GET.get('tipo', '')
         ativo_filter = request.GET.get('ativo', '')
 
-        if search:
-            veiculos = veiculos.filter(
-                Q(placa__icontains=search) |
-                Q(numero_caminhao__icontains=search)
-            )
-
-        if tipo_filter:
-            veiculos = veiculos.filter(tipo=tipo_filter)
-
-        if ativo_filter != '':
-            veiculos = veiculos.filter(ativo=ativo_filter == 'true')
+        veiculos = filtrar_veiculos(veiculos, search=search, tipo=tipo_filter, ativo=ativo_filter)
 
         # Paginação
-        paginator = Paginator(veiculos, 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        paginator = CursorPaginator(veiculos, 10, ordering=('placa',))
+        page_obj = paginator.get_page(request.GET.get('cursor'))
 
         context = {
             'page_obj': page_obj,
@@ -56,11 +65,21 @@ def veiculo_list(request):
 def veiculo_detail(request, pk):
     """Detalhes de um veículo específico"""
     veiculo = get_object_or_404(Veiculo, pk=pk)
-    rotas = veiculo.rotas.all().order_by('horario')
+    rotas = veiculo.rotas.com_situacao().order_by('horario')
+
+    # A ordem de visita sugerida (até TEMPO_LIMITE de 2-opt) só é calculada
+    # quando pedida pelo formulário do card, não a cada visita à página
+    dia = request.GET.get('dia')
+    sequencia = sugerir_sequencia(veiculo, dia) if dia in DIAS else None
+    if sequencia is None:
+        dia = DIAS[timezone.localdate().weekday()]
     
     context = {
         'veiculo': veiculo,
         'rotas': rotas,
+        'dia': dia,
+        'dias': list(zip(DIAS, ROTULOS)),
+        'sequencia': sequencia,
     }
     return render(request, 'app_veiculo/veiculo_detail.html', context)
 
@@ -133,57 +152,73 @@ def veiculo_toggle_status(request, pk):
 # Views para Rotas
 @login_required
 def rota_list(request):
-    """Lista todas as rotas com filtros e paginação"""
-    rotas = Rota.objects.select_related('veiculo').all()
+    """Lista todas as rotas com filtros e paginação, com a situação de hoje"""
+    rotas = Rota.objects.select_related('veiculo').com_situacao()
     
     # Filtros
     search = request.GET.get('search', '')
     veiculo_filter = request.GET.get('veiculo', '')
     concluida_filter = request.GET.get('concluida', '')
     
-    if search:
-        rotas = rotas.filter(
-            Q(local__icontains=search) |
-            Q(veiculo__placa__icontains=search)
-        )
-    
-    if veiculo_filter:
-        rotas = rotas.filter(veiculo_id=veiculo_filter)
-    
-    if concluida_filter != '':
-        rotas = rotas.filter(concluida=concluida_filter == 'true')
+    rotas = filtrar_rotas(rotas, search=search, veiculo=veiculo_filter, concluida=concluida_filter)
     
     # Paginação
-    paginator = Paginator(rotas, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(rotas, 10, ordering=('horario', 'id'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'search': search,
         'veiculo_filter': veiculo_filter,
         'concluida_filter': concluida_filter,
-        'veiculos': Veiculo.objects.filter(ativo=True),
+        'veiculos': veiculos_ativos(),
     }
     return render(request, 'app_veiculo/rota_list.html', context)
 
 @login_required
 def rota_detail(request, pk):
     """Detalhes de uma rota específica"""
-    rota = get_object_or_404(Rota, pk=pk)
+    rota = get_object_or_404(Rota.objects.com_situacao(), pk=pk)
     
-    context = {'rota': rota}
+    context = {
+        'rota': rota,
+        'problemas_proximos': problemas_perto_da_rota(rota),
+        'raio_proximidade': RAIO_PROXIMIDADE_KM,
+    }
     return render(request, 'app_veiculo/rota_detail.html', context)
 
+@login_required
+def rota_proxima(request):
+    """Rota mais próxima de ?latitude=&longitude= (sugestão do formulário de denúncia)"""
+    try:
+        latitude = float(request.GET['latitude'])
+        longitude = float(request.GET['longitude'])
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Informe latitude e longitude.'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'success': False, 'message': 'Coordenadas inválidas.'}, status=400)
+
+    rota_id = rota_mais_proxima(latitude, longitude)
+    rota = Rota.objects.select_related('veiculo').filter(pk=rota_id).first() if rota_id else None
+    if rota is None:
+        return JsonResponse({
+            'success': True,
+            'rota': None,
+            'message': f'Nenhuma rota a até {RAIO_SUGESTAO_KM} km.',
+        })
+    return JsonResponse({'success': True, 'rota': {'id': rota.pk, 'descricao': str(rota)}})
+
 @role_required('gestor_rotas', 'admin')
 def rota_create(request):
     """Criar nova rota"""
     if request.method == 'POST':
         form = RotaForm(request.POST)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Rota cadastrada com sucesso!')
-            return redirect('veiculo:rota_list')
+        # Validação de conflitos e gravação na mesma transação, com o veículo travado
+        with transaction.atomic():
+            if form.is_valid():
+                form.save()
+                messages.success(request, 'Rota cadastrada com sucesso!')
+                return redirect('veiculo:rota_list')
     else:
         form = RotaForm()
     
@@ -197,10 +232,11 @@ def rota_update(request, pk):
     
     if request.method == 'POST':
         form = RotaForm(request.POST, instance=rota)
-        if form.is_valid():
-            form.save()
-            messages.success(request, 'Rota atualizada com sucesso!')
-            return redirect('veiculo:rota_detail', pk=rota.pk)
+        with transaction.atomic():
+            if form.is_valid():
+                form.save()
+                messages.success(request, 'Rota atualizada com sucesso!')
+                return redirect('veiculo:rota_detail', pk=rota.pk)
     else:
         form = RotaForm(instance=rota)
     
@@ -227,45 +263,86 @@ def rota_delete(request, pk):
 @require_POST
 @role_required('gestor_rotas', 'admin')
 def rota_toggle_status(request, pk):
-    """Alternar status concluída da rota"""
+    """Alternar status concluída da rota no dia de hoje"""
     rota = get_object_or_404(Rota, pk=pk)
-    rota.concluida = not rota.concluida
-    rota.save()
+    # A situação é gravada na ocorrência de hoje; a tabela de rotas não muda
+    ocorrencia = OcorrenciaRota.alternar(rota, usuario=request.user)
     
-    status = 'concluída' if rota.concluida else 'reaberta'
+    status = 'concluída' if ocorrencia.concluida else 'reaberta'
     messages.success(request, f'Rota {status} com sucesso!')
     
     return JsonResponse({
         'success': True,
-        'concluida': rota.concluida,
+        'concluida': ocorrencia.concluida,
         'message': f'Rota {status} com sucesso!'
     })
 
+# Agenda de coletas
+def _data_da_agenda(texto):
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').date()
+    except ValueError:
+        raise Http404('Data inválida. Use o formato AAAA-MM-DD.')
+
+@login_required
+def agenda(request, data=None):
+    """Coletas do dia, em ordem de horário, agrupadas por caminhão"""
+    dia = _data_da_agenda(data) if data else timezone.localdate()
+
+    context = {
+        'dia': dia,
+        'hoje': timezone.localdate(),
+        'anterior': dia - timedelta(days=1),
+        'seguinte': dia + timedelta(days=1),
+        'agenda': agenda_por_veiculo(dia),
+    }
+    return render(request, 'app_veiculo/agenda.html', context)
+
+@login_required
+def agenda_json(request, data):
+    """Agenda em JSON de `data` até ?ate=AAAA-MM-DD (inclusive, no máximo 31 dias)"""
+    inicio = _data_da_agenda(data)
+    fim = _data_da_agenda(request.GET['ate']) if request.GET.get('ate') else inicio
+    if fim < inicio or (fim - inicio).days >= JANELA_MAXIMA:
+        return JsonResponse(
+            {'success': False, 'message': f'Período inválido (até {JANELA_MAXIMA} dias).'}, status=400
+        )
+
+    dias = []
+    for dia, veiculos in agenda_do_periodo(inicio, fim):
+        dias.append({
+            'data': dia.isoformat(),
+            'veiculos': [
+                {
+                    **grupo['veiculo'],
+                    'coletas': [
+                        {
+                            'rota_id': coleta['rota_id'],
+                            'local': coleta['local'],
+                            'horario': coleta['horario'].strftime('%H:%M'),
+                            'concluida': coleta['concluida'],
+                        }
+                        for coleta in grupo['coletas']
+                    ],
+                }
+                for grupo in veiculos
+            ],
+        })
+    return JsonResponse({'success': True, 'dias': dias})
+
 # Views para Relatórios
 @role_required('gestor_rotas', 'admin')
 def relatorio_servico(request):
     """Relatório geral de serviços do sistema"""
-    # Estatísticas gerais
-    total_veiculos = Veiculo.objects.count()
-    veiculos_ativos = Veiculo.objects.filter(ativo=True).count()
-    veiculos_inativos = Veiculo.objects.filter(ativo=False).count()
-    
-    total_rotas = Rota.objects.count()
-    rotas_concluidas = Rota.objects.filter(concluida=True).count()
-    rotas_pendentes = Rota.objects.filter(concluida=False).count()
-    
-    # Estatísticas por tipo de veículo
-    veiculos_por_tipo = Veiculo.objects.values('tipo').annotate(
+    # Estatísticas de veículos em uma única consulta agrupada
+    veiculos_por_tipo = list(Veiculo.objects.values('tipo').annotate(
         total=Count('id'),
         ativos=Count('id', filter=Q(ativo=True))
-    ).order_by('tipo')
+    ).order_by('tipo'))
     
-    # Rotas por veículo
-    rotas_por_veiculo = Veiculo.objects.annotate(
-        total_rotas=Count('rotas'),
-        rotas_concluidas=Count('rotas', filter=Q(rotas__concluida=True)),
-        rotas_pendentes=Count('rotas', filter=Q(rotas__concluida=False))
-    ).order_by('placa')
+    total_veiculos = sum(tipo['total'] for tipo in veiculos_por_tipo)
+    veiculos_ativos = sum(tipo['ativos'] for tipo in veiculos_por_tipo)
+    veiculos_inativos = total_veiculos - veiculos_ativos
     
     # Filtros de data (últimos 30 dias)
     data_inicio = request.GET.get('data_inicio')
@@ -276,21 +353,52 @@ def relatorio_servico(request):
     if not data_fim:
         data_fim = datetime.now().strftime('%Y-%m-%d')
     
-    # Rotas por período
-    rotas_periodo = Rota.objects.filter(
-        data_cadastro__date__range=[data_inicio, data_fim]
+    inicio_periodo, fim_periodo = intervalo_de_datas(data_inicio, data_fim)
+
+    # Exportação dos problemas registrados no período
+    formato = formato_solicitado(request)
+    if formato:
+        problemas_periodo = ProblemaColeta.objects.filter(
+            data_ocorrencia__gte=inicio_periodo,
+            data_ocorrencia__lt=fim_periodo,
+        )
+        return exportar_problemas(formato, problemas_periodo, f'problemas_{data_inicio}_{data_fim}')
+
+    # Totais do período lidos do snapshot diário, só nas linhas do intervalo
+    dias_periodo = (inicio_periodo.date(), fim_periodo.date() - timedelta(days=1))
+    totais_periodo = EstatisticaDiaria.totais(data__range=dias_periodo)
+    
+    # Rotas por veículo: cadastradas no período e situação de hoje
+    rotas_por_veiculo = list(veiculos_com_totais_diarios(dias=dias_periodo).order_by('placa'))
+    rotas_concluidas = sum(veiculo.rotas_concluidas for veiculo in rotas_por_veiculo)
+    rotas_pendentes = sum(veiculo.rotas_pendentes for veiculo in rotas_por_veiculo)
+    
+    # Rotas cadastradas no período, paginadas pelo índice de data_cadastro
+    rotas_periodo = Rota.objects.select_related('veiculo').com_situacao().filter(
+        data_cadastro__gte=inicio_periodo,
+        data_cadastro__lt=fim_periodo,
     )
+    paginator = CursorPaginator(rotas_periodo, 50, ordering=('-data_cadastro', '-id'))
     
+    # Uma consulta por métrica, agrupada por tipo e por veículo ao mesmo tempo
+    resolucao = tempo_de_resolucao(inicio_periodo, fim_periodo)
+    backlog = idade_do_backlog()
+
     context = {
         'total_veiculos': total_veiculos,
         'veiculos_ativos': veiculos_ativos,
         'veiculos_inativos': veiculos_inativos,
-        'total_rotas': total_rotas,
+        'total_rotas': totais_periodo['rotas_cadastradas'],
         'rotas_concluidas': rotas_concluidas,
         'rotas_pendentes': rotas_pendentes,
         'veiculos_por_tipo': veiculos_por_tipo,
         'rotas_por_veiculo': rotas_por_veiculo,
-        'rotas_periodo': rotas_periodo,
+        'rotas_periodo': paginator.get_page(request.GET.get('cursor')),
+        'totais_periodo': totais_periodo,
+        'resolucao_por_tipo': resolucao['tipo'],
+        'resolucao_por_veiculo': resolucao['veiculo'],
+        'backlog_por_tipo': backlog['tipo'],
+        'backlog_por_veiculo': backlog['veiculo'],
         'data_inicio': data_inicio,
         'data_fim': data_fim,
     }
@@ -306,25 +414,19 @@ def relatorio_veiculos(request):
     tipo_filter = request.GET.get('tipo', '')
     status_filter = request.GET.get('status', '')
     
-    if tipo_filter:
-        veiculos = veiculos.filter(tipo=tipo_filter)
-    
-    if status_filter != '':
-        veiculos = veiculos.filter(ativo=status_filter == 'true')
+    veiculos = filtrar_veiculos(veiculos, tipo=tipo_filter, ativo=status_filter)
     
-    # Adicionar estatísticas de rotas para cada veículo
-    veiculos_com_stats = []
-    for veiculo in veiculos:
-        stats = {
-            'veiculo': veiculo,
-            'total_rotas': veiculo.rotas.count(),
-            'rotas_concluidas': veiculo.rotas.filter(concluida=True).count(),
-            'rotas_pendentes': veiculo.rotas.filter(concluida=False).count(),
-        }
-        veiculos_com_stats.append(stats)
+    # Exportação com os mesmos filtros da página
+    formato = formato_solicitado(request)
+    if formato:
+        return exportar_veiculos(formato, veiculos_com_estatisticas(veiculos), 'relatorio_veiculos')
+
+    # Estatísticas de rotas e problemas calculadas em uma única consulta
+    veiculos_com_stats = list(veiculos_com_estatisticas(veiculos))
     
     context = {
         'veiculos_com_stats': veiculos_com_stats,
+        'resumo': resumo_veiculos(veiculos_com_stats),
         'tipo_filter': tipo_filter,
         'status_filter': status_filter,
         'tipos': Veiculo.TIPO_CHOICES,
@@ -332,36 +434,69 @@ def relatorio_veiculos(request):
     
     return render(request, 'app_veiculo/relatorio_veiculos.html', context)
 
+@role_required('gestor_rotas', 'admin')
+def balanceamento_frota(request):
+    """Carga semanal por veículo e redistribuição proposta das rotas"""
+    if request.method == 'POST':
+        # Cada proposta aceita chega como "rota_id:veiculo_id de destino"
+        pares = []
+        for valor in request.POST.getlist('propostas'):
+            rota_id, _, destino_id = valor.partition(':')
+            if rota_id.isdigit() and destino_id.isdigit():
+                pares.append((int(rota_id), int(destino_id)))
+        if not pares:
+            messages.error(request, 'Nenhuma proposta selecionada.')
+            return redirect('veiculo:balanceamento_frota')
+
+        movidas, recusadas = aplicar_propostas(pares)
+        if movidas:
+            messages.success(request, f'{movidas} rota(s) redistribuída(s).')
+        for rota_id, motivo in recusadas.items():
+            messages.warning(request, f'Rota {rota_id} não foi movida: {motivo}')
+        return redirect('veiculo:balanceamento_frota')
+
+    try:
+        tolerancia = max(0, int(request.GET.get('tolerancia', TOLERANCIA_MINUTOS)))
+    except ValueError:
+        tolerancia = TOLERANCIA_MINUTOS
+
+    # Uma leitura da frota para as cargas e para a proposta
+    situacao = situacao_da_frota()
+    context = {
+        'cargas': cargas(situacao),
+        'propostas': propor_redistribuicao(tolerancia, situacao=situacao),
+        'tolerancia': tolerancia,
+        'dias': ROTULOS,
+    }
+    return render(request, 'app_veiculo/balanceamento_frota.html', context)
+
 @role_required('gestor_rotas', 'admin')
 def relatorio_rotas(request):
-    """Relatório detalhado de rotas"""
-    rotas = Rota.objects.select_related('veiculo').all()
+    """Relatório detalhado de rotas, com a situação de hoje"""
+    rotas = Rota.objects.select_related('veiculo').com_situacao()
     
     # Filtros
     veiculo_filter = request.GET.get('veiculo', '')
     status_filter = request.GET.get('status', '')
     dias_filter = request.GET.get('dias', '')
     
-    if veiculo_filter:
-        rotas = rotas.filter(veiculo_id=veiculo_filter)
-    
-    if status_filter != '':
-        rotas = rotas.filter(concluida=status_filter == 'true')
+    rotas = filtrar_rotas(rotas, veiculo=veiculo_filter, concluida=status_filter, dias=dias_filter)
     
-    if dias_filter:
-        rotas = rotas.filter(dias_semana__icontains=dias_filter)
+    # Exportação com os mesmos filtros da página
+    formato = formato_solicitado(request)
+    if formato:
+        return exportar_rotas(formato, rotas, 'relatorio_rotas')
     
     # Paginação
-    paginator = Paginator(rotas, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(rotas, 20, ordering=('horario', 'id'), contagem_aproximada=True)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
         'veiculo_filter': veiculo_filter,
         'status_filter': status_filter,
         'dias_filter': dias_filter,
-        'veiculos': Veiculo.objects.filter(ativo=True),
+        'veiculos': veiculos_ativos(),
     }
     
     return render(request, 'app_veiculo/relatorio_rotas.html', context)
@@ -379,30 +514,19 @@ def problema_list(request):
     status_filter = request.GET.get('status', '')
     prioridade_filter = request.GET.get('prioridade', '')
     
-    if search:
-        problemas = problemas.filter(
-            Q(descricao__icontains=search) |
-            Q(local_problema__icontains=search) |
-            Q(responsavel_relato__icontains=search) |
-            Q(veiculo__placa__icontains=search)
-        )
-    
-    if veiculo_filter:
-        problemas = problemas.filter(veiculo_id=veiculo_filter)
-    
-    if tipo_filter:
-        problemas = problemas.filter(tipo_problema=tipo_filter)
-    
-    if status_filter:
-        problemas = problemas.filter(status=status_filter)
-    
-    if prioridade_filter:
-        problemas = problemas.filter(prioridade=prioridade_filter)
+    problemas = filtrar_problemas(
+        problemas,
+        search=search,
+        veiculo=veiculo_filter,
+        tipo=tipo_filter,
+        status=status_filter,
+        prioridade=prioridade_filter,
+    )
     
     # Paginação
-    paginator = Paginator(problemas, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    ordering = ('relevancia', 'id') if search else ('-data_ocorrencia', '-id')
+    paginator = CursorPaginator(problemas, 15, ordering=ordering)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -411,7 +535,7 @@ def problema_list(request):
         'tipo_filter': tipo_filter,
         'status_filter': status_filter,
         'prioridade_filter': prioridade_filter,
-        'veiculos': Veiculo.objects.filter(ativo=True),
+        'veiculos': veiculos_ativos(),
         'tipos': ProblemaColeta.TIPO_PROBLEMA_CHOICES,
         'status_choices': ProblemaColeta.STATUS_CHOICES,
         'prioridade_choices': ProblemaColeta.PRIORIDADE_CHOICES,
@@ -426,6 +550,7 @@ def problema_detail(request, pk):
     
     context = {
         'problema': problema,
+        'transicoes': problema.transicoes.select_related('usuario__perfil'),
     }
     
     return render(request, 'app_veiculo/problema_detail.html', context)
@@ -434,7 +559,7 @@ def problema_detail(request, pk):
 def problema_create(request):
     """Criar um novo problema de coleta"""
     if request.method == 'POST':
-        form = ProblemaColetaForm(request.POST)
+        form = ProblemaColetaForm(request.POST, user=request.user)
         if form.is_valid():
             problema = form.save()
             messages.success(request, 'Problema de coleta cadastrado com sucesso!')
@@ -457,11 +582,24 @@ def problema_denuncia(request):
     if request.method == 'POST':
         form = DenunciaProblemaForm(request.POST, user=request.user)
         if form.is_valid():
+            if fila_denuncias.ativa():
+                # Gravada no banco pelo comando processar_denuncias
+                protocolo = form.enfileirar()
+                messages.success(
+                    request,
+                    f'Denúncia recebida com o protocolo {protocolo}. '
+                    'Nossa equipe analisará a ocorrência.',
+                )
+                return redirect('veiculo:problema_denuncia')
             problema = form.save()
-            messages.success(
-                request,
-                'Denúncia registrada com sucesso. Nossa equipe analisará a ocorrência.',
-            )
+            if form.agrupada:
+                mensagem = (
+                    'Este problema já havia sido denunciado e sua denúncia foi somada a ele. '
+                    'Nossa equipe analisará a ocorrência.'
+                )
+            else:
+                mensagem = 'Denúncia registrada com sucesso. Nossa equipe analisará a ocorrência.'
+            messages.success(request, mensagem)
             return redirect('veiculo:problema_detail', pk=problema.pk)
     else:
         form = DenunciaProblemaForm(user=request.user)
@@ -480,7 +618,7 @@ def problema_update(request, pk):
     problema = get_object_or_404(ProblemaColeta, pk=pk)
     
     if request.method == 'POST':
-        form = ProblemaColetaForm(request.POST, instance=problema)
+        form = ProblemaColetaForm(request.POST, instance=problema, user=request.user)
         if form.is_valid():
             problema = form.save()
             messages.success(request, 'Problema de coleta atualizado com sucesso!')
@@ -521,15 +659,10 @@ def problema_toggle_status(request, pk):
     try:
         problema = get_object_or_404(ProblemaColeta, pk=pk)
         
-        # Alternar entre status
-        if problema.status == 'aberto':
-            problema.status = 'em_andamento'
-        elif problema.status == 'em_andamento':
-            problema.status = 'resolvido'
-            problema.data_resolucao = datetime.now()
-        elif problema.status == 'resolvido':
-            problema.status = 'aberto'
-            problema.data_resolucao = None
+        # Alternar entre status (problemas cancelados ficam fora do ciclo)
+        proximo = PROXIMO_STATUS.get(problema.status)
+        if proximo:
+            aplicar(problema, proximo, usuario=request.user)
         
         problema.save()
         
@@ -545,3 +678,77 @@ def problema_toggle_status(request, pk):
         'status_display': status,
         'message': f'Status alterado para: {status}'
     })
+
+FILTROS_PROBLEMAS = ('search', 'veiculo', 'tipo', 'status', 'prioridade')
+
+@require_POST
+@role_required('gestor_rotas', 'admin')
+def problema_status_lote(request):
+    """Muda o status dos problemas selecionados (ids) ou de todos os do filtro"""
+    filtros = {filtro: request.POST.get(filtro, '') for filtro in FILTROS_PROBLEMAS}
+    resposta_json = (
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.headers.get('Accept') == 'application/json'
+    )
+    voltar = reverse('veiculo:problema_list')
+    if any(filtros.values()):
+        voltar += '?' + urlencode({filtro: valor for filtro, valor in filtros.items() if valor})
+
+    def recusar(mensagem):
+        if resposta_json:
+            return JsonResponse({'success': False, 'error': mensagem}, status=400)
+        messages.error(request, mensagem)
+        return redirect(voltar)
+
+    destino = request.POST.get('status_destino', '')
+    if destino and destino not in TRANSICOES:
+        return recusar('Status de destino inválido.')
+
+    if request.POST.get('todos_do_filtro'):
+        problemas = filtrar_problemas(ProblemaColeta.objects.all(), **filtros)
+        ids = list(problemas.order_by().values_list('id', flat=True)[:LIMITE_LOTE + 1])
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+
+    if not ids:
+        return recusar('Nenhum problema selecionado.')
+    if len(ids) > LIMITE_LOTE:
+        return recusar(f'Mais de {LIMITE_LOTE} problemas selecionados. Refine o filtro.')
+
+    resultados = transicionar_em_lote(ids, destino or None, usuario=request.user)
+    alterados = sum(1 for resultado in resultados.values() if resultado['success'])
+    recusados = len(resultados) - alterados
+
+    if resposta_json:
+        return JsonResponse({
+            'success': True,
+            'alterados': alterados,
+            'recusados': recusados,
+            'resultados': resultados,
+        })
+
+    if alterados:
+        messages.success(request, f'Status alterado em {alterados} problema(s).')
+    if recusados:
+        messages.warning(request, f'{recusados} problema(s) não puderam mudar para o status pedido.')
+    return redirect(voltar)
+
+# Diagnóstico de desempenho
+@role_required('admin')
+def diagnostico(request):
+    """Consultas, tempo de SQL e de template por view, a partir das amostras em memória"""
+    if request.method == 'POST':
+        diagnostico_desempenho.limpar()
+        messages.success(request, 'Amostras de diagnóstico descartadas.')
+        return redirect('veiculo:diagnostico')
+
+    context = {
+        'linhas': diagnostico_desempenho.resumo(),
+        'total_amostras': len(diagnostico_desempenho.amostras()),
+        'ativo': diagnostico_desempenho.ativo(),
+        'amostragem': diagnostico_desempenho.amostragem(),
+        'tamanho_buffer': diagnostico_desempenho.TAMANHO_BUFFER,
+        'fila_denuncias': fila_denuncias.situacao(),
+        'denuncias_com_erro': fila_denuncias.com_erro(),
+    }
+    return render(request, 'app_veiculo/diagnostico.html', context)